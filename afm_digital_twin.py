@@ -470,6 +470,27 @@ class AFMDigitalTwin:
             'params': scan['params']
         }
     
+    def get_scan_arrays(self, scan_id: Optional[str] = None) -> Dict:
+        """
+        Get PFM amplitude and phase as the stored ndarrays (no list conversion)
+        
+        The arrays are shared with the scan store and must not be modified.
+        """
+        if scan_id is None:
+            scan_id = self.current_scan_id
+        
+        if scan_id not in self.scans:
+            raise ValueError(f"Scan {scan_id} not found")
+        
+        scan = self.scans[scan_id]
+        
+        return {
+            'scan_id': scan_id,
+            'amplitude': scan['amplitude'],
+            'phase': scan['phase'],
+            'params': scan['params']
+        }
+    
     def analyze_domain_structure(self, scan_id: Optional[str] = None) -> Dict:
         """Analyze ferroelectric domain structure from scan"""
         if scan_id is None:
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Animation - Stream polarization histories into animated PNGs or frame folders
+Frames are rendered lazily from the stored (2, T, n, n) history, optionally
+encoded in worker processes, and written to disk as they arrive, so memory
+stays flat however long the history is
+"""
+
+import os
+import struct
+from collections import deque
+from typing import Callable, Iterator, Optional
+
+import numpy as np
+
+from fast_render import PNG_SIGNATURE, default_scale, png_chunk, png_ihdr, png_image_data, render_frame
+
+
+ANIMATION_FORMATS = ('apng', 'frames')
+
+# Encoded frames kept in flight per worker when rendering in a pool
+FRAMES_IN_FLIGHT_PER_WORKER = 4
+
+
+def frame_indices(n_frames: int, stride: int = 1) -> range:
+    """Timesteps included at a given stride; the last frame is always the final state"""
+    if stride < 1:
+        raise ValueError("stride must be >= 1")
+    return range((n_frames - 1) % stride, n_frames, stride)
+
+
+def history_pmax(pmat: np.ndarray, indices) -> float:
+    """Largest |P| over the selected frames, so brightness is comparable across the animation"""
+    pmax = 0.0
+    for idx in indices:
+        pmax = max(pmax, float(np.hypot(pmat[0, idx], pmat[1, idx]).max()))
+    return pmax
+
+
+def encode_frame(frame: np.ndarray, viz_type: str, scale: int, pmax: float) -> bytes:
+    """
+    Render one (2, n, n) frame and return its compressed image data
+
+    Top-level so worker processes can run it; only the small frame goes in
+    and the zlib stream comes back.
+    """
+    return png_image_data(render_frame(frame, viz_type, scale, pmax))
+
+
+def iter_encoded_frames(pmat: np.ndarray, indices, viz_type: str, scale: int, pmax: float,
+                        executor=None, workers: int = 1, window: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Yield compressed frames in order
+
+    With an executor, at most `window` frames (default: a few per worker)
+    are submitted ahead of the one being consumed, so neither pending
+    frames nor results pile up.
+    """
+    if executor is None:
+        for idx in indices:
+            yield encode_frame(pmat[:, idx], viz_type, scale, pmax)
+        return
+
+    if window is None:
+        window = FRAMES_IN_FLIGHT_PER_WORKER * max(workers, 1)
+    pending = deque()
+    for idx in indices:
+        pending.append(executor.submit(encode_frame, np.array(pmat[:, idx]), viz_type, scale, pmax))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _fctl(sequence: int, width: int, height: int, fps: float) -> bytes:
+    """APNG frame control chunk: full-canvas frame shown for 1/fps seconds"""
+    delay_den = 1000
+    delay_num = max(1, int(round(delay_den / fps)))
+    return png_chunk(b'fcTL', struct.pack('>IIIIIHHBB', sequence, width, height, 0, 0,
+                                          delay_num, delay_den, 0, 0))
+
+
+def write_apng(path: str, frames: Iterator[bytes], n_frames: int, width: int, height: int,
+               fps: float = 10.0, progress: Optional[Callable[[int, int], None]] = None) -> int:
+    """
+    Write compressed RGB frames as an endlessly looping animated PNG
+
+    Args:
+        path: Output file
+        frames: Compressed image data per frame (see fast_render.png_image_data)
+        n_frames: Number of frames the iterator yields (needed for the header)
+        width, height: Frame size in pixels
+        fps: Playback rate
+        progress: Optional callback(frames_written, n_frames)
+
+    Returns:
+        Number of frames written; on failure the partial file is removed
+    """
+    sequence = 0
+    written = 0
+    try:
+        with open(path, 'wb') as f:
+            f.write(PNG_SIGNATURE)
+            f.write(png_ihdr(width, height, 3))
+            f.write(png_chunk(b'acTL', struct.pack('>II', n_frames, 0)))
+            for data in frames:
+                f.write(_fctl(sequence, width, height, fps))
+                sequence += 1
+                if written == 0:
+                    # The first frame doubles as the static fallback image
+                    f.write(png_chunk(b'IDAT', data))
+                else:
+                    f.write(png_chunk(b'fdAT', struct.pack('>I', sequence) + data))
+                    sequence += 1
+                written += 1
+                if progress is not None:
+                    progress(written, n_frames)
+            f.write(png_chunk(b'IEND', b''))
+    except BaseException:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        raise
+    return written
+
+
+def write_frame_directory(directory: str, frames: Iterator[bytes], n_frames: int, width: int,
+                          height: int, progress: Optional[Callable[[int, int], None]] = None) -> int:
+    """Write each compressed frame as frame_00000.png, frame_00001.png, ... in directory"""
+    os.makedirs(directory, exist_ok=True)
+    header = PNG_SIGNATURE + png_ihdr(width, height, 3)
+    footer = png_chunk(b'IEND', b'')
+    written = 0
+    for data in frames:
+        with open(os.path.join(directory, f"frame_{written:05d}.png"), 'wb') as f:
+            f.write(header + png_chunk(b'IDAT', data) + footer)
+        written += 1
+        if progress is not None:
+            progress(written, n_frames)
+    return written
+
+
+def animate_history(pmat: np.ndarray, output: str, viz_type: str = 'magnitude_angle',
+                    stride: int = 1, output_format: str = 'apng', fps: float = 10.0,
+                    scale: Optional[int] = None, executor=None, workers: int = 1,
+                    progress: Optional[Callable[[int, int], None]] = None) -> dict:
+    """
+    Animate a (2, T, n, n) polarization history
+
+    Args:
+        pmat: Stored history (array or shared-memory view)
+        output: File path for 'apng', directory for 'frames'
+        viz_type: 'magnitude_angle' or 'quiver'
+        stride: Use every stride-th timestep (ending on the final state)
+        output_format: 'apng' or 'frames'
+        fps: Playback rate for 'apng'
+        scale: Pixels per site (default: about 512 pixels per edge)
+        executor: Optional process pool used to render and compress frames
+        workers: Worker count of the executor, which sets how many frames are in flight
+        progress: Optional callback(frames_written, n_frames)
+
+    Returns:
+        Dict with output path, format, frame count, size and timesteps used
+    """
+    if output_format not in ANIMATION_FORMATS:
+        raise ValueError(f"Unknown animation format: {output_format}")
+    if viz_type not in ('magnitude_angle', 'quiver'):
+        raise ValueError(f"Animations support 'magnitude_angle' and 'quiver', not {viz_type}")
+
+    indices = frame_indices(pmat.shape[1], stride)
+    n = pmat.shape[2]
+    if scale is None:
+        scale = default_scale(n)
+    size = n * scale
+    pmax = history_pmax(pmat, indices)
+
+    frames = iter_encoded_frames(pmat, indices, viz_type, scale, pmax, executor, workers)
+    if output_format == 'apng':
+        written = write_apng(output, frames, len(indices), size, size, fps, progress)
+    else:
+        written = write_frame_directory(output, frames, len(indices), size, size, progress)
+
+    return {
+        'output': output,
+        'format': output_format,
+        'frames': written,
+        'size_px': size,
+        'first_timestep': indices[0],
+        'stride': stride,
+    }
@@ -0,0 +1,752 @@
+#!/usr/bin/env python3
+"""
+Comparison - Theory-experiment image comparison on stored arrays
+Works directly on the simulation history and the loaded AFM ndarrays (no list
+round trips), caches the normalized AFM image and its local statistics per
+scan, and computes correlation, MSE/RMSE and SSIM in one pass; further
+metrics from similarity_metrics are selectable per call
+"""
+
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.ndimage import maximum_filter
+
+from registration import RegistrationTarget, register, warp
+from resampling import Resampler, get_resampler
+from similarity_metrics import (
+    DEFAULT_BINS, box_filter, domain_distances, domain_statistics, histogram,
+    histogram_distances, ms_ssim, normalized_mutual_information, quantize, ssim_components
+)
+
+
+# SSIM window, as in skimage
+SSIM_WINDOW = 7
+
+# Selectable metric groups; correlation is always computed (it drives match_quality)
+AVAILABLE_METRICS = ('correlation', 'mse', 'rmse', 'ssim', 'ms_ssim', 'nmi', 'histogram', 'domain', 'phase')
+DEFAULT_METRICS = ('correlation', 'mse', 'rmse', 'ssim')
+
+# Standard deviation below which a normalized image counts as flat
+FLAT_STD = 1e-6
+
+# Result keys where smaller values mean a better match (all others: larger is better)
+LOWER_IS_BETTER = frozenset((
+    'mse', 'rmse', 'nrmse', 'hist_chi2', 'hist_bhattacharyya', 'hist_emd',
+    'up_fraction_diff', 'wall_density_diff', 'phase_error_deg'
+))
+
+# Metric group that produces each result key
+RESULT_GROUPS = {
+    'correlation': 'correlation', 'mse': 'mse', 'rmse': 'rmse', 'nrmse': 'rmse',
+    'ssim': 'ssim', 'ms_ssim': 'ms_ssim', 'nmi': 'nmi',
+    'hist_intersection': 'histogram', 'hist_chi2': 'histogram',
+    'hist_bhattacharyya': 'histogram', 'hist_emd': 'histogram',
+    'up_fraction_diff': 'domain', 'wall_density_diff': 'domain',
+    'phase_agreement': 'phase', 'phase_correlation': 'phase', 'phase_error_deg': 'phase',
+    'combined': 'phase',
+}
+
+# AFM phase below this (degrees) is an up domain, as in AFMDigitalTwin.analyze_domain_structure
+UP_PHASE_THRESHOLD = 90.0
+
+# Expected PFM phase (degrees) of up and down domains
+UP_PHASE = 0.0
+DOWN_PHASE = 180.0
+
+# Default share of the phase term in the joint amplitude/phase score
+DEFAULT_PHASE_WEIGHT = 0.5
+
+# Coarse-to-fine screening: downsampling of the coarse level, smallest coarse
+# edge worth screening on, and the fewest candidates kept for full resolution
+PYRAMID_FACTOR = 8
+COARSE_MIN_SIZE = 32
+COARSE_MIN_KEEP = 8
+DEFAULT_KEEP_FRACTION = 0.25
+
+# Parameter-set scores remembered per prepared scan
+MAX_CACHED_SCORES = 4096
+
+
+class LRUCache:
+    """Mapping of at most max_entries items; the least recently used is evicted first"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: Hashable, default=None):
+        if key not in self.entries:
+            return default
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key: Hashable, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+def normalize(image: np.ndarray) -> np.ndarray:
+    """Min-max normalize to [0, 1] as float64"""
+    image = np.asarray(image, dtype=np.float64)
+    low, high = image.min(), image.max()
+    return (image - low) / (high - low + 1e-10)
+
+
+def standardize(image: np.ndarray) -> np.ndarray:
+    """Zero mean, unit standard deviation; flat images become zeros"""
+    image = np.asarray(image, dtype=np.float64)
+    std = image.std()
+    if std <= FLAT_STD:
+        return np.zeros_like(image)
+    return (image - image.mean()) / std
+
+
+def simulation_component(frame: np.ndarray, component: str = 'magnitude') -> np.ndarray:
+    """
+    Select the compared quantity from one (2, n, n) polarization frame
+
+    Args:
+        frame: Px/Py at one timestep
+        component: 'magnitude', 'x' or 'y'
+    """
+    if component == 'x':
+        return frame[0]
+    if component == 'y':
+        return frame[1]
+    if component == 'magnitude':
+        return np.hypot(frame[0], frame[1])
+    raise ValueError(f"Unknown component: {component}")
+
+
+def resize_to(image: np.ndarray, shape: Tuple[int, int]) -> np.ndarray:
+    """Stretch an image over a target shape (bilinear up, area-averaged down, per axis)"""
+    if image.shape == tuple(shape):
+        return image
+    return get_resampler(image.shape, shape)(image)
+
+
+def resize_mask(mask: np.ndarray, shape: Tuple[int, int]) -> np.ndarray:
+    """Nearest-neighbour resize of a boolean map"""
+    if mask.shape == tuple(shape):
+        return mask
+    return get_resampler(mask.shape, shape, order=0)(mask) > 0.5
+
+
+def match_quality(correlation: float) -> str:
+    """Qualitative rating of a correlation score"""
+    if correlation > 0.9:
+        return "excellent"
+    if correlation > 0.8:
+        return "good"
+    if correlation > 0.7:
+        return "fair"
+    return "poor"
+
+
+class PreparedScan:
+    """
+    Normalized AFM image with the statistics every comparison reuses
+
+    Holds the centred image and its norm (for correlation), and the local
+    mean and variance over the SSIM window, so only the simulation side is
+    filtered per comparison.
+    """
+
+    def __init__(self, amplitude: np.ndarray, window: int = SSIM_WINDOW,
+                 phase: Optional[np.ndarray] = None, extent: Optional[Tuple[float, float]] = None):
+        self.shape = amplitude.shape
+        self.window = window
+        self.phase = phase
+        self.extent = extent  # Physical (height, width), for simulations of known size
+        self._quantized = {}
+        self._histograms = {}
+        self._domain_stats = None
+        self._up = None
+        self._up_fraction = None
+        self._registration = None
+        self._projections = {}
+        self._coarse = {}
+        self.scores = LRUCache(MAX_CACHED_SCORES)  # Fit scores per parameter set, dropped with the scan
+        self.image = normalize(amplitude)
+        self.mean = float(self.image.mean())
+        self.centered = self.image - self.mean
+        self.norm = float(np.sqrt(np.einsum('ij,ij->', self.centered, self.centered)))
+        self.mean_sq = float(np.einsum('ij,ij->', self.image, self.image)) / self.image.size
+
+        cov_norm = window ** 2 / (window ** 2 - 1)  # Sample covariance, as skimage
+        self.local_mean = box_filter(self.image, window)
+        self.local_var = cov_norm * (box_filter(self.image * self.image, window)
+                                     - self.local_mean ** 2)
+    
+    def prepare(self, metrics: Iterable[str], bins: int = DEFAULT_BINS):
+        """
+        Build the lazily computed statistics the given metrics need
+
+        Called before scoring from several threads, so the shared state is
+        complete and never built concurrently.
+        """
+        metrics = set(metrics)
+        if 'nmi' in metrics or 'histogram' in metrics:
+            self.histogram(bins)
+        if 'domain' in metrics:
+            self.domain_stats()
+        if 'phase' in metrics:
+            self.up_map()
+    
+    def quantized(self, bins: int = DEFAULT_BINS) -> np.ndarray:
+        """Grey-level bin index per pixel, computed once per bin count"""
+        if bins not in self._quantized:
+            self._quantized[bins] = quantize(self.image, bins)
+        return self._quantized[bins]
+    
+    def histogram(self, bins: int = DEFAULT_BINS) -> np.ndarray:
+        """Normalized grey-level histogram, computed once per bin count"""
+        if bins not in self._histograms:
+            self._histograms[bins] = histogram(self.image, bins, self.quantized(bins))
+        return self._histograms[bins]
+    
+    def registration_target(self) -> RegistrationTarget:
+        """FFT spectra for aligning images to this scan, computed on first use"""
+        if self._registration is None:
+            self._registration = RegistrationTarget(self.image)
+        return self._registration
+    
+    def coarse(self, factor: int) -> 'PreparedScan':
+        """Area-downsampled copy of the scan (amplitude only), built once per factor"""
+        if factor not in self._coarse:
+            shape = (max(self.shape[0] // factor, 1), max(self.shape[1] // factor, 1))
+            self._coarse[factor] = PreparedScan(resize_to(self.image, shape), self.window, extent=self.extent)
+        return self._coarse[factor]
+    
+    def resampler(self, sim_shape: Tuple[int, int], sim_extent: Optional[Tuple[float, float]] = None,
+                  order: int = 1) -> Resampler:
+        """
+        Cached operator from a simulation lattice onto the scan grid
+
+        Without sim_extent the lattice is stretched over the scan. With the
+        lattice's physical (height, width) it keeps its size relative to the
+        scan's extent and, being periodic, tiles beyond its own edges.
+        """
+        if sim_extent is None:
+            return get_resampler(sim_shape, self.shape, order=order)
+        if self.extent is None:
+            raise ValueError("Scan has no physical extent to place the simulation in")
+        return get_resampler(sim_shape, self.shape, sim_extent, self.extent, mode='wrap', order=order)
+    
+    def resample(self, sim_image: np.ndarray, sim_extent: Optional[Tuple[float, float]] = None) -> np.ndarray:
+        """Simulation image on the scan grid"""
+        if sim_extent is None:
+            return resize_to(sim_image, self.shape)
+        return self.resampler(sim_image.shape, sim_extent)(sim_image)
+    
+    def resample_mask(self, mask: np.ndarray, sim_extent: Optional[Tuple[float, float]] = None) -> np.ndarray:
+        """Simulation boolean map on the scan grid (nearest neighbour)"""
+        if sim_extent is None:
+            return resize_mask(mask, self.shape)
+        return self.resampler(mask.shape, sim_extent, order=0)(mask) > 0.5
+    
+    def projection(self, sim_shape: Tuple[int, int],
+                   sim_extent: Optional[Tuple[float, float]] = None) -> Dict[str, np.ndarray]:
+        """
+        The scan pulled back onto a simulation lattice through the resampling operator
+
+        With R the resampling (rows Ay, columns Ax), the correlation of
+        R(F) with the scan only needs <F, Ay^T y Ax>, <F, Ay^T 1 Ax> and
+        ||Ay F Ax^T||^2 = <Gy F, F Gx>, so frames are never resized.
+        Computed once per simulation shape and extent.
+        """
+        key = (tuple(sim_shape), sim_extent)
+        if key not in self._projections:
+            op = self.resampler(tuple(sim_shape), sim_extent)
+            gram_rows, gram_cols = op.gram()
+            self._projections[key] = {
+                'centered': op.adjoint(self.centered),
+                'ones': op.adjoint(np.ones(self.shape)),
+                'gram_rows': gram_rows,
+                'gram_cols': gram_cols,
+            }
+        return self._projections[key]
+    
+    def up_map(self) -> np.ndarray:
+        """Up-domain map from the phase channel, thresholded once"""
+        if self._up is None:
+            if self.phase is None:
+                raise ValueError("Domain and phase metrics need the scan's phase channel")
+            self._up = self.phase < UP_PHASE_THRESHOLD
+            self._up_fraction = float(np.count_nonzero(self._up) / self._up.size)
+        return self._up
+    
+    @property
+    def up_fraction(self) -> float:
+        """Fraction of up-domain pixels"""
+        self.up_map()
+        return self._up_fraction
+    
+    def domain_stats(self) -> Dict[str, float]:
+        """Up fraction and wall density from the phase channel"""
+        if self._domain_stats is None:
+            self._domain_stats = domain_statistics(self.up_map())
+        return self._domain_stats
+
+
+class ScanCache:
+    """
+    PreparedScan per scan ID
+
+    Entries are tied to the amplitude array they were built from, so a
+    reloaded scan under the same ID is prepared again.
+    """
+
+    def __init__(self, window: int = SSIM_WINDOW):
+        self.window = window
+        self.entries: Dict[str, Tuple[np.ndarray, PreparedScan]] = {}
+
+    def get(self, scan_id: str, amplitude: np.ndarray, phase: Optional[np.ndarray] = None,
+            extent: Optional[Tuple[float, float]] = None) -> PreparedScan:
+        """Prepared scan for this scan's amplitude image, building it on first use"""
+        entry = self.entries.get(scan_id)
+        if entry is None or entry[0] is not amplitude or entry[1].extent != extent:
+            entry = (amplitude, PreparedScan(amplitude, self.window, phase, extent))
+            self.entries[scan_id] = entry
+        return entry[1]
+
+    def clear(self, scan_id: Optional[str] = None):
+        """Drop one scan's entry, or all of them"""
+        if scan_id is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(scan_id, None)
+
+
+def align_to_scan(sim_image: np.ndarray, scan: PreparedScan, rotation: bool = True,
+                  scale: bool = True, sim_up: Optional[np.ndarray] = None,
+                  sim_extent: Optional[Tuple[float, float]] = None):
+    """
+    Register a simulation image onto a prepared scan
+
+    The resized, normalized image is aligned by phase correlation (translation)
+    and log-polar phase correlation (rotation, scale). The up-domain map,
+    when given, gets the same transform. The results are on the scan grid.
+
+    Returns:
+        (aligned image, aligned up map or None, transform dict with
+        rotation_deg, scale, shift_px, shift_sites and peak)
+    """
+    x = normalize(scan.resample(sim_image, sim_extent))
+    reg = register(x, scan.registration_target(), rotation, scale)
+
+    aligned_up = None
+    if sim_up is not None:
+        up = scan.resample_mask(sim_up, sim_extent).astype(np.float64)
+        aligned_up = warp(up, reg['rotation_deg'], reg['scale'], tuple(reg['shift_px']), order=0) > 0.5
+
+    transform = {key: reg[key] for key in ('rotation_deg', 'scale', 'shift_px', 'peak')}
+    sites_per_px = scan.resampler(sim_image.shape, sim_extent).scale
+    transform['shift_sites'] = [reg['shift_px'][0] * sites_per_px[0], reg['shift_px'][1] * sites_per_px[1]]
+    return reg['aligned'], aligned_up, transform
+
+
+def apply_alignment(sim_image: np.ndarray, scan: PreparedScan, transform: Dict,
+                    sim_up: Optional[np.ndarray] = None,
+                    sim_extent: Optional[Tuple[float, float]] = None):
+    """
+    Apply a transform found by align_to_scan to another simulation image
+
+    Used to score variants of a registered simulation (e.g. with defects
+    added) in the same frame without registering each one again.
+
+    Returns:
+        (aligned image, aligned up map or None), on the scan grid
+    """
+    motion = (transform['rotation_deg'], transform['scale'], tuple(transform['shift_px']))
+    aligned = warp(normalize(scan.resample(sim_image, sim_extent)), *motion)
+    aligned_up = None
+    if sim_up is not None:
+        up = scan.resample_mask(sim_up, sim_extent).astype(np.float64)
+        aligned_up = warp(up, *motion, order=0) > 0.5
+    return aligned, aligned_up
+
+
+def phase_metrics(sim_up: np.ndarray, scan: PreparedScan,
+                  sim_extent: Optional[Tuple[float, float]] = None) -> Dict[str, float]:
+    """
+    Agreement of the simulated polarization sign with the scan's phase channel
+
+    The up-domain map (Py > 0) stands for an expected PFM phase of UP_PHASE
+    or DOWN_PHASE per pixel. Everything reduces to pixel counts on the
+    boolean maps.
+
+    Returns:
+        phase_agreement (fraction of pixels in the same state),
+        phase_correlation (phi coefficient of the up maps, -1 to 1; 0 if
+        either map is a single domain) and phase_error_deg (mean angular
+        distance between expected and measured phase)
+    """
+    sim_up = scan.resample_mask(sim_up, sim_extent)
+    scan_up = scan.up_map()
+    size = sim_up.size
+    p_sim = np.count_nonzero(sim_up) / size
+    p_scan = scan.up_fraction
+    p_both = np.count_nonzero(sim_up & scan_up) / size
+    agreement = 1.0 - p_sim - p_scan + 2 * p_both
+
+    spread = np.sqrt(p_sim * (1 - p_sim) * p_scan * (1 - p_scan))
+    correlation = (p_both - p_sim * p_scan) / spread if spread > 0 else 0.0
+
+    expected = np.where(sim_up, UP_PHASE, DOWN_PHASE)
+    error = np.abs((scan.phase - expected + 180.0) % 360.0 - 180.0)
+    return {
+        'phase_agreement': float(agreement),
+        'phase_correlation': float(correlation),
+        'phase_error_deg': float(error.mean()),
+    }
+
+
+def compare_to_scan(sim_image: np.ndarray, scan: PreparedScan,
+                    metrics: Iterable[str] = DEFAULT_METRICS, sim_up: Optional[np.ndarray] = None,
+                    bins: int = DEFAULT_BINS, phase_weight: float = DEFAULT_PHASE_WEIGHT,
+                    sim_extent: Optional[Tuple[float, float]] = None) -> Dict:
+    """
+    Similarity metrics of a simulation image against a prepared scan
+
+    The simulation image is resized to the scan and normalized to [0, 1].
+    Global metrics come from its moments with the scan; SSIM (through
+    similarity_metrics.ssim_components) reuses the scan's local statistics.
+
+    Args:
+        sim_image: Compared simulation quantity (n, n)
+        scan: Prepared AFM scan
+        metrics: Entries of AVAILABLE_METRICS
+        sim_up: Simulation up-domain map (Py > 0), required for 'domain' and 'phase'
+        bins: Grey levels for 'nmi' and 'histogram'
+        phase_weight: Share of phase_correlation in the joint score (0 to 1)
+        sim_extent: Physical (height, width) of the simulation lattice, to place
+            it at true scale on a scan with a known extent (default: stretch)
+
+    Returns:
+        Dict with correlation and match_quality plus the requested metrics;
+        with 'phase', also combined = (1 - phase_weight) * correlation +
+        phase_weight * phase_correlation
+    """
+    metrics = set(metrics)
+    unknown = metrics - set(AVAILABLE_METRICS)
+    if unknown:
+        raise ValueError(f"Unknown metrics: {sorted(unknown)}")
+    if not 0.0 <= phase_weight <= 1.0:
+        raise ValueError("phase_weight must be between 0 and 1")
+
+    x = normalize(scan.resample(sim_image, sim_extent))
+    y = scan.image
+    size = x.size
+    xx = x * x
+    xy = x * y
+
+    # Global moments
+    mean_x = float(x.mean())
+    mean_xx = float(xx.mean())
+    mean_xy = float(xy.mean())
+    mse = max(mean_xx - 2 * mean_xy + scan.mean_sq, 0.0)
+    cov = mean_xy - mean_x * scan.mean
+    std_x = np.sqrt(max(mean_xx - mean_x ** 2, 0.0))
+    std_y = scan.norm / np.sqrt(size)
+    # Flat images normalize to rounding noise; their correlation is undefined
+    flat = np.ptp(sim_image) == 0 or std_x <= FLAT_STD or std_y <= FLAT_STD
+    correlation = 0.0 if flat else float(cov / (std_x * std_y))
+
+    result = {'correlation': correlation}
+    if 'mse' in metrics:
+        result['mse'] = float(mse)
+    if 'rmse' in metrics:
+        result['rmse'] = float(np.sqrt(mse))
+        result['nrmse'] = result['rmse']  # Both images are normalized to [0, 1]
+
+    if 'ssim' in metrics:
+        # The scan's local moments are kept on the PreparedScan
+        luminance, contrast_structure = ssim_components(
+            x, y, win_size=scan.window, y_moments=(scan.local_mean, scan.local_var)
+        )
+        result['ssim'] = float(np.mean(luminance * contrast_structure))
+
+    if 'ms_ssim' in metrics:
+        result['ms_ssim'] = ms_ssim(x, y)
+
+    if 'nmi' in metrics or 'histogram' in metrics:
+        qx = quantize(x, bins)
+        if 'nmi' in metrics:
+            result['nmi'] = normalized_mutual_information(x, y, bins, qx, scan.quantized(bins))
+        if 'histogram' in metrics:
+            result.update(histogram_distances(histogram(x, bins, qx), scan.histogram(bins)))
+
+    if 'domain' in metrics:
+        if sim_up is None:
+            raise ValueError("Domain metrics need the simulation up-domain map")
+        sim_stats = domain_statistics(scan.resample_mask(sim_up, sim_extent))
+        scan_stats = scan.domain_stats()
+        result.update(domain_distances(sim_stats, scan_stats))
+        result['sim_domains'] = sim_stats
+        result['afm_domains'] = scan_stats
+
+    if 'phase' in metrics:
+        if sim_up is None:
+            raise ValueError("Phase metrics need the simulation up-domain map")
+        result.update(phase_metrics(sim_up, scan, sim_extent))
+        result['combined'] = (1.0 - phase_weight) * correlation + phase_weight * result['phase_correlation']
+
+    result['match_quality'] = match_quality(correlation)
+    return result
+
+
+def compare_frame_to_scan(frame: np.ndarray, scan: PreparedScan, component: str = 'magnitude',
+                          metrics: Iterable[str] = DEFAULT_METRICS, bins: int = DEFAULT_BINS,
+                          phase_weight: float = DEFAULT_PHASE_WEIGHT,
+                          sim_extent: Optional[Tuple[float, float]] = None,
+                          transform: Optional[Dict] = None) -> Dict:
+    """
+    Metrics of one (2, n, n) polarization frame against a prepared scan (up domains: Py > 0)
+
+    With a transform from align_to_scan, the frame is first moved by it (see apply_alignment).
+    """
+    sim_image = simulation_component(frame, component)
+    sim_up = frame[1] > 0
+    if transform is not None:
+        sim_image, sim_up = apply_alignment(sim_image, scan, transform, sim_up, sim_extent)
+        sim_extent = None
+    return compare_to_scan(sim_image, scan, metrics, sim_up=sim_up, bins=bins,
+                           phase_weight=phase_weight, sim_extent=sim_extent)
+
+
+def correlation_curve(stack: np.ndarray, scan: PreparedScan,
+                      sim_extent: Optional[Tuple[float, float]] = None) -> np.ndarray:
+    """
+    Correlation of every image in a (T, n, n) stack with a prepared scan
+
+    Same values as compare_to_scan's correlation (which is invariant to the
+    min-max normalization), computed for the whole batch on the simulation
+    lattice via PreparedScan.projection instead of resizing each frame.
+    """
+    stack = np.asarray(stack, dtype=np.float64)
+    # Correlation ignores offsets; centring each frame avoids cancellation in the variance
+    stack = stack - stack.mean(axis=(1, 2), keepdims=True)
+    proj = scan.projection(stack.shape[1:], sim_extent)
+    size = scan.image.size
+    sum_x = np.einsum('tij,ij->t', stack, proj['ones'])
+    sum_xy = np.einsum('tij,ij->t', stack, proj['centered'])
+    sum_xx = np.einsum('tij,tij->t', proj['gram_rows'] @ stack, stack @ proj['gram_cols'])
+    std_x = np.sqrt(np.maximum(sum_xx - sum_x ** 2 / size, 0.0))
+    curve = np.zeros(len(stack))
+    # Flat frames (relative to their own range, as after normalize) are left at 0
+    value_range = stack.max(axis=(1, 2)) - stack.min(axis=(1, 2))
+    valid = (value_range > 0) & (std_x > FLAT_STD * value_range * np.sqrt(size))
+    if scan.norm > FLAT_STD * np.sqrt(size):
+        curve[valid] = sum_xy[valid] / (std_x[valid] * scan.norm)
+    return np.clip(curve, -1.0, 1.0)
+
+
+def timestep_search(pmat: np.ndarray, scan: PreparedScan, indices, component: str = 'magnitude',
+                    chunk: int = 256, sim_extent: Optional[Tuple[float, float]] = None) -> Dict:
+    """
+    Correlation against the scan at each selected timestep of a (2, T, n, n) history
+
+    Frames are processed in chunks, so memory stays bounded for long histories.
+
+    Returns:
+        Dict with timesteps, correlation (per timestep), best_timestep and best_correlation
+    """
+    indices = np.asarray(list(indices), dtype=np.int64)
+    if indices.size == 0:
+        raise ValueError("No timesteps selected")
+    curve = np.empty(indices.size)
+    for start in range(0, indices.size, chunk):
+        sel = indices[start:start + chunk]
+        curve[start:start + chunk] = correlation_curve(simulation_component(pmat[:, sel], component), scan,
+                                                            sim_extent)
+    best = int(np.argmax(curve))
+    return {
+        'timesteps': indices.tolist(),
+        'correlation': curve.tolist(),
+        'best_timestep': int(indices[best]),
+        'best_correlation': float(curve[best]),
+    }
+
+
+def objective_score(result: Dict, key: str) -> float:
+    """A result key as a higher-is-better score (negated for errors and distances)"""
+    return -result[key] if key in LOWER_IS_BETTER else result[key]
+
+
+def metrics_for(keys: Iterable[str]) -> List[str]:
+    """Metric groups needed to produce the given result keys"""
+    groups = []
+    for key in keys:
+        if key not in RESULT_GROUPS:
+            raise ValueError(f"Unknown result key: {key}")
+        if RESULT_GROUPS[key] not in groups:
+            groups.append(RESULT_GROUPS[key])
+    return groups
+
+
+def rank_matches(results: List[Dict], sort_by: str = 'correlation') -> List[Dict]:
+    """
+    Sort comparison results best first and number them from 1
+
+    Args:
+        results: Metric dicts, one per simulation
+        sort_by: Result key to rank on (see LOWER_IS_BETTER for the direction)
+
+    Returns:
+        New list of the same dicts with a 'rank' entry added
+    """
+    missing = [r for r in results if sort_by not in r]
+    if missing:
+        raise ValueError(f"Cannot rank by {sort_by}: not among the computed metrics")
+    sign = 1.0 if sort_by in LOWER_IS_BETTER else -1.0
+    ranked = sorted(results, key=lambda r: sign * r[sort_by])
+    for rank, entry in enumerate(ranked, start=1):
+        entry['rank'] = rank
+    return ranked
+
+
+def pyramid_factor(shape: Tuple[int, int], factor: int = PYRAMID_FACTOR,
+                   min_size: int = COARSE_MIN_SIZE) -> int:
+    """Largest downsampling up to factor that keeps the coarse scan at least min_size on each edge"""
+    while factor > 1 and min(shape) // factor < min_size:
+        factor //= 2
+    return max(factor, 1)
+
+
+def screen_frames(frames: Sequence[np.ndarray], scan: PreparedScan, component: str = 'magnitude',
+                  keep: Optional[int] = None, keep_fraction: float = DEFAULT_KEEP_FRACTION,
+                  factor: int = PYRAMID_FACTOR,
+                  sim_extents: Optional[Sequence[Optional[Tuple[float, float]]]] = None
+                  ) -> Tuple[List[int], np.ndarray]:
+    """
+    Coarse stage of coarse-to-fine matching: prune candidates on a downsampled scan
+
+    Every (2, n, n) frame is scored by correlation against the scan
+    downsampled by pyramid_factor(scan.shape, factor), batched per lattice
+    shape and extent with correlation_curve. Only the best candidates go on to the
+    full-resolution metrics.
+
+    Args:
+        frames: Candidate polarization frames
+        scan: Prepared full-resolution scan
+        component: Compared quantity (see simulation_component)
+        keep: Candidates kept (default: keep_fraction of them, at least COARSE_MIN_KEEP)
+        keep_fraction: Share kept when keep is not given
+        factor: Largest downsampling of the coarse level
+        sim_extents: Physical lattice size per frame, as in compare_to_scan
+
+    Returns:
+        (indices of the kept frames, best first; coarse correlation of every frame)
+    """
+    n_frames = len(frames)
+    if keep is None:
+        keep = max(COARSE_MIN_KEEP, int(np.ceil(keep_fraction * n_frames)))
+    coarse = scan.coarse(pyramid_factor(scan.shape, factor))
+
+    if sim_extents is None:
+        sim_extents = [None] * n_frames
+
+    scores = np.empty(n_frames)
+    groups: Dict[Tuple, List[int]] = {}
+    for i, frame in enumerate(frames):
+        groups.setdefault((frame.shape, sim_extents[i]), []).append(i)
+    for (_, extent), indices in groups.items():
+        stack = simulation_component(np.stack([frames[i] for i in indices], axis=1), component)
+        scores[indices] = correlation_curve(stack, coarse, extent)
+
+    order = np.argsort(-scores, kind='stable')
+    return order[:keep].tolist(), scores
+
+
+def residual_map(sim_image: np.ndarray, scan: PreparedScan, transform: Optional[Dict] = None,
+                 sim_extent: Optional[Tuple[float, float]] = None) -> np.ndarray:
+    """
+    Standardized simulation minus standardized scan, per scan pixel
+
+    Both images are z-scored (a flat simulation becomes zero), so the
+    residual shows where the scan departs from the simulated pattern in
+    the units the correlation sees. Positive where the simulation is
+    stronger than the scan (e.g. polarization suppressed around a defect).
+    With a transform from align_to_scan, the simulation is aligned first.
+    """
+    if transform is not None:
+        sim, _ = apply_alignment(sim_image, scan, transform, sim_extent=sim_extent)
+    else:
+        sim = normalize(scan.resample(sim_image, sim_extent))
+    return standardize(sim) - standardize(scan.image)
+
+
+def site_residuals(residual: np.ndarray, sim_shape: Tuple[int, int], scan: PreparedScan,
+                   transform: Optional[Dict] = None,
+                   sim_extent: Optional[Tuple[float, float]] = None) -> np.ndarray:
+    """
+    Pull a scan-grid residual map back onto the simulation lattice
+
+    The alignment (if any) is undone, then each site gets the area-weighted
+    mean of the scan pixels its resampling touches (the transpose of the
+    resampling operator, normalized by its weights; tiles of a periodic
+    lattice fold onto the same sites).
+    """
+    if transform is not None:
+        dy, dx = transform['shift_px']
+        residual = warp(residual, 0.0, 1.0, (-dy, -dx))
+        residual = warp(residual, -transform['rotation_deg'], 1.0 / transform['scale'])
+    resampler = scan.resampler(sim_shape, sim_extent)
+    weight = resampler.adjoint(np.ones(scan.shape))
+    return resampler.adjoint(residual) / np.maximum(weight, 1e-12)
+
+
+def residual_peaks(site_residual: np.ndarray, max_peaks: int = 8, min_distance: int = 2,
+                   threshold: Optional[float] = None, sign: str = 'abs') -> List[Dict]:
+    """
+    Local maxima of a lattice residual map, strongest first
+
+    Args:
+        site_residual: Residual per lattice site (see site_residuals)
+        max_peaks: Peaks returned at most
+        min_distance: Peaks are at least this many sites apart (periodic lattice)
+        threshold: Minimum peak score (default: mean + 2 std of the score map)
+        sign: 'abs' scores |residual|; 'positive' only simulation-stronger
+            regions (polarization suppressed in the scan); 'negative' the reverse
+
+    Returns:
+        Dicts with row, col and residual (signed)
+    """
+    if sign == 'abs':
+        score = np.abs(site_residual)
+    elif sign == 'positive':
+        score = site_residual
+    elif sign == 'negative':
+        score = -site_residual
+    else:
+        raise ValueError(f"Unknown residual sign: {sign}")
+    if threshold is None:
+        threshold = float(score.mean() + 2 * score.std())
+
+    size = 2 * min_distance + 1
+    is_peak = (score == maximum_filter(score, size=size, mode='wrap')) & (score > threshold)
+    rows, cols = np.nonzero(is_peak)
+    order = np.argsort(-score[rows, cols], kind='stable')
+
+    # Plateaus give neighbouring maxima of equal height; keep the first of each
+    peaks = []
+    h, w = score.shape
+    for row, col in zip(rows[order], cols[order]):
+        near = any(min(abs(row - p['row']), h - abs(row - p['row'])) <= min_distance and
+                   min(abs(col - p['col']), w - abs(col - p['col'])) <= min_distance for p in peaks)
+        if not near:
+            peaks.append({'row': int(row), 'col': int(col), 'residual': float(site_residual[row, col])})
+            if len(peaks) == max_peaks:
+                break
+    return peaks
@@ -6,11 +6,18 @@ Run this to test basic MCP server functionality
 
 import os
 import asyncio
+import base64
+import io
 import json
+import queue
+import shutil
 import sys
+import time
 import uuid
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
 from typing import Dict, Any
 import numpy as np
 
@@ -41,6 +48,30 @@ except ImportError:
           file=sys.stderr)
     sys.exit(1)
 
+from observables import AVAILABLE_OBSERVABLES, observe_history
+from comparison import (
+    AVAILABLE_METRICS, DEFAULT_METRICS, DEFAULT_PHASE_WEIGHT, LRUCache, ScanCache, align_to_scan,
+    compare_frame_to_scan, compare_to_scan, metrics_for, objective_score, rank_matches, residual_map,
+    residual_peaks, screen_frames, simulation_component, site_residuals, timestep_search
+)
+from fitting import (
+    DEFAULT_BOUNDS, DEFAULT_PARETO_OBJECTIVES, FIT_METHODS, Fitter, ParameterSpace, ParetoSearch, plausibility
+)
+from animation import ANIMATION_FORMATS, animate_history, frame_indices
+from fast_render import FAST_VIZ_TYPES, png_size, render_png
+from render_cache import RenderCache, content_hash
+from surrogate import MIN_TRAINING, SurrogateStore, summary_observables
+from param_index import ParameterIndex
+from phase_diagram import FAILED, AdaptiveGrid, classify_states
+from hysteresis import DEFAULT_CURVE_POINTS, LOOP_COMPONENTS, hysteresis_loops
+from kinetics import KINETICS_MODELS, aligned_fraction, merz_fit, switched_fraction, switching_kinetics
+from topology import DEFECT_KINDS, track_defects
+from progress import ProgressReporter, format_progress, log_throughput, run_sim_with_progress
+from worker_pool import (
+    SharedArray, WorkerJobs, build_simulation, create_executor, create_progress_manager,
+    discard_shared, run_simulation_job, worker_count
+)
+
 # Import AFM Digital Twin
 try:
     from afm_digital_twin import AFMDigitalTwin
@@ -61,6 +92,11 @@ def safe_serialize(obj):
         return obj.tolist()
     return obj
 
+def json_number(value):
+    """Float for JSON, or None for NaN/Inf (a quantity that was not reached)"""
+    value = float(value)
+    return value if np.isfinite(value) else None
+
 # ============================================================================
 # Electric Field Generation
 # ============================================================================
@@ -123,6 +159,40 @@ def generate_electric_field(field_type: str, time_vec: np.ndarray, params: dict)
     
     return applied_field
 
+def _step_field_at(Ex: float, Ey: float, t_off: float, t: float) -> np.ndarray:
+    """Step waveform: (Ex, Ey) until t_off, zero afterwards"""
+    return np.array([Ex, Ey]) if t < t_off else np.zeros(2)
+
+def _waveform_at(field_type: str, params: dict, t: float) -> np.ndarray:
+    """Evaluate a pointwise waveform from generate_electric_field at time t"""
+    return generate_electric_field(field_type, np.atleast_1d(t), params)[0]
+
+def make_field_function(field_type: str, time_vec: np.ndarray, params: dict):
+    """
+    Build a continuous waveform E(t) for adaptive time stepping
+    
+    Evaluates the same waveforms as generate_electric_field at arbitrary
+    times instead of on a fixed time grid. The result is a partial of a
+    module-level function so it can be pickled to worker processes.
+    
+    Args:
+        field_type: 'sine', 'step', 'polynomial', 'zero'
+        time_vec: Requested output times (sets the step switch-off time)
+        params: Parameters specific to field type
+        
+    Returns:
+        field: Callable returning (Ex, Ey) at time t
+    """
+    if field_type == 'step':
+        step_fraction = params.get('step_fraction', 0.25)
+        step_idx = min(int(len(time_vec) * step_fraction), len(time_vec) - 1)
+        return partial(_step_field_at, params.get('Ex', 0.0), params.get('Ey', 0.5),
+                       float(time_vec[step_idx]))
+    
+    # Check the field type up front rather than on the first solver call
+    generate_electric_field(field_type, time_vec[:1], params)
+    return partial(_waveform_at, field_type, params)
+
 # ============================================================================
 # Defect Generation
 # ============================================================================
@@ -132,7 +202,7 @@ def generate_defects(defect_type: str, n: int, params: dict) -> list:
     Generate defect configurations
     
     Args:
-        defect_type: 'none', 'random', 'periodic', 'custom'
+        defect_type: 'none', 'random', 'periodic', 'sites'
         n: Lattice size
         params: Parameters specific to defect type
         
@@ -188,6 +258,20 @@ def generate_defects(defect_type: str, n: int, params: dict) -> list:
                 
         return defect_list
         
+    elif defect_type == 'sites':
+        # Defects at given [row, col] sites, all with the same field
+        sites = params.get('sites', [])
+        strength = params.get('strength', 15.0)
+        angle = np.deg2rad(params.get('angle_deg', 90.0))  # Default: along +y, as 'periodic'
+        defect_list = [(0.0, 0.0) for _ in range(n_sites)]
+        
+        for row, col in sites:
+            if not (0 <= row < n and 0 <= col < n):
+                raise ValueError(f"Defect site {[row, col]} outside the {n}x{n} lattice")
+            defect_list[row * n + col] = (strength * np.cos(angle), strength * np.sin(angle))
+            
+        return defect_list
+        
     else:
         raise ValueError(f"Unknown defect type: {defect_type}")
 
@@ -195,7 +279,21 @@ def generate_defects(defect_type: str, n: int, params: dict) -> list:
 # Visualization Generation
 # ============================================================================
 
-def generate_visualization(sim: Ferro2DSim, viz_type: str, timestep: int = -1, sim_id: str = "sim") -> str:
+# Rendered PNGs live in display_demo/ next to this script
+DISPLAY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "display_demo")
+
+# Retention policy for cached renders in DISPLAY_DIR
+DISPLAY_MAX_BYTES = 200 * 1024 ** 2
+DISPLAY_MAX_AGE_S = 7 * 24 * 3600
+
+# Default budget for images returned inline as ImageContent
+IMAGE_MAX_PIXELS = 1024
+IMAGE_MAX_BYTES = 1024 ** 2
+IMAGE_MIN_PIXELS = 32
+IMAGE_FIT_ATTEMPTS = 6
+
+def generate_visualization(sim: Ferro2DSim, viz_type: str, timestep: int = -1, sim_id: str = "sim",
+                           filepath=None, dpi: float = 150, max_pixels: int = None):
     """
     Generate visualization and save to display_demo folder
     
@@ -204,15 +302,21 @@ def generate_visualization(sim: Ferro2DSim, viz_type: str, timestep: int = -1, s
         viz_type: 'summary', 'quiver', 'magnitude_angle'
         timestep: Which timestep to visualize (-1 for last)
         sim_id: Simulation ID for filename
+        filepath: Output path or binary file object (default: timestamped file in display_demo)
+        dpi: Resolution of the saved figure
+        max_pixels: Lower dpi so the figure's longest edge stays within this many pixels
         
     Returns:
-        filepath: Path to saved PNG file
+        filepath: Path to saved PNG file (or the file object)
     """
     import matplotlib
     matplotlib.use('Agg')  # Non-interactive backend
     import matplotlib.pyplot as plt
     from datetime import datetime
     
+    if not hasattr(sim, 'plot_summary'):
+        raise ValueError("Plots are only available for fixed-step FerroSim simulations")
+    
     # Create figure based on visualization type
     if viz_type == 'summary':
         fig = sim.plot_summary()
@@ -226,18 +330,19 @@ def generate_visualization(sim: Ferro2DSim, viz_type: str, timestep: int = -1, s
     else:
         raise ValueError(f"Unknown visualization type: {viz_type}")
     
-    # Get absolute path to display_demo folder (relative to this script)
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    output_dir = os.path.join(script_dir, "display_demo")
-    os.makedirs(output_dir, exist_ok=True)
+    if max_pixels is not None:
+        dpi = min(dpi, max_pixels / max(fig.get_size_inches()))
     
-    # Generate filename with timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{sim_id}_{viz_type}_{timestamp}.png"
-    filepath = os.path.join(output_dir, filename)
+    if filepath is None:
+        # Generate filename with timestamp
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"{sim_id}_{viz_type}_{timestamp}.png"
+        filepath = os.path.join(DISPLAY_DIR, filename)
+    if isinstance(filepath, str):
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
     
     # Save to file
-    plt.savefig(filepath, format='png', dpi=150, bbox_inches='tight')
+    plt.savefig(filepath, format='png', dpi=dpi, bbox_inches='tight')
     plt.close(fig)
     
     return filepath
@@ -249,8 +354,16 @@ def generate_visualization(sim: Ferro2DSim, viz_type: str, timestep: int = -1, s
 class SimulationManager:
     """Manages active simulations"""
     
-    def __init__(self):
+    def __init__(self, max_workers: int = None):
         self.simulations: Dict[str, Dict[str, Any]] = {}
+        self.max_workers = max_workers
+        self.executor = None  # Worker process pool, started on first use
+        self.worker_jobs = WorkerJobs()  # Result blocks not yet attached to a simulation
+        self.progress_manager = None  # Serves progress queues to worker jobs
+        self.render_executor = None  # Render thread, started on first use
+        self.render_cache = RenderCache(DISPLAY_DIR, DISPLAY_MAX_BYTES, DISPLAY_MAX_AGE_S)
+        self.surrogates = SurrogateStore()  # Emulators trained on every completed run
+        self.param_index = ParameterIndex()  # Nearest completed runs in parameter space
     
     def create_simulation(self, params: dict) -> str:
         """Create new simulation instance with advanced options"""
@@ -263,6 +376,13 @@ class SimulationManager:
         mode = params.get('mode', 'tetragonal')
         dep_alpha = params.get('dep_alpha', 0.0)
         init_mode = params.get('init', 'pr')  # 'pr', 'random', 'up', 'down'
+        integrator = params.get('integrator', 'fixed')  # 'fixed' or 'adaptive'
+        observables = list(params.get('observables', []))  # Streaming reducers
+        record_history = params.get('record_history', True)
+        
+        unknown = sorted(set(observables) - set(AVAILABLE_OBSERVABLES))
+        if unknown:
+            raise ValueError(f"Unknown observables: {unknown}")
         
         # Create time vector
         if 'time_vec' in params:
@@ -275,16 +395,23 @@ class SimulationManager:
         
         # Generate electric field
         field_config = params.get('field_config', {})
+        field_fn = None  # Continuous waveform for adaptive stepping
         if 'applied_field' in params:
             applied_field = np.array(params['applied_field'])
         elif field_config:
             field_type = field_config.get('type', 'sine')
             field_params = field_config.get('params', {})
             applied_field = generate_electric_field(field_type, time_vec, field_params)
+            if integrator == 'adaptive':
+                field_fn = make_field_function(field_type, time_vec, field_params)
         else:
             # Default: sine wave in y direction
             applied_field = np.zeros((len(time_vec), 2))
             applied_field[:, 1] = 10 * np.sin(time_vec * 2 * np.pi * 2)
+            if integrator == 'adaptive':
+                field_fn = make_field_function('sine', time_vec, {
+                    'amplitude_x': 0.0, 'amplitude_y': 10.0, 'freq_y': 2.0
+                })
         
         # Generate defects
         defect_config = params.get('defect_config', {})
@@ -297,24 +424,50 @@ class SimulationManager:
         else:
             defects = [(0, 0) for _ in range(n * n)]
         
+        # Constructor arguments are kept so the simulation can be rebuilt
+        # inside a worker process
+        sim_kwargs = {
+            'n': n,
+            'gamma': gamma,
+            'k': k,
+            'mode': mode,
+            'dep_alpha': dep_alpha,
+            'time_vec': time_vec,
+            'appliedE': applied_field,
+            'defects': defects,
+            'init': init_mode
+        }
+        if integrator == 'adaptive':
+            # time_vec holds the output times; the step size is chosen
+            # by the error controller and the field is evaluated in between
+            sim_kwargs.update({
+                'field_fn': field_fn,
+                'rtol': params.get('rtol', 1e-4),
+                'atol': params.get('atol', 1e-6),
+                'method': params.get('method', 'RK45'),
+                'seed': params.get('seed', None),
+                'observables': observables,
+                'record_history': record_history
+            })
+        elif integrator != 'fixed':
+            raise ValueError(f"Unknown integrator: {integrator}")
+        elif not record_history:
+            raise ValueError("record_history=False requires the adaptive integrator")
+        
         # Create simulation
         try:
-            sim = Ferro2DSim(
-                n=n,
-                gamma=gamma,
-                k=k,
-                mode=mode,
-                dep_alpha=dep_alpha,
-                time_vec=time_vec,
-                appliedE=applied_field,
-                defects=defects,
-                init=init_mode
-            )
+            sim = build_simulation(integrator, sim_kwargs)
             
             self.simulations[sim_id] = {
                 'sim': sim,
+                'sim_kwargs': sim_kwargs,
+                'integrator': integrator,
+                'observables': observables,
                 'params': params,
                 'results': None,
+                'pmat': None,  # (2, timesteps, n, n) history, local or shared view
+                'pmat_block': None,  # SharedArray backing 'pmat' for worker runs
+                'content_hash': None,  # Digest of 'pmat' for the render cache
                 'status': 'created'
             }
             
@@ -323,49 +476,182 @@ class SimulationManager:
         except Exception as e:
             raise ValueError(f"Failed to create simulation: {str(e)}")
     
-    def run_simulation(self, sim_id: str, verbose: bool = False) -> dict:
-        """Run simulation and store results"""
+    def _record_completion(self, sim_id: str):
+        """Feed a completed run to the surrogates and the parameter index"""
+        sim_data = self.simulations[sim_id]
+        self.surrogates.add(sim_data['params'], sim_data['pmat'][:, -1], sim_id)
+        self.param_index.add(sim_id, sim_data['params'])
+    
+    def _completion_summary(self, sim_id: str) -> dict:
+        """Response for a finished run, read from the stored history"""
+        sim_data = self.simulations[sim_id]
+        results = sim_data['results']
+        pmat_final = sim_data['pmat'][:, -1, :, :]  # Get last timestep: (2, n, n)
+        
+        response = {
+            'sim_id': sim_id,
+            'status': 'completed',
+            'total_polarization': safe_serialize(results['Polarization']),
+            'final_Px': safe_serialize(pmat_final[0, :, :]),
+            'final_Py': safe_serialize(pmat_final[1, :, :])
+        }
+        
+        # Step statistics from the adaptive integrator
+        if 'n_steps' in results:
+            response['integration'] = {
+                'n_steps': results['n_steps'],
+                'nfev': results['nfev'],
+                'output_times': sim_data['pmat'].shape[1]
+            }
+        
+        if results.get('observables'):
+            response['observables'] = {
+                key: safe_serialize(series) for key, series in results['observables'].items()
+            }
+        
+        if sim_data['pmat_block'] is not None:
+            response['execution'] = 'worker'
+        
+        if sim_data.get('throughput'):
+            response['throughput'] = sim_data['throughput']
+        
+        return response
+    
+    def _release_shared(self, sim_data: dict):
+        """Unlink the shared block behind a worker result; views already handed out stay readable"""
+        if sim_data.get('pmat_block') is not None:
+            sim_data['pmat'] = None
+            sim_data['pmat_block'].unlink()
+            sim_data['pmat_block'] = None
+    
+    def _get_executor(self):
+        """Lazily start the worker process pool"""
+        if self.executor is None:
+            self.executor = create_executor(self.max_workers)
+        return self.executor
+    
+    def create_progress_queue(self):
+        """Queue that a worker job can put progress events into"""
+        if self.progress_manager is None:
+            self.progress_manager = create_progress_manager()
+        return self.progress_manager.Queue()
+    
+    def run_simulation(self, sim_id: str, verbose: bool = False, in_worker: bool = False,
+                       progress=None) -> dict:
+        """
+        Run simulation and store results
+        
+        Args:
+            progress: Optional callback(step, total), e.g. a ProgressReporter
+        """
         if sim_id not in self.simulations:
             raise ValueError(f"Simulation {sim_id} not found")
         
+        if in_worker:
+            payload = self.submit_simulation(sim_id).result()
+            return self.collect_worker_result(sim_id, payload)
+        
         sim_data = self.simulations[sim_id]
         sim = sim_data['sim']
         
         try:
-            # Redirect stdout to stderr temporarily to prevent progress bars
-            # from interfering with JSON-RPC protocol
-            import sys
-            old_stdout = sys.stdout
-            if verbose:
-                sys.stdout = sys.stderr
+            # Simulation output is captured per thread and kept off stdout (JSON-RPC)
+            start = time.perf_counter()
+            results = run_sim_with_progress(sim, progress, verbose)
+            elapsed = time.perf_counter() - start
+            self._release_shared(sim_data)
+            sim_data['content_hash'] = None
+            sim_data['results'] = results
+            sim_data['pmat'] = sim.getPmat()  # Returns shape: (2, timesteps, n, n)
             
-            try:
-                # Run simulation
-                results = sim.runSim(calc_pr=False, verbose=verbose)
-                sim_data['results'] = results
-                sim_data['status'] = 'completed'
-            finally:
-                # Restore stdout
-                sys.stdout = old_stdout
+            # FerroSim's loop cannot be hooked: stream the stored frames instead
+            if sim_data['observables'] and 'observables' not in results:
+                results['observables'] = observe_history(
+                    sim_data['observables'], sim_data['sim_kwargs'], sim_data['pmat']
+                )
             
-            # Get final polarization map
-            pmat = sim.getPmat()  # Returns shape: (2, timesteps, n, n)
-            pmat_final = pmat[:, -1, :, :]  # Get last timestep: (2, n, n)
+            sim_data['throughput'] = log_throughput(
+                sim_id, len(sim_data['sim_kwargs']['time_vec']),
+                sim_data['sim_kwargs']['n'], elapsed, 'inline'
+            )
+            sim_data['status'] = 'completed'
+            self._record_completion(sim_id)
             
-            return {
-                'sim_id': sim_id,
-                'status': 'completed',
-                'total_polarization': safe_serialize(results['Polarization']),
-                'final_Px': safe_serialize(pmat_final[0, :, :]),
-                'final_Py': safe_serialize(pmat_final[1, :, :])
-            }
+            return self._completion_summary(sim_id)
             
         except Exception as e:
             sim_data['status'] = 'failed'
             raise RuntimeError(f"Simulation failed: {str(e)}")
     
-    def get_results(self, sim_id: str, timestep: int = -1) -> dict:
-        """Get simulation results"""
+    def submit_simulation(self, sim_id: str, progress_queue=None):
+        """
+        Queue a simulation on the worker pool
+        
+        Args:
+            progress_queue: Optional queue from create_progress_queue that
+                            receives throttled progress events
+        
+        Returns:
+            concurrent.futures.Future resolving to the worker payload;
+            pass it to collect_worker_result
+        """
+        if sim_id not in self.simulations:
+            raise ValueError(f"Simulation {sim_id} not found")
+        
+        sim_data = self.simulations[sim_id]
+        future = self._get_executor().submit(
+            run_simulation_job, sim_data['integrator'], sim_data['sim_kwargs'],
+            sim_data['observables'], progress_queue
+        )
+        sim_data['status'] = 'running'
+        self.worker_jobs.track(future)
+        
+        def mark_failed(done):
+            if done.cancelled() or done.exception() is not None:
+                sim_data['status'] = 'failed'
+        
+        future.add_done_callback(mark_failed)
+        return future
+    
+    def abandon_simulation(self, sim_id: str, future):
+        """Give up on a submitted job; its shared result block is freed"""
+        self.worker_jobs.abandon(future)
+        sim_data = self.simulations.get(sim_id)
+        if sim_data is not None and sim_data['status'] == 'running':
+            sim_data['status'] = 'failed'
+    
+    def collect_worker_result(self, sim_id: str, payload: dict) -> dict:
+        """Attach to a worker's shared result block and mark the run completed"""
+        self.worker_jobs.claim(payload['pmat'])
+        sim_data = self.simulations.get(sim_id)
+        if sim_data is None:
+            discard_shared(payload['pmat'])
+            raise ValueError(f"Simulation {sim_id} not found")
+        
+        try:
+            block = SharedArray.attach(payload['pmat'])
+        except Exception as e:
+            sim_data['status'] = 'failed'
+            raise RuntimeError(f"Simulation failed: {str(e)}")
+        
+        self._release_shared(sim_data)
+        sim_data['content_hash'] = None
+        sim_data['pmat_block'] = block
+        sim_data['pmat'] = block.array  # View, no copy
+        sim_data['results'] = {'Polarization': payload['polarization'], **payload['stats']}
+        if payload['observables']:
+            sim_data['results']['observables'] = payload['observables']
+        sim_data['throughput'] = log_throughput(
+            sim_id, len(sim_data['sim_kwargs']['time_vec']),
+            sim_data['sim_kwargs']['n'], payload['elapsed'], 'worker'
+        )
+        sim_data['status'] = 'completed'
+        self._record_completion(sim_id)
+        
+        return self._completion_summary(sim_id)
+    
+    def get_pmat(self, sim_id: str) -> np.ndarray:
+        """Polarization history (2, timesteps, n, n) of a completed simulation, without copying"""
         if sim_id not in self.simulations:
             raise ValueError(f"Simulation {sim_id} not found")
         
@@ -373,27 +659,261 @@ class SimulationManager:
         if sim_data['status'] != 'completed':
             raise ValueError(f"Simulation not completed yet")
         
-        sim = sim_data['sim']
-        pmat = sim.getPmat()  # Returns shape: (2, timesteps, n, n)
+        return sim_data['pmat']
+    
+    def get_observables(self, sim_id: str, stride: int = 1) -> dict:
+        """Streaming observable time series of a completed simulation"""
+        self.get_pmat(sim_id)  # Validates the simulation exists and completed
+        series = self.simulations[sim_id]['results'].get('observables')
+        if not series:
+            raise ValueError(f"Simulation {sim_id} was not run with observables")
         
-        if timestep == -1:
-            # Get last timestep
-            pmat_result = pmat[:, -1, :, :]
-            return {
-                'sim_id': sim_id,
-                'timestep': timestep,
-                'Px': safe_serialize(pmat_result[0, :, :]),
-                'Py': safe_serialize(pmat_result[1, :, :]),
-            }
+        return {
+            'sim_id': sim_id,
+            'stride': stride,
+            'observables': {key: safe_serialize(values[::stride]) for key, values in series.items()}
+        }
+    
+    def get_results(self, sim_id: str, timestep: int = -1) -> dict:
+        """Get simulation results"""
+        pmat = self.get_pmat(sim_id)  # Returns shape: (2, timesteps, n, n)
+        
+        # Only the requested (2, n, n) slice is converted
+        pmat_result = pmat[:, timestep, :, :]
+        return {
+            'sim_id': sim_id,
+            'timestep': timestep,
+            'Px': safe_serialize(pmat_result[0, :, :]),
+            'Py': safe_serialize(pmat_result[1, :, :]),
+        }
+    
+    def shutdown(self):
+        """Stop the worker pool and free all shared result blocks"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        self.worker_jobs.close()
+        if self.progress_manager is not None:
+            self.progress_manager.shutdown()
+            self.progress_manager = None
+        if self.render_executor is not None:
+            self.render_executor.shutdown(wait=False, cancel_futures=True)
+            self.render_executor = None
+        for sim_data in self.simulations.values():
+            self._release_shared(sim_data)
+    
+    def delete_simulation(self, sim_id: str):
+        """Drop a simulation and free its shared result block"""
+        sim_data = self.simulations.pop(sim_id, None)
+        if sim_data is not None:
+            self._release_shared(sim_data)
+        self.surrogates.remove(sim_id)
+        self.param_index.remove(sim_id)
+    
+    def find_similar_simulations(self, params: dict, k: int = 5, max_distance: float = None) -> dict:
+        """
+        Nearest completed simulations to a parameter set, with their final-state observables
+        
+        Returns:
+            Dict with the configuration label and neighbours (sim_id, distance,
+            identical, params, observables, elapsed_s), nearest first
+        """
+        label, neighbours = self.param_index.query(params, k, max_distance)
+        requested = json.dumps(params, sort_keys=True, default=str)
+        for neighbour in neighbours:
+            sim_data = self.simulations[neighbour['sim_id']]
+            # The configuration key skips settings that cannot change the result
+            # (e.g. the seed of a non-random run); 'identical' needs every parameter
+            neighbour['identical'] = (neighbour['identical'] and
+                                      json.dumps(sim_data['params'], sort_keys=True, default=str) == requested)
+            neighbour['params'] = {key: value for key, value in sim_data['params'].items()
+                                   if key not in ('time_vec', 'applied_field')}
+            neighbour['observables'] = summary_observables(sim_data['pmat'][:, -1])
+            throughput = sim_data.get('throughput') or {}
+            if 'elapsed_s' in throughput:
+                neighbour['elapsed_s'] = throughput['elapsed_s']
+        return {'configuration': label, 'indexed': len(self.param_index), 'neighbours': neighbours}
+    
+    def hysteresis_analysis(self, sim_ids: list, component: str = 'y',
+                            n_points: int = DEFAULT_CURVE_POINTS, include_curves: bool = False) -> dict:
+        """
+        P-E loop metrics of completed simulations, batched by trajectory length
+        
+        Uses the lattice-averaged polarization and the applied field at the
+        output times, so runs without a recorded history work too.
+        
+        Returns:
+            Dict with one entry per analysed sim_id (loop metrics, plus the
+            interpolated branches with include_curves) and skipped sim_ids
+        """
+        if component not in LOOP_COMPONENTS:
+            raise ValueError(f"Unknown component: {component}; use one of {list(LOOP_COMPONENTS)}")
+        axis = LOOP_COMPONENTS[component]
+        
+        traces, skipped = {}, {}
+        for sim_id in sim_ids:
+            sim_data = self.simulations.get(sim_id)
+            if sim_data is None:
+                skipped[sim_id] = f"Simulation {sim_id} not found"
+            elif sim_data['status'] != 'completed':
+                skipped[sim_id] = "Simulation not completed yet"
+            else:
+                traces[sim_id] = (np.asarray(sim_data['sim_kwargs']['appliedE'])[:, axis],
+                                  np.asarray(sim_data['results']['Polarization'])[axis])
+        
+        groups = {}
+        for sim_id, (field, polarization) in traces.items():
+            groups.setdefault(len(field), []).append(sim_id)
+        loops = {}
+        for ids in groups.values():
+            metrics = hysteresis_loops(np.stack([traces[i][0] for i in ids]),
+                                       np.stack([traces[i][1] for i in ids]), n_points)
+            for row, sim_id in enumerate(ids):
+                # Unreached quantities stay null rather than becoming 0
+                entry = {name: values[row].item() if values.dtype == bool else json_number(values[row])
+                         for name, values in metrics.items() if values.ndim == 1}
+                if include_curves:
+                    entry.update({name: [json_number(v) for v in metrics[name][row]]
+                                  for name in ('field_grid', 'p_rising', 'p_falling')})
+                loops[sim_id] = entry
+        return {'component': component, 'loops': loops, 'skipped': skipped}
+    
+    def _switching_trace(self, sim_id: str) -> dict:
+        """Switched fraction while the first field step is on, from history or observables"""
+        sim_data = self.simulations.get(sim_id)
+        if sim_data is None:
+            raise ValueError(f"Simulation {sim_id} not found")
+        if sim_data['status'] != 'completed':
+            raise ValueError("Simulation not completed yet")
+        field = np.asarray(sim_data['sim_kwargs']['appliedE'], dtype=np.float64)
+        time_vec = np.asarray(sim_data['sim_kwargs']['time_vec'], dtype=np.float64)
+        
+        applied = np.flatnonzero(np.hypot(field[:, 0], field[:, 1]) > 0)
+        if applied.size == 0:
+            raise ValueError("No field is applied")
+        onset = applied[0]
+        changed = np.flatnonzero(np.any(field[onset:] != field[onset], axis=1))
+        end = onset + changed[0] if changed.size else len(field)
+        amplitude = float(np.hypot(*field[onset]))
+        direction = field[onset] / amplitude
+        
+        pmat = sim_data['pmat']
+        series = sim_data['results'].get('observables') or {}
+        if pmat.shape[1] == len(time_vec):
+            aligned = aligned_fraction(pmat[:, onset:end], direction)
+        elif 'up_fraction' in series and direction[0] == 0:
+            aligned = series['up_fraction' if direction[1] > 0 else 'down_fraction'][onset:end]
         else:
-            # Get specific timestep
-            pmat_result = pmat[:, timestep, :, :]
-            return {
-                'sim_id': sim_id,
-                'timestep': timestep,
-                'Px': safe_serialize(pmat_result[0, :, :]),
-                'Py': safe_serialize(pmat_result[1, :, :]),
+            raise ValueError("Needs a recorded history, or the up_down_fraction observable "
+                             "for a field along y")
+        if end - onset < 3:
+            raise ValueError("The field step covers fewer than 3 output times")
+        switched = switched_fraction(aligned)
+        if np.isnan(switched[0]):
+            raise ValueError("Every site is already aligned with the field")
+        return {'t': time_vec[onset:end] - time_vec[onset], 's': switched,
+                'field_amplitude': amplitude, 'field_direction': direction.tolist()}
+    
+    def switching_kinetics(self, sim_ids: list, models=KINETICS_MODELS, include_curves: bool = False) -> dict:
+        """
+        Switched fraction and fitted kinetics of step-field simulations, fitted as one batch
+        
+        The window is the first field step (from the first non-zero field
+        sample until the field changes); sites count as switched once P
+        points along the field. With two or more step amplitudes, the
+        characteristic times are also fitted with the Merz law.
+        
+        Returns:
+            Dict with per-sim kinetics, the Merz fit (or None) and skipped sim_ids
+        """
+        traces, skipped = {}, {}
+        for sim_id in sim_ids:
+            try:
+                traces[sim_id] = self._switching_trace(sim_id)
+            except ValueError as e:
+                skipped[sim_id] = str(e)
+        if not traces:
+            return {'models': list(models), 'kinetics': {}, 'merz': None, 'skipped': skipped}
+        
+        ids = list(traces)
+        length = max(len(traces[i]['t']) for i in ids)
+        t = np.full((len(ids), length), np.nan)
+        s = np.full((len(ids), length), np.nan)
+        for row, sim_id in enumerate(ids):
+            t[row, :len(traces[sim_id]['t'])] = traces[sim_id]['t']
+            s[row, :len(traces[sim_id]['s'])] = traces[sim_id]['s']
+        fits = switching_kinetics(t, s, models)
+        
+        kinetics = {}
+        for row, sim_id in enumerate(ids):
+            trace = traces[sim_id]
+            entry = {
+                'field_amplitude': trace['field_amplitude'],
+                'field_direction': trace['field_direction'],
+                'final_switched_fraction': json_number(trace['s'][-1]),
+                **{name: json_number(values[row]) for name, values in fits.items()},
+            }
+            if include_curves:
+                entry['t'] = trace['t'].tolist()
+                entry['switched_fraction'] = trace['s'].tolist()
+            kinetics[sim_id] = entry
+        
+        characteristic = fits['kai_t0'] if 'kai_t0' in fits else fits['nls_tau']
+        merz = merz_fit([traces[i]['field_amplitude'] for i in ids], characteristic)
+        return {'models': list(models), 'kinetics': kinetics, 'merz': merz, 'skipped': skipped}
+    
+    def topological_defects(self, sim_id: str, stride: int = None, max_frames: int = 50,
+                            include_positions: bool = True, max_listed: int = 200) -> dict:
+        """
+        Winding-number defects and circulation of P over a simulation's history
+        
+        Every stride-th recorded frame is analysed (by default the stride
+        keeps at most max_frames frames); runs without a recorded history
+        give their final frame only. At most max_listed defects are listed
+        per frame.
+        
+        Returns:
+            Dict with per-frame charge counts, mean |curl|, per-kind counts
+            and (with include_positions) defect positions, charges and kinds
+        """
+        pmat = self.get_pmat(sim_id)
+        sim_data = self.simulations[sim_id]
+        time_vec = np.asarray(sim_data['sim_kwargs']['time_vec'])
+        if pmat.shape[1] != len(time_vec):
+            time_vec = time_vec[-1:]  # Final frame only (record_history=False)
+        if stride is None:
+            stride = max(1, -(-pmat.shape[1] // max_frames))
+        tracked = track_defects(pmat, stride)
+        
+        timesteps = []
+        for i, frame in enumerate(tracked['frames']):
+            found = tracked['defects'][i]
+            entry = {
+                'frame': int(frame),
+                'time': float(time_vec[frame]),
+                'positive': int(tracked['positive'][i]),
+                'negative': int(tracked['negative'][i]),
+                'mean_abs_curl': float(tracked['mean_abs_curl'][i]),
+                'kinds': {kind: int(np.count_nonzero(found['kind'] == kind)) for kind in DEFECT_KINDS},
             }
+            if include_positions:
+                entry['defects'] = [
+                    {'row': float(found['row'][j]), 'col': float(found['col'][j]),
+                     'charge': int(found['charge'][j]), 'kind': str(found['kind'][j]),
+                     'curl': float(found['curl'][j]), 'divergence': float(found['divergence'][j])}
+                    for j in range(min(len(found['row']), max_listed))
+                ]
+                entry['truncated'] = len(found['row']) > max_listed
+            timesteps.append(entry)
+        
+        return {
+            'sim_id': sim_id,
+            'mode': sim_data['sim_kwargs']['mode'],
+            'stride': stride,
+            'frames_analysed': len(timesteps),
+            'max_defects': int((tracked['positive'] + tracked['negative']).max()),
+            'timesteps': timesteps,
+        }
     
     def list_simulations(self) -> list:
         """List all simulations"""
@@ -406,17 +926,187 @@ class SimulationManager:
             for sim_id, data in self.simulations.items()
         ]
     
-    def visualize_simulation(self, sim_id: str, viz_type: str = 'summary', timestep: int = -1) -> str:
-        """Generate visualization for a completed simulation and save to file"""
-        if sim_id not in self.simulations:
-            raise ValueError(f"Simulation {sim_id} not found")
+    def _resolve_renderer(self, sim_id: str, renderer: str) -> str:
+        """
+        Pick 'matplotlib' or 'fast' for a simulation
         
+        'auto' uses FerroSim's plots when the sim object lives in this process
+        and the fast renderer otherwise (worker and adaptive runs).
+        """
         sim_data = self.simulations[sim_id]
-        if sim_data['status'] != 'completed':
-            raise ValueError(f"Simulation not completed yet")
+        plottable = sim_data['pmat_block'] is None and hasattr(sim_data['sim'], 'plot_summary')
+        if renderer == 'auto':
+            return 'matplotlib' if plottable else 'fast'
+        if renderer == 'matplotlib' and not plottable:
+            raise ValueError("Matplotlib plots are only available for fixed-step simulations "
+                             "run in the server process; use renderer='fast'")
+        if renderer not in ('matplotlib', 'fast'):
+            raise ValueError(f"Unknown renderer: {renderer}")
+        return renderer
+    
+    def _render_key(self, sim_id: str, viz_type: str, timestep: int, renderer: str = 'matplotlib') -> tuple:
+        """Cache key (sim_id, viz_type, timestep, content hash) for a render"""
+        sim_data = self.simulations[sim_id]
+        if sim_data.get('content_hash') is None:
+            sim_data['content_hash'] = content_hash(self.get_pmat(sim_id))
         
-        sim = sim_data['sim']
-        return generate_visualization(sim, viz_type, timestep, sim_id)
+        # The summary plot covers the whole run, independent of timestep
+        if viz_type == 'summary':
+            timestep = None
+        if renderer == 'fast':
+            viz_type = f"{viz_type}_fast"
+        return (sim_id, viz_type, timestep, sim_data['content_hash'])
+    
+    def cached_visualization(self, sim_id: str, viz_type: str = 'summary', timestep: int = -1,
+                             renderer: str = 'auto'):
+        """Path of an existing render for unchanged results, or None"""
+        self.get_pmat(sim_id)  # Validates the simulation exists and completed
+        renderer = self._resolve_renderer(sim_id, renderer)
+        return self.render_cache.get(self._render_key(sim_id, viz_type, timestep, renderer))
+    
+    def _get_render_executor(self):
+        """Lazily start the render thread (pyplot state is not thread-safe, so one worker)"""
+        if self.render_executor is None:
+            self.render_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='render')
+        return self.render_executor
+    
+    def submit_visualization(self, sim_id: str, viz_type: str = 'summary', timestep: int = -1,
+                             renderer: str = 'auto'):
+        """Render on the render thread; returns a Future resolving to the filepath"""
+        return self._get_render_executor().submit(
+            self.visualize_simulation, sim_id, viz_type, timestep, renderer
+        )
+    
+    def visualize_simulation(self, sim_id: str, viz_type: str = 'summary', timestep: int = -1,
+                             renderer: str = 'auto') -> str:
+        """Generate visualization for a completed simulation and save to file"""
+        pmat = self.get_pmat(sim_id)  # Validates the simulation exists and completed
+        renderer = self._resolve_renderer(sim_id, renderer)
+        if viz_type not in FAST_VIZ_TYPES:
+            raise ValueError(f"Unknown visualization type: {viz_type}")
+        
+        key = self._render_key(sim_id, viz_type, timestep, renderer)
+        filepath = self.render_cache.get(key)
+        if filepath is not None:
+            return filepath
+        
+        filepath = self.render_cache.path_for(key)
+        if renderer == 'fast':
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            with open(filepath, 'wb') as f:
+                f.write(render_png(pmat, viz_type, timestep))
+        else:
+            generate_visualization(self.simulations[sim_id]['sim'], viz_type, timestep, sim_id,
+                                   filepath=filepath)
+        self.render_cache.put(key, filepath)
+        return filepath
+    
+    def render_image(self, sim_id: str, viz_type: str = 'summary', timestep: int = -1,
+                     renderer: str = 'auto', max_pixels: int = IMAGE_MAX_PIXELS,
+                     max_bytes: int = IMAGE_MAX_BYTES, source: str = None) -> bytes:
+        """
+        PNG bytes of a visualization within a pixel and byte budget
+        
+        An existing render (source) is returned as-is when it already fits;
+        otherwise the image is re-rendered in memory, shrinking until it fits.
+        
+        Args:
+            max_pixels: Longest image edge in pixels
+            max_bytes: Largest encoded PNG size
+            source: Path of a render of the same visualization on disk
+        """
+        pmat = self.get_pmat(sim_id)  # Validates the simulation exists and completed
+        renderer = self._resolve_renderer(sim_id, renderer)
+        if viz_type not in FAST_VIZ_TYPES:
+            raise ValueError(f"Unknown visualization type: {viz_type}")
+        
+        if source is not None:
+            with open(source, 'rb') as f:
+                png = f.read()
+            if max(png_size(png)) <= max_pixels and len(png) <= max_bytes:
+                return png
+        
+        limit = max_pixels
+        for _ in range(IMAGE_FIT_ATTEMPTS):
+            if renderer == 'fast':
+                png = render_png(pmat, viz_type, timestep, size=limit)
+            else:
+                buffer = io.BytesIO()
+                generate_visualization(self.simulations[sim_id]['sim'], viz_type, timestep,
+                                       sim_id, filepath=buffer, max_pixels=limit)
+                png = buffer.getvalue()
+            
+            edge = max(png_size(png))
+            if edge <= max_pixels and len(png) <= max_bytes:
+                return png
+            
+            # Shrink by the pixel overshoot, or by the byte overshoot (bytes scale with area)
+            shrink = min(max_pixels / edge, (max_bytes / len(png)) ** 0.5, 0.9)
+            limit = int(min(limit, edge) * shrink)
+            if limit < IMAGE_MIN_PIXELS:
+                break
+        
+        raise ValueError(f"Could not fit the {viz_type} image within {max_pixels} px "
+                         f"and {max_bytes} bytes")
+    
+    def submit_image(self, sim_id: str, viz_type: str = 'summary', timestep: int = -1,
+                     renderer: str = 'auto', max_pixels: int = IMAGE_MAX_PIXELS,
+                     max_bytes: int = IMAGE_MAX_BYTES, source: str = None):
+        """Render inline image bytes on the render thread; returns a Future"""
+        return self._get_render_executor().submit(
+            self.render_image, sim_id, viz_type, timestep, renderer, max_pixels, max_bytes, source
+        )
+    
+    def animate_simulation(self, sim_id: str, viz_type: str = 'magnitude_angle', stride: int = 1,
+                           output_format: str = 'apng', fps: int = 10, in_workers: bool = True,
+                           progress=None) -> dict:
+        """
+        Stream the stored history into an animated PNG or a folder of frames
+        
+        Args:
+            sim_id: Simulation ID
+            viz_type: 'magnitude_angle' or 'quiver'
+            stride: Use every stride-th timestep
+            output_format: 'apng' or 'frames', both cached like other renders
+            fps: Playback rate for 'apng'
+            in_workers: Render and compress frames in the worker process pool
+            progress: Optional callback(frames_written, n_frames)
+        """
+        pmat = self.get_pmat(sim_id)  # Validates the simulation exists and completed
+        if output_format not in ANIMATION_FORMATS:
+            raise ValueError(f"Unknown animation format: {output_format}")
+        n_frames = len(frame_indices(pmat.shape[1], stride))
+        
+        # Both formats live in the render cache, so its retention policy covers them
+        if output_format == 'apng':
+            key = self._render_key(sim_id, f"{viz_type}_anim_s{stride}_f{fps}", None, 'fast')
+            extension = '.png'
+        else:
+            key = self._render_key(sim_id, f"{viz_type}_frames_s{stride}", None, 'fast')
+            extension = ''
+        output = self.render_cache.get(key, extension)
+        if output is not None:
+            return {'output': output, 'format': output_format, 'frames': n_frames,
+                    'stride': stride, 'cached': True}
+        
+        # Write under a temporary name so an interrupted export is never served from cache
+        executor = self._get_executor() if in_workers and n_frames > 1 else None
+        output = self.render_cache.path_for(key, extension)
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        try:
+            info = animate_history(pmat, output + '.part', viz_type, stride, output_format, fps,
+                                   executor=executor, workers=worker_count(self.max_workers),
+                                   progress=progress)
+        except BaseException:
+            if os.path.isdir(output + '.part'):
+                shutil.rmtree(output + '.part', ignore_errors=True)
+            raise
+        os.replace(output + '.part', output)
+        info['output'] = output
+        self.render_cache.put(key, output)
+        
+        info['cached'] = False
+        return info
 
 # ============================================================================
 # MCP Server Setup
@@ -432,103 +1122,865 @@ if AFM_AVAILABLE:
 else:
     afm_manager = None
 
-@app.list_tools()
-async def list_tools() -> list[types.Tool]:
-    """List available MCP tools"""
-    tools = [
-        types.Tool(
-            name="initialize_simulation",
-            description="Create a new FerroSim simulation with basic or advanced parameters. Supports custom electric fields, defects, and ground state calculations.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "n": {
-                        "type": "integer",
-                        "description": "Lattice size (NxN grid)",
-                        "default": 10
-                    },
-                    "gamma": {
-                        "type": "number",
-                        "description": "Kinetic coefficient (domain wall mobility)",
-                        "default": 1.0
-                    },
-                    "k": {
-                        "type": "number",
-                        "description": "Coupling constant for nearest neighbors",
-                        "default": 1.0
-                    },
-                    "mode": {
-                        "type": "string",
-                        "description": "Material mode",
-                        "enum": ["tetragonal", "rhombohedral", "uniaxial", "squareelectric"],
-                        "default": "tetragonal"
-                    },
-                    "dep_alpha": {
-                        "type": "number",
-                        "description": "Depolarization constant",
-                        "default": 0.0
-                    },
-                    "init": {
-                        "type": "string",
-                        "description": "Initial condition: 'pr' (positive remnant), 'random' (for ground states), 'up', 'down'",
-                        "enum": ["pr", "random", "up", "down"],
-                        "default": "pr"
-                    },
-                    "t_start": {
-                        "type": "number",
-                        "description": "Start time",
-                        "default": 0.0
-                    },
-                    "t_end": {
-                        "type": "number",
-                        "description": "End time",
-                        "default": 1.0
-                    },
-                    "n_steps": {
-                        "type": "integer",
-                        "description": "Number of time steps",
-                        "default": 1000
-                    },
-                    "field_config": {
-                        "type": "object",
-                        "description": "Electric field configuration: {type: 'sine'|'step'|'polynomial'|'zero', params: {...}}",
-                        "properties": {
-                            "type": {"type": "string"},
-                            "params": {"type": "object"}
-                        }
-                    },
-                    "defect_config": {
-                        "type": "object",
-                        "description": "Defect configuration: {type: 'none'|'random'|'periodic', params: {...}}",
-                        "properties": {
-                            "type": {"type": "string"},
-                            "params": {"type": "object"}
-                        }
-                    }
-                },
-                "required": []
-            }
-        ),
+# Normalized AFM images and local statistics, reused across comparisons
+scan_cache = ScanCache()
+
+def scan_extent(params: dict):
+    """Physical (height, width) of a scan in meters from its y/x ranges, if known"""
+    x_range, y_range = params.get('x_range'), params.get('y_range')
+    if not x_range or not y_range or None in x_range or None in y_range:
+        return None
+    return (abs(y_range[1] - y_range[0]), abs(x_range[1] - x_range[0]))
+
+def lattice_extent(shape, site_spacing_nm: float = None):
+    """Physical (height, width) of a simulation lattice in meters, or None to stretch it over the scan"""
+    if site_spacing_nm is None:
+        return None
+    if site_spacing_nm <= 0:
+        raise ValueError("site_spacing_nm must be positive")
+    return (shape[-2] * site_spacing_nm * 1e-9, shape[-1] * site_spacing_nm * 1e-9)
+
+# Threads scoring simulations against a scan (NumPy/SciPy release the GIL), started on first use
+compare_executor = None
+
+def get_compare_executor() -> ThreadPoolExecutor:
+    """Shared thread pool for batched theory-experiment comparisons"""
+    global compare_executor
+    if compare_executor is None:
+        compare_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1,
+                                              thread_name_prefix='compare')
+    return compare_executor
+
+# Seconds between checks of a worker job's progress queue
+PROGRESS_POLL_INTERVAL = 0.25
+
+def current_progress_token():
+    """Progress token the client attached to the current request, if any"""
+    try:
+        meta = app.request_context.meta
+    except LookupError:
+        return None
+    return meta.progressToken if meta is not None else None
+
+async def run_simulation_with_progress(sim_id: str, verbose: bool = False, in_worker: bool = False) -> dict:
+    """
+    Run a simulation off the event loop, sending MCP progress notifications
+    
+    Direct runs execute in a thread and report through a ProgressReporter;
+    queued worker jobs put throttled events on a queue that is drained here.
+    Without a progress token from the client, no notifications are sent.
+    """
+    token = current_progress_token()
+    session = app.request_context.session if token is not None else None
+    
+    async def send(event):
+        await session.send_progress_notification(
+            token, event['step'], total=event['total'], message=format_progress(event)
+        )
+    
+    if in_worker:
+        progress_queue = sim_manager.create_progress_queue() if token is not None else None
+        future = sim_manager.submit_simulation(sim_id, progress_queue)
+        job = asyncio.wrap_future(future)
         
-        types.Tool(
-            name="run_simulation",
-            description="Execute a simulation that was previously initialized",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "sim_id": {
-                        "type": "string",
-                        "description": "Simulation ID returned from initialize_simulation"
-                    },
-                    "verbose": {
-                        "type": "boolean",
-                        "description": "Show progress during simulation",
-                        "default": False
-                    }
-                },
-                "required": ["sim_id"]
-            }
-        ),
+        try:
+            while progress_queue is not None:
+                done = job.done()
+                while True:
+                    try:
+                        event = progress_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    await send(event)
+                if done:
+                    break
+                await asyncio.sleep(PROGRESS_POLL_INTERVAL)
+            
+            payload = await job
+        except BaseException:
+            sim_manager.abandon_simulation(sim_id, future)
+            raise
+        return sim_manager.collect_worker_result(sim_id, payload)
+    
+    reporter = thread_progress_reporter(send) if token is not None else None
+    return await asyncio.to_thread(sim_manager.run_simulation, sim_id, verbose, False, reporter)
+
+def thread_progress_reporter(send):
+    """ProgressReporter usable from a worker thread, forwarding events to the event loop"""
+    loop = asyncio.get_running_loop()
+    return ProgressReporter(
+        lambda event: asyncio.run_coroutine_threadsafe(send(event), loop)
+    )
+
+async def animate_simulation_with_progress(sim_id: str, **kwargs) -> dict:
+    """Export an animation off the event loop, sending progress per frame written"""
+    token = current_progress_token()
+    reporter = None
+    if token is not None:
+        session = app.request_context.session
+        
+        async def send(event):
+            await session.send_progress_notification(
+                token, event['step'], total=event['total'],
+                message=format_progress(event).replace('steps/s', 'frames/s')
+            )
+        reporter = thread_progress_reporter(send)
+    
+    return await asyncio.to_thread(partial(sim_manager.animate_simulation, sim_id,
+                                           progress=reporter, **kwargs))
+
+async def rank_simulations_against_scan(scan_id: str, sim_ids: list = None, component: str = 'magnitude',
+                                        metrics=DEFAULT_METRICS, sort_by: str = 'correlation',
+                                        phase_weight: float = DEFAULT_PHASE_WEIGHT,
+                                        site_spacing_nm: float = None, coarse_to_fine: bool = True,
+                                        keep: int = None) -> dict:
+    """
+    Score many simulations against one scan in parallel and rank them
+    
+    The scan is prepared once (normalization, local statistics and whatever
+    the selected metrics need) and shared read-only by the scoring threads.
+    Without sim_ids, every completed simulation is ranked. With
+    coarse_to_fine, candidates are first screened by correlation on a
+    downsampled scan and only the best `keep` get the full-resolution metrics.
+    """
+    if sim_ids is None:
+        sim_ids = [s['sim_id'] for s in sim_manager.list_simulations() if s['status'] == 'completed']
+    if not sim_ids:
+        raise ValueError("No completed simulations to rank")
+    
+    scan = afm_manager.get_scan_arrays(scan_id)
+    prepared = scan_cache.get(scan_id, scan['amplitude'], scan['phase'], scan_extent(scan['params']))
+    prepared.prepare(metrics)
+    
+    frames, skipped = {}, {}
+    for sim_id in sim_ids:
+        try:
+            frames[sim_id] = sim_manager.get_pmat(sim_id)[:, -1]
+        except ValueError as e:
+            skipped[sim_id] = str(e)
+    extents = {sim_id: lattice_extent(frame.shape, site_spacing_nm) for sim_id, frame in frames.items()}
+    
+    coarse_scores, pruned = {}, []
+    if coarse_to_fine and frames:
+        ids = list(frames)
+        kept, scores = await asyncio.to_thread(
+            screen_frames, [frames[i] for i in ids], prepared, component, keep,
+            sim_extents=[extents[i] for i in ids]
+        )
+        coarse_scores = {sim_id: float(score) for sim_id, score in zip(ids, scores)}
+        kept_ids = {ids[i] for i in kept}
+        pruned = sorted(({'sim_id': sim_id, 'coarse_correlation': coarse_scores[sim_id]}
+                         for sim_id in ids if sim_id not in kept_ids),
+                        key=lambda entry: -entry['coarse_correlation'])
+        frames = {ids[i]: frames[ids[i]] for i in kept}
+    
+    executor = get_compare_executor()
+    jobs = {
+        sim_id: asyncio.wrap_future(
+            executor.submit(compare_frame_to_scan, frame, prepared, component, metrics,
+                            phase_weight=phase_weight, sim_extent=extents[sim_id])
+        )
+        for sim_id, frame in frames.items()
+    }
+    
+    scores = await asyncio.gather(*jobs.values())
+    entries = [{'sim_id': sim_id, **score} for sim_id, score in zip(jobs, scores)]
+    for entry in entries:
+        if entry['sim_id'] in coarse_scores:
+            entry['coarse_correlation'] = coarse_scores[entry['sim_id']]
+    return {
+        'scan_id': scan_id,
+        'component': component,
+        'sort_by': sort_by,
+        'leaderboard': rank_matches(entries, sort_by),
+        'pruned': pruned,
+        'skipped': skipped,
+    }
+
+async def run_parameter_sets(param_sets: list, in_workers: bool = True) -> list:
+    """
+    Create and run one simulation per parameter set, all in parallel
+    
+    Runs go to the worker pool (or threads when in_workers is False).
+    
+    Returns:
+        One dict per parameter set with sim_id, plus error if it failed
+    """
+    outcomes = [{} for _ in param_sets]
+    runs = {}
+    futures = {}  # Worker jobs, freed if this call is cancelled
+    for i, params in enumerate(param_sets):
+        try:
+            sim_id = sim_manager.create_simulation(params)
+        except Exception as e:
+            outcomes[i]['error'] = str(e)
+            continue
+        outcomes[i]['sim_id'] = sim_id
+        if in_workers:
+            futures[i] = sim_manager.submit_simulation(sim_id)
+            runs[i] = asyncio.wrap_future(futures[i])
+        else:
+            runs[i] = asyncio.to_thread(sim_manager.run_simulation, sim_id)
+    
+    try:
+        finished = await asyncio.gather(*runs.values(), return_exceptions=True)
+    except BaseException:
+        for i, future in futures.items():
+            sim_manager.abandon_simulation(outcomes[i]['sim_id'], future)
+        raise
+    for i, payload in zip(runs, finished):
+        try:
+            if isinstance(payload, BaseException):
+                raise payload
+            if in_workers:
+                sim_manager.collect_worker_result(outcomes[i]['sim_id'], payload)
+        except Exception as e:
+            outcomes[i]['error'] = str(e)
+    return outcomes
+
+async def evaluate_parameter_sets(param_sets: list, prepared, component: str = 'magnitude',
+                                  metrics=DEFAULT_METRICS, phase_weight: float = DEFAULT_PHASE_WEIGHT,
+                                  site_spacing_nm: float = None, in_workers: bool = True,
+                                  transform: dict = None, coarse_to_fine: bool = False,
+                                  keep: int = None) -> list:
+    """
+    Create, run and score one simulation per parameter set, all in parallel
+    
+    Runs go to the worker pool (or threads when in_workers is False) and the
+    final frames are scored against the prepared scan on the compare pool,
+    moved by an align_to_scan transform first if one is given. With
+    coarse_to_fine (and no transform), the final frames are first screened
+    by correlation on a downsampled scan and only the best `keep` get the
+    full-resolution metrics, as in rank_simulations_against_scan.
+    
+    Returns:
+        One dict per parameter set with sim_id and metrics, or error; with
+        coarse_to_fine, also coarse_correlation, and pruned instead of
+        metrics for screened-out runs
+    """
+    outcomes = await run_parameter_sets(param_sets, in_workers)
+    frames = {}
+    for i, outcome in enumerate(outcomes):
+        if 'error' in outcome:
+            continue
+        try:
+            frames[i] = sim_manager.get_pmat(outcome['sim_id'])[:, -1]
+        except Exception as e:
+            outcomes[i]['error'] = str(e)
+    
+    if coarse_to_fine and transform is None and frames:
+        ids = list(frames)
+        kept, coarse_scores = await asyncio.to_thread(
+            screen_frames, [frames[i] for i in ids], prepared, component, keep,
+            sim_extents=[lattice_extent(frames[i].shape, site_spacing_nm) for i in ids]
+        )
+        for i, score in zip(ids, coarse_scores):
+            outcomes[i]['coarse_correlation'] = float(score)
+        kept_ids = {ids[j] for j in kept}
+        for i in ids:
+            if i not in kept_ids:
+                outcomes[i]['pruned'] = True
+                del frames[i]
+    
+    executor = get_compare_executor()
+    scoring = {
+        i: asyncio.wrap_future(executor.submit(
+            compare_frame_to_scan, frame, prepared, component, metrics,
+            phase_weight=phase_weight, sim_extent=lattice_extent(frame.shape, site_spacing_nm),
+            transform=transform
+        ))
+        for i, frame in frames.items()
+    }
+    
+    for i, scored in zip(scoring, await asyncio.gather(*scoring.values(), return_exceptions=True)):
+        if isinstance(scored, BaseException):
+            outcomes[i]['error'] = str(scored)
+        else:
+            outcomes[i]['metrics'] = scored
+    return outcomes
+
+def fittable_bounds(bounds: dict = None) -> dict:
+    """Validated fit bounds (default: DEFAULT_BOUNDS)"""
+    bounds = bounds or DEFAULT_BOUNDS
+    unknown = sorted(set(bounds) - set(DEFAULT_BOUNDS))
+    if unknown:
+        raise ValueError(f"Cannot fit {unknown}; fittable parameters: {list(DEFAULT_BOUNDS)}")
+    return bounds
+
+async def evaluate_cached(param_sets: list, prepared, component: str, metrics,
+                          phase_weight: float, site_spacing_nm: float, in_workers: bool,
+                          transform: dict = None, coarse_to_fine: bool = False,
+                          keep: int = None) -> tuple:
+    """
+    evaluate_parameter_sets with the prepared scan's score cache in front of it
+    
+    Scores live on the PreparedScan, so they are reused across fits and
+    searches of the same scan and dropped when the scan is re-prepared.
+    Pruned runs have no full-resolution score and are not cached.
+    
+    Returns:
+        (outcomes in input order, each flagged 'cached'; sim IDs created by this call)
+    """
+    prefix = (component, tuple(sorted(metrics)), phase_weight, site_spacing_nm,
+              json.dumps(transform, sort_keys=True))
+    keys = [prefix + (json.dumps(params, sort_keys=True, default=str),) for params in param_sets]
+    outcomes = [prepared.scores.get(key) for key in keys]
+    outcomes = [None if outcome is None else {**outcome, 'cached': True} for outcome in outcomes]
+    missing = [i for i, outcome in enumerate(outcomes) if outcome is None]
+    fresh = await evaluate_parameter_sets(
+        [param_sets[i] for i in missing], prepared, component, metrics,
+        phase_weight, site_spacing_nm, in_workers, transform, coarse_to_fine, keep
+    )
+    created = [outcome['sim_id'] for outcome in fresh if 'sim_id' in outcome]
+    for i, outcome in zip(missing, fresh):
+        outcomes[i] = {**outcome, 'cached': False}
+        if 'metrics' in outcome:
+            prepared.scores.put(keys[i], outcome)
+    return outcomes, created
+
+def release_simulations(sim_ids: list, keep: set) -> list:
+    """Delete the given simulations except those in keep; returns the kept ones"""
+    for sim_id in sim_ids:
+        if sim_id not in keep:
+            sim_manager.delete_simulation(sim_id)
+    return [sim_id for sim_id in sim_ids if sim_id in keep]
+
+async def fit_simulation_to_scan(scan_id: str, bounds: dict = None, base_params: dict = None,
+                                 method: str = 'nelder_mead', max_evaluations: int = 30,
+                                 batch_size: int = None, target: float = None,
+                                 objective: str = 'correlation', component: str = 'magnitude',
+                                 phase_weight: float = DEFAULT_PHASE_WEIGHT, site_spacing_nm: float = None,
+                                 x0: dict = None, seed: int = None, in_workers: bool = True,
+                                 keep_simulations: bool = False, coarse_to_fine: bool = False,
+                                 keep: int = None) -> dict:
+    """
+    Fit simulation parameters to a scan with a batched optimizer
+    
+    Each round's candidates are simulated and scored in parallel; scores
+    are cached per parameter set (and reused by later fits of the same scan
+    and objective). With coarse_to_fine, each round is screened on a
+    downsampled scan first and only the best `keep` candidates are scored
+    in full; the optimizer sees the pruned ones as failures, ranked below
+    every scored candidate. Simulations other than the best are deleted
+    unless keep_simulations is set. Progress notifications report the best
+    score after every round.
+    """
+    bounds = fittable_bounds(bounds)
+    base_params = dict(base_params or {})
+    metrics = metrics_for(['correlation', objective])
+    batch_size = batch_size or sim_manager.max_workers or max(1, (os.cpu_count() or 2) - 1)
+    
+    scan = afm_manager.get_scan_arrays(scan_id)
+    prepared = scan_cache.get(scan_id, scan['amplitude'], scan['phase'], scan_extent(scan['params']))
+    prepared.prepare(metrics)
+    fitter = Fitter(ParameterSpace(bounds), method, max_evaluations, batch_size, target, x0, seed)
+    
+    token = current_progress_token()
+    session = app.request_context.session if token is not None else None
+    created = []
+    
+    while not fitter.done:
+        candidates = fitter.ask()
+        if not candidates:
+            fitter.tell([])
+            continue
+        outcomes, new_sims = await evaluate_cached(
+            [{**base_params, **candidate} for candidate in candidates], prepared,
+            component, metrics, phase_weight, site_spacing_nm, in_workers,
+            coarse_to_fine=coarse_to_fine, keep=keep
+        )
+        created += new_sims
+        
+        info, scores = [], []
+        for outcome in outcomes:
+            if 'metrics' in outcome:
+                info.append({'sim_id': outcome['sim_id'], 'correlation': outcome['metrics']['correlation'],
+                             'cached': outcome['cached']})
+                scores.append(objective_score(outcome['metrics'], objective))
+            elif outcome.get('pruned'):
+                info.append({'sim_id': outcome['sim_id'], 'pruned': True,
+                             'coarse_correlation': outcome['coarse_correlation'], 'cached': False})
+                scores.append(-np.inf)
+            else:
+                info.append({'sim_id': outcome.get('sim_id'), 'error': outcome.get('error'), 'cached': False})
+                scores.append(-np.inf)
+        fitter.tell(scores, info)
+        
+        if not keep_simulations:
+            created = release_simulations(created, {fitter.best.get('sim_id')} if fitter.best else set())
+        
+        if session is not None and fitter.best is not None:
+            await session.send_progress_notification(
+                token, fitter.evaluations, total=max_evaluations,
+                message=f"{fitter.evaluations} evaluations, best {objective}: {fitter.best['score']:.4f}"
+            )
+    
+    summary = fitter.summary()
+    best = summary['best'] or {}
+    best_sim = best.get('sim_id')
+    return {
+        'scan_id': scan_id,
+        'objective': objective,
+        'best_sim_id': best_sim if best_sim in sim_manager.simulations else None,
+        'best_params': {**base_params, **summary['best_params']} if summary['best_params'] else None,
+        'best_score': summary['best_score'],
+        'best_correlation': best.get('correlation'),
+        'evaluations': summary['evaluations'],
+        'stop_reason': summary['stop_reason'],
+        'method': method,
+        'history': summary['history'],
+    }
+
+async def pareto_search(scan_id: str, bounds: dict = None, base_params: dict = None,
+                        objectives: list = None, population_size: int = 8, generations: int = 6,
+                        component: str = 'magnitude', site_spacing_nm: float = None,
+                        nominal: dict = None, x0: dict = None, seed: int = None,
+                        in_workers: bool = True, keep_simulations: bool = False) -> dict:
+    """
+    Multi-objective NSGA-II search against a scan
+    
+    Objectives are comparison result keys (errors are negated) or
+    'plausibility', the closeness of the parameters to nominal values. Each
+    generation is simulated in parallel on the worker pool, the
+    non-dominated archive is updated, and a progress notification reports
+    the front whenever it changes. Simulations off the final front are
+    deleted unless keep_simulations is set.
+    """
+    bounds = fittable_bounds(bounds)
+    base_params = dict(base_params or {})
+    objectives = list(objectives or DEFAULT_PARETO_OBJECTIVES)
+    metrics = metrics_for([name for name in objectives if name != 'plausibility'])
+    
+    scan = afm_manager.get_scan_arrays(scan_id)
+    prepared = scan_cache.get(scan_id, scan['amplitude'], scan['phase'], scan_extent(scan['params']))
+    prepared.prepare(metrics)
+    space = ParameterSpace(bounds)
+    search = ParetoSearch(space, objectives, population_size, population_size * generations, x0, seed)
+    
+    token = current_progress_token()
+    session = app.request_context.session if token is not None else None
+    created = []
+    
+    while not search.done:
+        candidates = search.ask()
+        if not candidates:
+            search.tell([])
+            continue
+        outcomes, new_sims = await evaluate_cached(
+            [{**base_params, **candidate} for candidate in candidates], prepared,
+            component, metrics, DEFAULT_PHASE_WEIGHT, site_spacing_nm, in_workers
+        )
+        created += new_sims
+        
+        info, vectors = [], []
+        for candidate, outcome in zip(candidates, outcomes):
+            info.append({'sim_id': outcome.get('sim_id'), 'cached': outcome['cached']}
+                        if 'metrics' in outcome else
+                        {'sim_id': outcome.get('sim_id'), 'error': outcome.get('error'), 'cached': False})
+            vectors.append([
+                plausibility(candidate, space, nominal) if name == 'plausibility'
+                else objective_score(outcome['metrics'], name) if 'metrics' in outcome
+                else -np.inf
+                for name in objectives
+            ])
+        changed = search.tell(vectors, info)
+        
+        if not keep_simulations:
+            created = release_simulations(created, {entry.get('sim_id') for entry in search.front})
+        
+        if changed:
+            front = [[round(entry['scores'][name], 4) for name in objectives] for entry in search.front]
+            message = f"generation {search.generation}: {len(front)} on front {objectives}: {front}"
+            if session is not None:
+                await session.send_progress_notification(
+                    token, search.evaluations, total=search.max_evaluations, message=message
+                )
+    
+    summary = search.summary()
+    front = []
+    for entry in summary['front']:
+        front.append({
+            **entry,
+            'params': {**base_params, **entry['params']},
+            'sim_id': entry.get('sim_id') if entry.get('sim_id') in sim_manager.simulations else None,
+        })
+    return {
+        'scan_id': scan_id,
+        'objectives': objectives,
+        'front': front,
+        'generations': summary['generations'],
+        'evaluations': summary['evaluations'],
+        'stop_reason': summary['stop_reason'],
+        'history': summary['history'],
+    }
+
+def defect_params(base_params: dict, sites: list, strength: float, angle_deg: float) -> dict:
+    """Simulation parameters with defects at the given [row, col] sites"""
+    params = {key: value for key, value in base_params.items() if key != 'defects'}
+    params['defect_config'] = {
+        'type': 'sites',
+        'params': {'sites': [list(site) for site in sites], 'strength': strength, 'angle_deg': angle_deg}
+    }
+    return params
+
+async def discover_defects(sim_id: str, scan_id: str, component: str = 'magnitude', align: bool = False,
+                           allow_rotation: bool = True, allow_scale: bool = True,
+                           site_spacing_nm: float = None, max_sites: int = 8, min_distance: int = 2,
+                           sign: str = 'abs', strengths: list = None, angle_deg: float = 90.0,
+                           objective: str = 'correlation', refine: bool = True,
+                           in_workers: bool = True, keep_simulations: bool = False) -> dict:
+    """
+    Localize defects from the residual between a defect-free baseline and a scan
+    
+    The residual map of the baseline's final frame is pulled back onto the
+    lattice and its peaks become candidate sites. Round one simulates the
+    strongest 1..max_sites peaks at each strength in parallel; with refine,
+    round two drops each site of the best set in turn. Simulations other
+    than the best are deleted unless keep_simulations is set.
+    """
+    pmat = sim_manager.get_pmat(sim_id)
+    base_params = dict(sim_manager.simulations[sim_id]['params'])
+    strengths = list(strengths or [15.0])
+    metrics = metrics_for(['correlation', objective])
+    
+    frame = pmat[:, -1]
+    sim_image = simulation_component(frame, component)
+    sim_extent = lattice_extent(frame.shape, site_spacing_nm)
+    
+    def analyse_baseline():
+        # Registration and residuals run at full scan resolution: keep them off the event loop
+        scan = afm_manager.get_scan_arrays(scan_id)
+        prepared = scan_cache.get(scan_id, scan['amplitude'], scan['phase'], scan_extent(scan['params']))
+        prepared.prepare(metrics)
+        transform = None
+        if align:
+            _, _, transform = align_to_scan(sim_image, prepared, allow_rotation, allow_scale,
+                                            sim_extent=sim_extent)
+        baseline = compare_frame_to_scan(frame, prepared, component, metrics, sim_extent=sim_extent,
+                                         transform=transform)
+        residual = residual_map(sim_image, prepared, transform, sim_extent)
+        per_site = site_residuals(residual, sim_image.shape, prepared, transform, sim_extent)
+        peaks = residual_peaks(per_site, max_sites, min_distance, sign=sign)
+        return prepared, transform, baseline, residual, peaks
+    
+    prepared, transform, baseline, residual, peaks = await asyncio.to_thread(analyse_baseline)
+    
+    result = {
+        'sim_id': sim_id,
+        'scan_id': scan_id,
+        'objective': objective,
+        'baseline_score': objective_score(baseline, objective),
+        'baseline_correlation': baseline['correlation'],
+        'alignment': transform,
+        'residual_rms': float(np.sqrt(np.mean(residual ** 2))),
+        'candidate_sites': peaks,
+        'candidates': [],
+        'best': None,
+    }
+    if not peaks:
+        return result
+    
+    token = current_progress_token()
+    session = app.request_context.session if token is not None else None
+    created = []
+    tried = {}
+    
+    async def evaluate_sets(sets: list):
+        nonlocal created
+        outcomes, new_sims = await evaluate_cached(
+            [defect_params(base_params, sites, strength, angle_deg) for sites, strength in sets],
+            prepared, component, metrics, DEFAULT_PHASE_WEIGHT, site_spacing_nm, in_workers, transform
+        )
+        created += new_sims
+        for (sites, strength), outcome in zip(sets, outcomes):
+            entry = {'sites': [list(site) for site in sites], 'strength': strength, 'sim_id': outcome.get('sim_id')}
+            if 'metrics' in outcome:
+                entry['score'] = objective_score(outcome['metrics'], objective)
+                entry['correlation'] = outcome['metrics']['correlation']
+            else:
+                entry['score'] = -np.inf
+                entry['error'] = outcome.get('error')
+            tried[(tuple(map(tuple, sites)), strength)] = entry
+        best = max(tried.values(), key=lambda entry: entry['score'])
+        if not keep_simulations:
+            created = release_simulations(created, {best['sim_id']})
+        if session is not None:
+            await session.send_progress_notification(
+                token, len(tried), message=f"{len(tried)} defect sets tried, best {objective}: {best['score']:.4f}"
+            )
+        return best
+    
+    sites = [(peak['row'], peak['col']) for peak in peaks]
+    best = await evaluate_sets([(sites[:m], strength) for strength in strengths for m in range(1, len(sites) + 1)])
+    if refine and len(best['sites']) > 1:
+        best_sites = [tuple(site) for site in best['sites']]
+        best = await evaluate_sets([(best_sites[:i] + best_sites[i + 1:], best['strength'])
+                                    for i in range(len(best_sites))])
+    
+    best = dict(best)
+    best['sim_id'] = best['sim_id'] if best['sim_id'] in sim_manager.simulations else None
+    best['improvement'] = best['score'] - result['baseline_score']
+    best['defect_config'] = defect_params({}, best['sites'], best['strength'], angle_deg)['defect_config']
+    result['candidates'] = sorted(tried.values(), key=lambda entry: -entry['score'])
+    result['best'] = best
+    return result
+
+# Final-state class per reproducible parameter set, reused across phase diagrams
+MAX_CACHED_PHASES = 4096
+phase_cache = LRUCache(MAX_CACHED_PHASES)
+
+def reproducible(params: dict) -> bool:
+    """
+    Whether a run's outcome is fixed by its parameters
+    
+    Random defect placement without a seed, random initial states without a
+    seed, and FerroSim's own 'random'/'pr' initial states draw from an
+    unseeded generator, so one outcome says nothing about the next run.
+    """
+    defect_config = params.get('defect_config') or {}
+    if defect_config.get('type') == 'random' and defect_config.get('params', {}).get('seed') is None:
+        return False
+    init = params.get('init', 'pr')
+    if params.get('integrator', 'fixed') != 'adaptive':
+        return init not in ('random', 'pr')
+    return init != 'random' or params.get('seed') is not None
+
+def set_param(params: dict, name: str, value: float) -> dict:
+    """Copy of params with one parameter set; 'field.<name>' addresses field_config params"""
+    params = dict(params)
+    if name.startswith('field.'):
+        if not params.get('field_config'):
+            raise ValueError(f"{name} needs a field_config in base_params")
+        field_config = dict(params['field_config'])
+        field_config['params'] = {**field_config.get('params', {}), name[len('field.'):]: value}
+        params['field_config'] = field_config
+    else:
+        params[name] = value
+    return params
+
+async def map_phase_diagram(base_params: dict = None, x_param: str = 'k', x_range: list = (0.5, 3.0),
+                            y_param: str = 'dep_alpha', y_range: list = (0.0, 0.3),
+                            resolution: list = (5, 5), levels: int = 2, max_points: int = None,
+                            in_workers: bool = True, keep_simulations: bool = False) -> dict:
+    """
+    Map the final-state class over two parameters with adaptive refinement
+    
+    The coarse grid is simulated in parallel on the worker pool and every
+    final Px/Py is classified in one vectorized pass; cells whose corners
+    disagree are then split (up to `levels` times), so runs concentrate on
+    the phase boundaries. Every reproducible point is cached by its
+    parameters (see reproducible), and
+    simulations are deleted after classification unless keep_simulations is
+    set. Progress notifications report each refinement round.
+    """
+    base_params = dict(base_params or {})
+    grid = AdaptiveGrid(x_range, y_range, tuple(resolution), levels)
+    
+    token = current_progress_token()
+    session = app.request_context.session if token is not None else None
+    points, evaluated = [], 0
+    
+    while not grid.done:
+        budget = None if max_points is None else max_points - evaluated
+        if budget is not None and budget <= 0:
+            break
+        indices = grid.ask(budget)
+        param_sets = []
+        for index in indices:
+            x, y = grid.value(index)
+            param_sets.append(set_param(set_param(base_params, x_param, x), y_param, y))
+        keys = [json.dumps(params, sort_keys=True, default=str) for params in param_sets]
+        
+        classified = [phase_cache.get(key) for key in keys]
+        missing = [i for i, entry in enumerate(classified) if entry is None]
+        outcomes = await run_parameter_sets([param_sets[i] for i in missing], in_workers)
+        finished = [(i, outcome) for i, outcome in zip(missing, outcomes) if 'error' not in outcome]
+        if finished:
+            frames = np.stack([sim_manager.get_pmat(outcome['sim_id'])[:, -1] for _, outcome in finished])
+            labels, descriptors = await asyncio.to_thread(classify_states, frames)
+            for j, (i, outcome) in enumerate(finished):
+                classified[i] = {
+                    'label': labels[j],
+                    'descriptors': {name: values[j].item() for name, values in descriptors.items()},
+                    'sim_id': outcome['sim_id'],
+                }
+                if reproducible(param_sets[i]):
+                    phase_cache.put(keys[i], classified[i])
+        
+        errors = {i: outcome.get('error') for i, outcome in zip(missing, outcomes) if 'error' in outcome}
+        round_labels = {}
+        for i, index in enumerate(indices):
+            x, y = grid.value(index)
+            point = {x_param: x, y_param: y, 'cached': i not in missing}
+            if i in errors:
+                point.update({'label': FAILED, 'error': errors[i]})
+            else:
+                point.update(classified[i])
+            round_labels[index] = point['label']
+            points.append(point)
+        created = [outcome['sim_id'] for outcome in outcomes if 'sim_id' in outcome]
+        if not keep_simulations:
+            release_simulations(created, set())
+        evaluated += len(indices)
+        grid.tell(round_labels)
+        
+        message = (f"round {grid.round}: {evaluated} points, "
+                   f"{len(grid.ask())} queued for refinement")
+        if session is not None:
+            await session.send_progress_notification(token, evaluated, message=message)
+    
+    for point in points:
+        if point.get('sim_id') not in sim_manager.simulations:
+            point['sim_id'] = None
+    counts = {}
+    for point in points:
+        counts[point['label']] = counts.get(point['label'], 0) + 1
+    x_values = [grid.value((i, 0))[0] for i in range(grid.shape[0])]
+    y_values = [grid.value((0, j))[1] for j in range(grid.shape[1])]
+    return {
+        'x_param': x_param,
+        'y_param': y_param,
+        'points': points,
+        'class_counts': counts,
+        'rounds': grid.round,
+        'complete': grid.done,
+        'grid': {x_param: x_values, y_param: y_values, 'labels': grid.label_grid() if grid.labels else []},
+    }
+
+@app.list_tools()
+async def list_tools() -> list[types.Tool]:
+    """List available MCP tools"""
+    tools = [
+        types.Tool(
+            name="initialize_simulation",
+            description="Create a new FerroSim simulation with basic or advanced parameters. Supports custom electric fields, defects, and ground state calculations.",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "n": {
+                        "type": "integer",
+                        "description": "Lattice size (NxN grid)",
+                        "default": 10
+                    },
+                    "gamma": {
+                        "type": "number",
+                        "description": "Kinetic coefficient (domain wall mobility)",
+                        "default": 1.0
+                    },
+                    "k": {
+                        "type": "number",
+                        "description": "Coupling constant for nearest neighbors",
+                        "default": 1.0
+                    },
+                    "mode": {
+                        "type": "string",
+                        "description": "Material mode",
+                        "enum": ["tetragonal", "rhombohedral", "uniaxial", "squareelectric"],
+                        "default": "tetragonal"
+                    },
+                    "dep_alpha": {
+                        "type": "number",
+                        "description": "Depolarization constant",
+                        "default": 0.0
+                    },
+                    "init": {
+                        "type": "string",
+                        "description": "Initial condition: 'pr' (positive remnant), 'random' (for ground states), 'up', 'down'",
+                        "enum": ["pr", "random", "up", "down"],
+                        "default": "pr"
+                    },
+                    "t_start": {
+                        "type": "number",
+                        "description": "Start time",
+                        "default": 0.0
+                    },
+                    "t_end": {
+                        "type": "number",
+                        "description": "End time",
+                        "default": 1.0
+                    },
+                    "n_steps": {
+                        "type": "integer",
+                        "description": "Number of time steps (number of recorded output times for the adaptive integrator)",
+                        "default": 1000
+                    },
+                    "integrator": {
+                        "type": "string",
+                        "description": "Time integration: 'fixed' (FerroSim fixed steps on time_vec) or 'adaptive' (error-controlled Runge-Kutta on the repo's own temperature-free Landau lattice, a separate model from FerroSim whose results can differ; output recorded only at time_vec)",
+                        "enum": ["fixed", "adaptive"],
+                        "default": "fixed"
+                    },
+                    "method": {
+                        "type": "string",
+                        "description": "Adaptive Runge-Kutta pair",
+                        "enum": ["RK23", "RK45", "DOP853"],
+                        "default": "RK45"
+                    },
+                    "rtol": {
+                        "type": "number",
+                        "description": "Relative tolerance for adaptive stepping",
+                        "default": 1e-4
+                    },
+                    "atol": {
+                        "type": "number",
+                        "description": "Absolute tolerance for adaptive stepping",
+                        "default": 1e-6
+                    },
+                    "observables": {
+                        "type": "array",
+                        "description": "Streaming observables updated at every recorded step and stored as time series",
+                        "items": {"type": "string", "enum": AVAILABLE_OBSERVABLES}
+                    },
+                    "record_history": {
+                        "type": "boolean",
+                        "description": "Keep the full polarization history (adaptive integrator only; false keeps the final state and the observables)",
+                        "default": True
+                    },
+                    "field_config": {
+                        "type": "object",
+                        "description": "Electric field configuration: {type: 'sine'|'step'|'polynomial'|'zero', params: {...}}",
+                        "properties": {
+                            "type": {"type": "string"},
+                            "params": {"type": "object"}
+                        }
+                    },
+                    "defect_config": {
+                        "type": "object",
+                        "description": "Defect configuration: {type: 'none'|'random'|'periodic'|'sites', params: {...}}; 'sites' takes params {sites: [[row, col], ...], strength, angle_deg}",
+                        "properties": {
+                            "type": {"type": "string"},
+                            "params": {"type": "object"}
+                        }
+                    }
+                },
+                "required": []
+            }
+        ),
+        
+        types.Tool(
+            name="run_simulation",
+            description="Execute a simulation that was previously initialized",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "sim_id": {
+                        "type": "string",
+                        "description": "Simulation ID returned from initialize_simulation"
+                    },
+                    "verbose": {
+                        "type": "boolean",
+                        "description": "Echo FerroSim's progress bar to the server log (progress notifications are sent whenever the client supplies a progress token)",
+                        "default": False
+                    },
+                    "in_worker": {
+                        "type": "boolean",
+                        "description": "Run in a worker process; the history is returned through shared memory instead of being copied",
+                        "default": False
+                    }
+                },
+                "required": ["sim_id"]
+            }
+        ),
         
         types.Tool(
             name="get_simulation_results",
@@ -551,6 +2003,26 @@ async def list_tools() -> list[types.Tool]:
         ),
         
         
+        types.Tool(
+            name="get_simulation_observables",
+            description="Retrieve the streaming observable time series (up/down fraction, mean |P|, wall pixels, energy) of a completed simulation",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "sim_id": {
+                        "type": "string",
+                        "description": "Simulation ID"
+                    },
+                    "stride": {
+                        "type": "integer",
+                        "description": "Return every stride-th recorded value",
+                        "default": 1
+                    }
+                },
+                "required": ["sim_id"]
+            }
+        ),
+        
         types.Tool(
             name="list_simulations",
             description="List all active simulations",
@@ -563,24 +2035,332 @@ async def list_tools() -> list[types.Tool]:
         
             types.Tool(
                 name="visualize_simulation",
-                description="Generate visualization (plot) of a completed simulation and save to display_demo folder. Returns filepath to saved PNG.",
+                description="Generate visualization (plot) of a completed simulation and save to display_demo folder. Returns filepath to saved PNG, and optionally the image itself as inline content.",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "sim_id": {
+                        "type": "string",
+                        "description": "Simulation ID"
+                    },
+                    "viz_type": {
+                        "type": "string",
+                        "description": "Visualization type: 'summary' (full evolution), 'quiver' (vector field), 'magnitude_angle' (polarization magnitude and angle)",
+                        "enum": ["summary", "quiver", "magnitude_angle"],
+                        "default": "summary"
+                    },
+                    "timestep": {
+                        "type": "integer",
+                        "description": "Timestep to visualize (-1 for final state)",
+                        "default": -1
+                    },
+                    "renderer": {
+                        "type": "string",
+                        "description": "'matplotlib' (FerroSim plots), 'fast' (HSV colour-wheel map and arrow glyphs, a few ms per image) or 'auto' (matplotlib when available, otherwise fast)",
+                        "enum": ["auto", "matplotlib", "fast"],
+                        "default": "auto"
+                    },
+                    "return_image": {
+                        "type": "boolean",
+                        "description": "Also return the PNG inline as image content, for clients that cannot read the server's disk",
+                        "default": False
+                    },
+                    "max_pixels": {
+                        "type": "integer",
+                        "description": "Longest edge of the inline image in pixels",
+                        "default": IMAGE_MAX_PIXELS,
+                        "minimum": IMAGE_MIN_PIXELS
+                    },
+                    "max_bytes": {
+                        "type": "integer",
+                        "description": "Byte budget of the inline PNG; the image is shrunk until it fits",
+                        "default": IMAGE_MAX_BYTES,
+                        "minimum": 1024
+                    },
+                    "save_to_disk": {
+                        "type": "boolean",
+                        "description": "Write the PNG to display_demo (default: true). Set false with return_image for in-memory rendering only.",
+                        "default": True
+                    }
+                },
+                "required": ["sim_id"]
+            }
+        ),
+        types.Tool(
+            name="animate_simulation",
+            description="Export the polarization evolution of a completed simulation as an animated PNG (APNG) or a folder of PNG frames in display_demo. Frames are streamed from the stored history and rendered in worker processes.",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "sim_id": {
+                        "type": "string",
+                        "description": "Simulation ID"
+                    },
+                    "viz_type": {
+                        "type": "string",
+                        "description": "Frame type: 'magnitude_angle' (HSV colour-wheel map) or 'quiver' (map with arrows)",
+                        "enum": ["magnitude_angle", "quiver"],
+                        "default": "magnitude_angle"
+                    },
+                    "stride": {
+                        "type": "integer",
+                        "description": "Use every stride-th timestep (the final state is always included)",
+                        "default": 1,
+                        "minimum": 1
+                    },
+                    "output_format": {
+                        "type": "string",
+                        "description": "'apng' (single looping animated PNG) or 'frames' (directory of numbered PNGs)",
+                        "enum": ["apng", "frames"],
+                        "default": "apng"
+                    },
+                    "fps": {
+                        "type": "integer",
+                        "description": "Playback rate of the animated PNG",
+                        "default": 10,
+                        "minimum": 1,
+                        "maximum": 100
+                    },
+                    "in_workers": {
+                        "type": "boolean",
+                        "description": "Render frames in parallel worker processes (default: true)",
+                        "default": True
+                    }
+                },
+                "required": ["sim_id"]
+            }
+        ),
+        
+        types.Tool(
+            name="predict_simulation",
+            description="Predict a simulation's outcome instantly from a surrogate model (Gaussian process) trained on the completed simulations (the most recent 200) with the same configuration (n, mode, init, field type, defects, integrator, n_steps, t_start, solver settings). Interpolates over k, dep_alpha, gamma, t_end and numeric field parameters, and returns final-state observables and a low-rank final-state embedding with uncertainty; optionally the predicted final state and its predicted correlation with an AFM scan. Use it to screen candidates before confirming promising ones with real runs.",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "params": {
+                        "type": "object",
+                        "description": "initialize_simulation parameters to predict"
+                    },
+                    "candidates": {
+                        "type": "array",
+                        "items": {"type": "object"},
+                        "description": "Several parameter sets to predict at once (instead of params)"
+                    },
+                    "return_state": {
+                        "type": "boolean",
+                        "description": "Include the predicted final Px/Py maps",
+                        "default": False
+                    },
+                    "scan_id": {
+                        "type": "string",
+                        "description": "Also predict the correlation of the predicted final state with this AFM scan"
+                    },
+                    "component": {
+                        "type": "string",
+                        "enum": ["magnitude", "x", "y"],
+                        "default": "magnitude"
+                    },
+                    "site_spacing_nm": {
+                        "type": "number",
+                        "description": "Physical size of one lattice site in nm (see match_simulation_to_afm)"
+                    }
+                },
+                "required": []
+            }
+        ),
+        
+        types.Tool(
+            name="find_similar_simulations",
+            description="Find the completed simulations nearest to a parameter set, from a KD-tree index over the normalized continuous parameters (k, dep_alpha, gamma, t_end, numeric field parameters) of every stored run with the same configuration (n, mode, init, field type, defects, integrator, n_steps, t_start, solver settings). Returns the k nearest runs with distances and final-state observables; an 'identical' neighbour means the run can be skipped. Check this before running configurations close to earlier ones.",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "params": {
+                        "type": "object",
+                        "description": "initialize_simulation parameters to look up"
+                    },
+                    "k": {
+                        "type": "integer",
+                        "description": "Neighbours to return",
+                        "default": 5,
+                        "minimum": 1
+                    },
+                    "max_distance": {
+                        "type": "number",
+                        "description": "Only return runs within this normalized distance (each parameter is scaled by its range among stored runs)"
+                    },
+                    "scan_id": {
+                        "type": "string",
+                        "description": "Also report each neighbour's final-frame correlation with this AFM scan"
+                    },
+                    "component": {
+                        "type": "string",
+                        "enum": ["magnitude", "x", "y"],
+                        "default": "magnitude"
+                    }
+                },
+                "required": ["params"]
+            }
+        ),
+        
+        types.Tool(
+            name="map_phase_diagram",
+            description="Map the final domain state over two parameters (e.g. k vs dep_alpha, or a field parameter such as field.amplitude_y). Runs a coarse grid in parallel, classifies every final Px/Py as single_domain, stripe, vortex or multidomain from vectorized descriptors (net order, structure-factor stripe order, plaquette winding numbers), and adaptively refines only cells whose corners disagree, so runs concentrate on phase boundaries. Every reproducible point (no unseeded random initial state or defects) is cached for later maps.",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "base_params": {
+                        "type": "object",
+                        "description": "initialize_simulation parameters shared by every point"
+                    },
+                    "x_param": {
+                        "type": "string",
+                        "description": "Parameter on the first axis; 'field.<name>' sets a field_config parameter",
+                        "default": "k"
+                    },
+                    "x_range": {
+                        "type": "array",
+                        "items": {"type": "number"},
+                        "minItems": 2,
+                        "maxItems": 2,
+                        "default": [0.5, 3.0]
+                    },
+                    "y_param": {
+                        "type": "string",
+                        "description": "Parameter on the second axis",
+                        "default": "dep_alpha"
+                    },
+                    "y_range": {
+                        "type": "array",
+                        "items": {"type": "number"},
+                        "minItems": 2,
+                        "maxItems": 2,
+                        "default": [0.0, 0.3]
+                    },
+                    "resolution": {
+                        "type": "array",
+                        "items": {"type": "integer", "minimum": 2},
+                        "minItems": 2,
+                        "maxItems": 2,
+                        "description": "Coarse grid points along x and y",
+                        "default": [5, 5]
+                    },
+                    "levels": {
+                        "type": "integer",
+                        "description": "Refinement levels near boundaries (each halves the spacing)",
+                        "default": 2,
+                        "minimum": 0
+                    },
+                    "max_points": {
+                        "type": "integer",
+                        "description": "Stop after this many points (cached ones included)"
+                    },
+                    "in_workers": {
+                        "type": "boolean",
+                        "description": "Run in the worker process pool (False: threads)",
+                        "default": True
+                    },
+                    "keep_simulations": {
+                        "type": "boolean",
+                        "description": "Keep the simulations instead of deleting them after classification",
+                        "default": False
+                    }
+                },
+                "required": []
+            }
+        ),
+        
+        types.Tool(
+            name="hysteresis_analysis",
+            description="Extract P-E hysteresis loops from completed simulations. The applied field is split into monotonic branches; the last complete rising and falling branches form the steady-state loop, from which coercive fields, remanent polarization, loop area (closed integral of P dE) and imprint are interpolated. Many simulations are analysed in one vectorized batch; works for runs without a recorded history. Run with a periodic field (e.g. sine) covering at least one full cycle.",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "sim_ids": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Simulations to analyse (default: all completed)"
+                    },
+                    "component": {
+                        "type": "string",
+                        "enum": ["x", "y"],
+                        "description": "Field and polarization component of the loop",
+                        "default": "y"
+                    },
+                    "include_curves": {
+                        "type": "boolean",
+                        "description": "Include P on both branches interpolated onto a common field grid",
+                        "default": False
+                    },
+                    "n_points": {
+                        "type": "integer",
+                        "description": "Field grid points of the interpolated branches",
+                        "default": 51,
+                        "minimum": 2
+                    }
+                },
+                "required": []
+            }
+        ),
+        
+        types.Tool(
+            name="switching_kinetics",
+            description="Analyse polarization switching under a field step (field_config type 'step'). Computes the switched fraction (share of initially unaligned sites whose P points along the field) while the step is on, from the stored history in one chunked pass or from the up_down_fraction observable, then fits all simulations in one batch with the KAI model s = 1 - exp(-(t/t0)^n) and the nucleation-limited switching (NLS) model with a Lorentzian distribution of log switching times. Returns characteristic times, exponents, fit quality and, for sweeps over step amplitude, a Merz-law activation field.",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "sim_ids": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Simulations to analyse, e.g. a sweep over Ey (default: all completed)"
+                    },
+                    "models": {
+                        "type": "array",
+                        "items": {"type": "string", "enum": list(KINETICS_MODELS)},
+                        "description": "Kinetics models to fit",
+                        "default": list(KINETICS_MODELS)
+                    },
+                    "include_curves": {
+                        "type": "boolean",
+                        "description": "Include the switched fraction over time",
+                        "default": False
+                    }
+                },
+                "required": []
+            }
+        ),
+        
+        types.Tool(
+            name="detect_topological_defects",
+            description="Find vortices and other topological defects in a simulation's polarization field over time. Computes the winding number, circulation (curl) and divergence of P around every lattice plaquette for the recorded frames in one vectorized, strided pass, and returns per frame the number of positive and negative charges, mean |curl|, and each defect's position (plaquette centre, in sites), charge and kind (vortex, antivortex, source, sink). Most useful for the squareelectric and rhombohedral modes; sharp 180-degree walls carry no charge.",
             inputSchema={
                 "type": "object",
                 "properties": {
                     "sim_id": {
                         "type": "string",
-                        "description": "Simulation ID"
+                        "description": "Completed simulation to analyse"
                     },
-                    "viz_type": {
-                        "type": "string",
-                        "description": "Visualization type: 'summary' (full evolution), 'quiver' (vector field), 'magnitude_angle' (polarization magnitude and angle)",
-                        "enum": ["summary", "quiver", "magnitude_angle"],
-                        "default": "summary"
+                    "stride": {
+                        "type": "integer",
+                        "description": "Analyse every stride-th recorded frame (default: chosen to give at most max_frames frames)",
+                        "minimum": 1
                     },
-                    "timestep": {
+                    "max_frames": {
                         "type": "integer",
-                        "description": "Timestep to visualize (-1 for final state)",
-                        "default": -1
+                        "description": "Frames analysed at most when stride is not given",
+                        "default": 50,
+                        "minimum": 1
+                    },
+                    "include_positions": {
+                        "type": "boolean",
+                        "description": "List each defect's position, charge and kind per frame",
+                        "default": True
+                    },
+                    "max_listed": {
+                        "type": "integer",
+                        "description": "Defects listed per frame at most (counts always cover all)",
+                        "default": 200,
+                        "minimum": 0
                     }
                 },
                 "required": ["sim_id"]
@@ -654,7 +2434,7 @@ async def list_tools() -> list[types.Tool]:
         tools.append(
             types.Tool(
                 name="match_simulation_to_afm",
-                description="Compare FerroSim simulation results with AFM experimental data. Returns correlation, MSE, RMSE, and match quality assessment.",
+                description="Compare FerroSim simulation results with AFM experimental data. Returns correlation, MSE, RMSE, SSIM (or other selected metrics), and match quality assessment.",
                 inputSchema={
                     "type": "object",
                     "properties": {
@@ -671,6 +2451,385 @@ async def list_tools() -> list[types.Tool]:
                             "description": "Polarization component to compare: 'magnitude', 'x', 'y'",
                             "enum": ["magnitude", "x", "y"],
                             "default": "magnitude"
+                        },
+                        "metrics": {
+                            "type": "array",
+                            "description": "Metrics to compute (default: correlation, mse, rmse, ssim). 'ms_ssim' = multi-scale SSIM, 'nmi' = normalized mutual information, 'histogram' = histogram intersection/chi2/Bhattacharyya/EMD, 'domain' = up-fraction and wall-density differences (uses Py sign and AFM phase), 'phase' = agreement of Py sign with the AFM phase channel plus a joint amplitude/phase 'combined' score",
+                            "items": {"type": "string", "enum": list(AVAILABLE_METRICS)},
+                            "default": list(DEFAULT_METRICS)
+                        },
+                        "site_spacing_nm": {
+                            "type": "number",
+                            "description": "Physical size of one lattice site in nm. Places the simulation at true scale within the scan's x/y range (tiling the periodic lattice if the scan is larger); default stretches the simulation over the whole scan"
+                        },
+                        "phase_weight": {
+                            "type": "number",
+                            "description": "Weight of the phase term in the 'combined' score when 'phase' is selected (0 = amplitude only, 1 = phase only)",
+                            "default": DEFAULT_PHASE_WEIGHT,
+                            "minimum": 0,
+                            "maximum": 1
+                        },
+                        "align": {
+                            "type": "boolean",
+                            "description": "Also register the simulation onto the scan (FFT phase correlation for shift, log-polar spectra for rotation/scale) and report the transform and aligned metrics",
+                            "default": False
+                        },
+                        "allow_rotation": {
+                            "type": "boolean",
+                            "description": "Search rotation when aligning",
+                            "default": True
+                        },
+                        "allow_scale": {
+                            "type": "boolean",
+                            "description": "Search scale (0.5-2x) when aligning",
+                            "default": True
+                        },
+                        "timestep": {
+                            "type": "integer",
+                            "description": "Timestep to compare (default: -1, the final state)",
+                            "default": -1
+                        },
+                        "search_timesteps": {
+                            "type": "boolean",
+                            "description": "Score every stride-th timestep by correlation, return the correlation-vs-time curve, and compute the metrics at the best-matching timestep",
+                            "default": False
+                        },
+                        "stride": {
+                            "type": "integer",
+                            "description": "Timestep stride for search_timesteps (the final state is always included)",
+                            "default": 1,
+                            "minimum": 1
+                        }
+                    },
+                    "required": ["sim_id", "scan_id"]
+                }
+            )
+        )
+        tools.append(
+            types.Tool(
+                name="rank_simulations_against_scan",
+                description="Score many simulations against one AFM scan in a single call and return a leaderboard sorted best match first. The scan is prepared once and simulations are scored in parallel.",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "scan_id": {
+                            "type": "string",
+                            "description": "AFM scan ID"
+                        },
+                        "sim_ids": {
+                            "type": "array",
+                            "description": "Simulation IDs to rank (default: all completed simulations)",
+                            "items": {"type": "string"}
+                        },
+                        "component": {
+                            "type": "string",
+                            "description": "Polarization component to compare: 'magnitude', 'x', 'y'",
+                            "enum": ["magnitude", "x", "y"],
+                            "default": "magnitude"
+                        },
+                        "metrics": {
+                            "type": "array",
+                            "description": "Metrics to compute per simulation (see match_simulation_to_afm)",
+                            "items": {"type": "string", "enum": list(AVAILABLE_METRICS)},
+                            "default": list(DEFAULT_METRICS)
+                        },
+                        "site_spacing_nm": {
+                            "type": "number",
+                            "description": "Physical size of one lattice site in nm (see match_simulation_to_afm)"
+                        },
+                        "phase_weight": {
+                            "type": "number",
+                            "description": "Weight of the phase term in the 'combined' score (see match_simulation_to_afm)",
+                            "default": DEFAULT_PHASE_WEIGHT,
+                            "minimum": 0,
+                            "maximum": 1
+                        },
+                        "sort_by": {
+                            "type": "string",
+                            "description": "Result key to rank on, e.g. 'correlation', 'ssim', 'rmse', 'combined' (errors and distances rank ascending)",
+                            "default": "correlation"
+                        },
+                        "top_k": {
+                            "type": "integer",
+                            "description": "Return only the best k entries (default: all)"
+                        },
+                        "coarse_to_fine": {
+                            "type": "boolean",
+                            "description": "Screen candidates by correlation on a 1/8-resolution scan first and compute full-resolution metrics only for the best ones",
+                            "default": True
+                        },
+                        "keep": {
+                            "type": "integer",
+                            "description": "Candidates kept after coarse screening (default: a quarter of them, at least 8)",
+                            "minimum": 1
+                        }
+                    },
+                    "required": ["scan_id"]
+                }
+            )
+        )
+        tools.append(
+            types.Tool(
+                name="fit_simulation_to_scan",
+                description="Fit simulation parameters (k, dep_alpha, gamma) to an AFM scan inside the server. Runs Nelder-Mead, CMA-ES or Bayesian optimization over the given bounds, simulating each round's candidates in parallel on the worker pool, caching every evaluation, and stopping early at a target score. Returns the best parameters, the best simulation ID and the evaluation history.",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "scan_id": {
+                            "type": "string",
+                            "description": "AFM scan ID"
+                        },
+                        "bounds": {
+                            "type": "object",
+                            "description": "Parameters to fit with [low, high] bounds (default: k 0.5-3.0, dep_alpha 0.0-0.3, gamma 0.5-2.0)",
+                            "additionalProperties": {
+                                "type": "array",
+                                "items": {"type": "number"},
+                                "minItems": 2,
+                                "maxItems": 2
+                            }
+                        },
+                        "base_params": {
+                            "type": "object",
+                            "description": "Fixed initialize_simulation parameters for every candidate (n, n_steps, integrator, field_config, seed, ...). Fix 'seed' for reproducible scores with random initial states"
+                        },
+                        "method": {
+                            "type": "string",
+                            "enum": list(FIT_METHODS),
+                            "default": "nelder_mead"
+                        },
+                        "max_evaluations": {
+                            "type": "integer",
+                            "description": "Simulation budget",
+                            "default": 30,
+                            "minimum": 1
+                        },
+                        "batch_size": {
+                            "type": "integer",
+                            "description": "Candidates per round for CMA-ES and Bayesian optimization (default: worker count); Nelder-Mead evaluates its 4 speculative steps per round",
+                            "minimum": 1
+                        },
+                        "target": {
+                            "type": "number",
+                            "description": "Stop once the objective reaches this score (errors and distances are negated, e.g. -0.05 for rmse <= 0.05)"
+                        },
+                        "objective": {
+                            "type": "string",
+                            "description": "Result key to maximize: 'correlation', 'ssim', 'combined' (amplitude + phase), ...; errors such as 'rmse' are minimized",
+                            "default": "correlation"
+                        },
+                        "component": {
+                            "type": "string",
+                            "enum": ["magnitude", "x", "y"],
+                            "default": "magnitude"
+                        },
+                        "phase_weight": {
+                            "type": "number",
+                            "description": "Weight of the phase term when the objective is 'combined'",
+                            "default": DEFAULT_PHASE_WEIGHT,
+                            "minimum": 0,
+                            "maximum": 1
+                        },
+                        "site_spacing_nm": {
+                            "type": "number",
+                            "description": "Physical size of one lattice site in nm (see match_simulation_to_afm)"
+                        },
+                        "x0": {
+                            "type": "object",
+                            "description": "Starting parameters (default: centre of the bounds)"
+                        },
+                        "seed": {
+                            "type": "integer",
+                            "description": "Seed for the optimizer's sampling"
+                        },
+                        "in_workers": {
+                            "type": "boolean",
+                            "description": "Run candidates in the worker process pool (parallel); false runs them in threads",
+                            "default": True
+                        },
+                        "keep_simulations": {
+                            "type": "boolean",
+                            "description": "Keep every evaluated simulation instead of only the best",
+                            "default": False
+                        },
+                        "coarse_to_fine": {
+                            "type": "boolean",
+                            "description": "Screen each round by correlation on a 1/8-resolution scan and score only the best candidates in full; pruned ones count as failed evaluations. Pays off for large scans and batches",
+                            "default": False
+                        },
+                        "keep": {
+                            "type": "integer",
+                            "description": "Candidates per round kept after coarse screening (default: a quarter of them, at least 8)",
+                            "minimum": 1
+                        }
+                    },
+                    "required": ["scan_id"]
+                }
+            )
+        )
+        tools.append(
+            types.Tool(
+                name="pareto_search_simulations",
+                description="Multi-objective (NSGA-II) search of simulation parameters against an AFM scan. Balances amplitude fit, phase fit and physical plausibility (closeness to nominal parameters) without fixed weights: each generation of configurations runs in parallel on the worker pool, a non-dominated archive is kept, and front updates stream as progress notifications. Returns the Pareto front with parameters, objective scores and simulation IDs.",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "scan_id": {
+                            "type": "string",
+                            "description": "AFM scan ID"
+                        },
+                        "objectives": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "Two or more objectives to maximize: comparison result keys ('correlation', 'phase_correlation', 'ssim', ...; errors such as 'rmse' are minimized) or 'plausibility'",
+                            "default": list(DEFAULT_PARETO_OBJECTIVES)
+                        },
+                        "bounds": {
+                            "type": "object",
+                            "description": "Parameters to search with [low, high] bounds (default: k 0.5-3.0, dep_alpha 0.0-0.3, gamma 0.5-2.0)",
+                            "additionalProperties": {
+                                "type": "array",
+                                "items": {"type": "number"},
+                                "minItems": 2,
+                                "maxItems": 2
+                            }
+                        },
+                        "base_params": {
+                            "type": "object",
+                            "description": "Fixed initialize_simulation parameters for every candidate"
+                        },
+                        "nominal": {
+                            "type": "object",
+                            "description": "Physically expected parameter values for the plausibility objective (default: k=1, dep_alpha=0, gamma=1)"
+                        },
+                        "population_size": {
+                            "type": "integer",
+                            "description": "Configurations per generation",
+                            "default": 8,
+                            "minimum": 4
+                        },
+                        "generations": {
+                            "type": "integer",
+                            "description": "Generations to run (budget: population_size * generations simulations)",
+                            "default": 6,
+                            "minimum": 1
+                        },
+                        "component": {
+                            "type": "string",
+                            "enum": ["magnitude", "x", "y"],
+                            "default": "magnitude"
+                        },
+                        "site_spacing_nm": {
+                            "type": "number",
+                            "description": "Physical size of one lattice site in nm (see match_simulation_to_afm)"
+                        },
+                        "x0": {
+                            "type": "object",
+                            "description": "Parameters seeded into the first generation"
+                        },
+                        "seed": {
+                            "type": "integer",
+                            "description": "Seed for the search's sampling"
+                        },
+                        "in_workers": {
+                            "type": "boolean",
+                            "description": "Run candidates in the worker process pool (parallel); false runs them in threads",
+                            "default": True
+                        },
+                        "keep_simulations": {
+                            "type": "boolean",
+                            "description": "Keep every evaluated simulation instead of only those on the front",
+                            "default": False
+                        }
+                    },
+                    "required": ["scan_id"]
+                }
+            )
+        )
+        tools.append(
+            types.Tool(
+                name="discover_defects",
+                description="Localize defects from the mismatch between a completed defect-free baseline simulation and an AFM scan. Computes the residual map (optionally after aligning the simulation), maps it back onto lattice sites, picks the strongest residual peaks as candidate defect sites, and simulates candidate defect sets in parallel batches (the strongest 1..max_sites peaks, then leave-one-out refinement). Returns the best-scoring defect configuration, ready to pass as defect_config.",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "sim_id": {
+                            "type": "string",
+                            "description": "Completed baseline simulation; its parameters are reused with defects added"
+                        },
+                        "scan_id": {
+                            "type": "string",
+                            "description": "AFM scan ID"
+                        },
+                        "component": {
+                            "type": "string",
+                            "enum": ["magnitude", "x", "y"],
+                            "default": "magnitude"
+                        },
+                        "align": {
+                            "type": "boolean",
+                            "description": "Register the baseline onto the scan first; candidates are scored with the same transform",
+                            "default": False
+                        },
+                        "allow_rotation": {
+                            "type": "boolean",
+                            "default": True
+                        },
+                        "allow_scale": {
+                            "type": "boolean",
+                            "default": True
+                        },
+                        "site_spacing_nm": {
+                            "type": "number",
+                            "description": "Physical size of one lattice site in nm (see match_simulation_to_afm)"
+                        },
+                        "max_sites": {
+                            "type": "integer",
+                            "description": "Candidate defect sites taken from the residual peaks",
+                            "default": 8,
+                            "minimum": 1
+                        },
+                        "min_distance": {
+                            "type": "integer",
+                            "description": "Minimum spacing of candidate sites in lattice sites",
+                            "default": 2,
+                            "minimum": 1
+                        },
+                        "sign": {
+                            "type": "string",
+                            "enum": ["abs", "positive", "negative"],
+                            "description": "Residual peaks to use: any mismatch, simulation stronger than the scan (suppressed polarization), or weaker",
+                            "default": "abs"
+                        },
+                        "strengths": {
+                            "type": "array",
+                            "items": {"type": "number"},
+                            "description": "Defect field strengths to try (default: [15.0])"
+                        },
+                        "angle_deg": {
+                            "type": "number",
+                            "description": "Direction of the defect field (90 = +y)",
+                            "default": 90.0
+                        },
+                        "objective": {
+                            "type": "string",
+                            "description": "Result key to maximize (errors such as 'rmse' are minimized)",
+                            "default": "correlation"
+                        },
+                        "refine": {
+                            "type": "boolean",
+                            "description": "Try dropping each site of the best set in a second batch",
+                            "default": True
+                        },
+                        "in_workers": {
+                            "type": "boolean",
+                            "description": "Run candidates in the worker process pool (parallel); false runs them in threads",
+                            "default": True
+                        },
+                        "keep_simulations": {
+                            "type": "boolean",
+                            "description": "Keep every candidate simulation instead of only the best",
+                            "default": False
                         }
                     },
                     "required": ["sim_id", "scan_id"]
@@ -681,9 +2840,10 @@ async def list_tools() -> list[types.Tool]:
     return tools
 
 @app.call_tool()
-async def call_tool(name: str, arguments: dict) -> list[types.TextContent]:
+async def call_tool(name: str, arguments: dict) -> list[types.TextContent | types.ImageContent]:
     """Handle tool calls from Claude"""
     
+    images = []  # Inline image content returned after the JSON result
     try:
         if name == "initialize_simulation":
             sim_id = sim_manager.create_simulation(arguments)
@@ -694,9 +2854,10 @@ async def call_tool(name: str, arguments: dict) -> list[types.TextContent]:
             }
             
         elif name == "run_simulation":
-            result = sim_manager.run_simulation(
+            result = await run_simulation_with_progress(
                 arguments['sim_id'],
-                verbose=arguments.get('verbose', False)
+                verbose=arguments.get('verbose', False),
+                in_worker=arguments.get('in_worker', False)
             )
             
         elif name == "get_simulation_results":
@@ -705,6 +2866,12 @@ async def call_tool(name: str, arguments: dict) -> list[types.TextContent]:
                 timestep=arguments.get('timestep', -1)
             )
             
+        elif name == "get_simulation_observables":
+            result = sim_manager.get_observables(
+                arguments['sim_id'],
+                stride=arguments.get('stride', 1)
+            )
+            
         elif name == "list_simulations":
             result = {
                 "simulations": sim_manager.list_simulations()
@@ -713,17 +2880,221 @@ async def call_tool(name: str, arguments: dict) -> list[types.TextContent]:
         elif name == "visualize_simulation":
             viz_type = arguments.get('viz_type', 'summary')
             timestep = arguments.get('timestep', -1)
-            filepath = sim_manager.visualize_simulation(
-                arguments['sim_id'],
-                viz_type=viz_type,
-                timestep=timestep
-            )
+            renderer = arguments.get('renderer', 'auto')
+            return_image = arguments.get('return_image', False)
+            save_to_disk = arguments.get('save_to_disk', True)
+            if not (return_image or save_to_disk):
+                raise ValueError("Nothing to return: set return_image or save_to_disk")
+            
+            filepath = None
+            cached = False
+            if save_to_disk:
+                # Serve unchanged renders from the cache; render misses off the event loop
+                filepath = sim_manager.cached_visualization(arguments['sim_id'], viz_type, timestep, renderer)
+                cached = filepath is not None
+                if not cached:
+                    filepath = await asyncio.wrap_future(sim_manager.submit_visualization(
+                        arguments['sim_id'],
+                        viz_type=viz_type,
+                        timestep=timestep,
+                        renderer=renderer
+                    ))
+            
             result = {
                 "success": True,
                 "sim_id": arguments['sim_id'],
                 "visualization_type": viz_type,
                 "filepath": filepath,
-                "message": f"Generated {viz_type} visualization and saved to: {filepath}"
+                "cached": cached,
+                "message": (f"{'Reused cached' if cached else 'Generated'} {viz_type} visualization saved to: {filepath}"
+                            if save_to_disk else f"Generated {viz_type} visualization in memory")
+            }
+            
+            if return_image:
+                png = await asyncio.wrap_future(sim_manager.submit_image(
+                    arguments['sim_id'],
+                    viz_type=viz_type,
+                    timestep=timestep,
+                    renderer=renderer,
+                    max_pixels=arguments.get('max_pixels', IMAGE_MAX_PIXELS),
+                    max_bytes=arguments.get('max_bytes', IMAGE_MAX_BYTES),
+                    source=filepath
+                ))
+                width, height = png_size(png)
+                result["image"] = {"width": width, "height": height, "bytes": len(png)}
+                images.append(types.ImageContent(
+                    type="image",
+                    data=base64.b64encode(png).decode('ascii'),
+                    mimeType="image/png"
+                ))
+        
+        elif name == "animate_simulation":
+            info = await animate_simulation_with_progress(
+                arguments['sim_id'],
+                viz_type=arguments.get('viz_type', 'magnitude_angle'),
+                stride=arguments.get('stride', 1),
+                output_format=arguments.get('output_format', 'apng'),
+                fps=arguments.get('fps', 10),
+                in_workers=arguments.get('in_workers', True)
+            )
+            result = {
+                "success": True,
+                "sim_id": arguments['sim_id'],
+                **info,
+                "message": f"{'Reused cached' if info['cached'] else 'Wrote'} animation ({info['frames']} frames) to: {info['output']}"
+            }
+        
+        elif name == "predict_simulation":
+            candidates = arguments.get('candidates') or [arguments.get('params', {})]
+            return_state = arguments.get('return_state', False)
+            component = arguments.get('component', 'magnitude')
+            if arguments.get('scan_id') is not None and (not AFM_AVAILABLE or not afm_manager):
+                raise ValueError("AFM Digital Twin not available")
+            
+            def predict():
+                # A stale surrogate refits (SVD + GP) on its next prediction: keep it off the event loop
+                prepared = None
+                if arguments.get('scan_id') is not None:
+                    scan = afm_manager.get_scan_arrays(arguments['scan_id'])
+                    prepared = scan_cache.get(arguments['scan_id'], scan['amplitude'], scan['phase'],
+                                              scan_extent(scan['params']))
+                predictions = []
+                for params in candidates:
+                    try:
+                        prediction = sim_manager.surrogates.predict(params, return_state or prepared is not None)
+                    except ValueError as e:
+                        predictions.append({"error": str(e)})
+                        continue
+                    state = prediction.pop('final_state', None)
+                    if prepared is not None:
+                        prediction['predicted_correlation'] = compare_frame_to_scan(
+                            state, prepared, component, ['correlation'],
+                            sim_extent=lattice_extent(state.shape, arguments.get('site_spacing_nm'))
+                        )['correlation']
+                    if return_state:
+                        prediction['final_Px'] = safe_serialize(state[0])
+                        prediction['final_Py'] = safe_serialize(state[1])
+                    predictions.append(prediction)
+                return predictions
+            
+            predictions = await asyncio.to_thread(predict)
+            n_predicted = sum('error' not in prediction for prediction in predictions)
+            result = {
+                "success": n_predicted > 0,
+                "predictions": predictions,
+                "surrogates": sim_manager.surrogates.summary(),
+                "message": (f"Predicted {n_predicted} of {len(predictions)} parameter sets from surrogates "
+                            f"(at least {MIN_TRAINING} completed runs per configuration needed)")
+            }
+        
+        elif name == "find_similar_simulations":
+            found = sim_manager.find_similar_simulations(
+                arguments['params'], k=arguments.get('k', 5), max_distance=arguments.get('max_distance')
+            )
+            if arguments.get('scan_id') is not None and found['neighbours']:
+                if not AFM_AVAILABLE or not afm_manager:
+                    raise ValueError("AFM Digital Twin not available")
+                frames = [sim_manager.get_pmat(neighbour['sim_id'])[:, -1] for neighbour in found['neighbours']]
+                
+                def correlate():
+                    # Scan preparation and comparisons are CPU-bound: run them off the event loop
+                    scan = afm_manager.get_scan_arrays(arguments['scan_id'])
+                    prepared = scan_cache.get(arguments['scan_id'], scan['amplitude'], scan['phase'],
+                                              scan_extent(scan['params']))
+                    return [compare_frame_to_scan(frame, prepared, arguments.get('component', 'magnitude'),
+                                                  ['correlation'])['correlation'] for frame in frames]
+                
+                correlations = await asyncio.to_thread(correlate)
+                for neighbour, correlation in zip(found['neighbours'], correlations):
+                    neighbour['correlation'] = correlation
+            
+            neighbours = found['neighbours']
+            if not neighbours:
+                message = f"No completed simulations indexed for {found['configuration']}"
+                if arguments.get('max_distance') is not None:
+                    message += f" within distance {arguments['max_distance']}"
+            elif neighbours[0]['identical']:
+                message = f"{neighbours[0]['sim_id']} already ran these parameters"
+            else:
+                message = (f"Nearest of {len(neighbours)} neighbours: {neighbours[0]['sim_id']} "
+                           f"(distance {neighbours[0]['distance']:.3g})")
+            result = {
+                "success": True,
+                **found,
+                "message": message
+            }
+        
+        elif name == "map_phase_diagram":
+            mapped = await map_phase_diagram(
+                base_params=arguments.get('base_params'),
+                x_param=arguments.get('x_param', 'k'),
+                x_range=arguments.get('x_range', [0.5, 3.0]),
+                y_param=arguments.get('y_param', 'dep_alpha'),
+                y_range=arguments.get('y_range', [0.0, 0.3]),
+                resolution=arguments.get('resolution', [5, 5]),
+                levels=arguments.get('levels', 2),
+                max_points=arguments.get('max_points'),
+                in_workers=arguments.get('in_workers', True),
+                keep_simulations=arguments.get('keep_simulations', False)
+            )
+            n_cached = sum(point['cached'] for point in mapped['points'])
+            result = {
+                "success": True,
+                **mapped,
+                "message": (f"Mapped {len(mapped['points'])} points ({n_cached} cached) in "
+                            f"{mapped['rounds']} rounds: {mapped['class_counts']}")
+            }
+        
+        elif name == "hysteresis_analysis":
+            sim_ids = arguments.get('sim_ids')
+            if sim_ids is None:
+                sim_ids = [s['sim_id'] for s in sim_manager.list_simulations() if s['status'] == 'completed']
+            analysis = sim_manager.hysteresis_analysis(
+                sim_ids, component=arguments.get('component', 'y'),
+                n_points=arguments.get('n_points', DEFAULT_CURVE_POINTS),
+                include_curves=arguments.get('include_curves', False)
+            )
+            n_loops = sum(loop['has_loop'] for loop in analysis['loops'].values())
+            result = {
+                "success": bool(analysis['loops']),
+                **analysis,
+                "message": (f"Found a complete loop in {n_loops} of {len(analysis['loops'])} simulations"
+                            + (f"; skipped {len(analysis['skipped'])}" if analysis['skipped'] else ""))
+            }
+        
+        elif name == "switching_kinetics":
+            sim_ids = arguments.get('sim_ids')
+            if sim_ids is None:
+                sim_ids = [s['sim_id'] for s in sim_manager.list_simulations() if s['status'] == 'completed']
+            analysis = sim_manager.switching_kinetics(
+                sim_ids, models=arguments.get('models', list(KINETICS_MODELS)),
+                include_curves=arguments.get('include_curves', False)
+            )
+            message = f"Fitted switching kinetics of {len(analysis['kinetics'])} simulations"
+            if analysis['merz'] is not None:
+                message += f"; Merz activation field {analysis['merz']['activation_field']:.4g}"
+            if analysis['skipped']:
+                message += f"; skipped {len(analysis['skipped'])}"
+            result = {
+                "success": bool(analysis['kinetics']),
+                **analysis,
+                "message": message
+            }
+        
+        elif name == "detect_topological_defects":
+            found = sim_manager.topological_defects(
+                arguments['sim_id'], stride=arguments.get('stride'),
+                max_frames=arguments.get('max_frames', 50),
+                include_positions=arguments.get('include_positions', True),
+                max_listed=arguments.get('max_listed', 200)
+            )
+            final = found['timesteps'][-1]
+            result = {
+                "success": True,
+                **found,
+                "message": (f"Analysed {found['frames_analysed']} frames (stride {found['stride']}); "
+                            f"final frame has {final['positive']} positive and {final['negative']} "
+                            f"negative charges, at most {found['max_defects']} defects in any frame")
             }
         
         # ====================================================================
@@ -822,75 +3193,195 @@ async def call_tool(name: str, arguments: dict) -> list[types.TextContent]:
             if not AFM_AVAILABLE or not afm_manager:
                 result = {"error": "AFM Digital Twin not available"}
             else:
-                # Get simulation results
                 sim_id = arguments['sim_id']
                 scan_id = arguments['scan_id']
                 component = arguments.get('component', 'magnitude')
                 
-                sim_results = sim_manager.get_results(sim_id, timestep=-1)
-                
-                # Extract simulation data based on component
-                if component == 'x':
-                    sim_data = np.array(sim_results['Px'])
-                elif component == 'y':
-                    sim_data = np.array(sim_results['Py'])
-                else:  # magnitude
-                    px = np.array(sim_results['Px'])
-                    py = np.array(sim_results['Py'])
-                    sim_data = np.sqrt(px**2 + py**2)
+                # Compare the stored arrays directly; the scan is normalized once per scan
+                pmat = sim_manager.get_pmat(sim_id)
+                scan = afm_manager.get_scan_arrays(scan_id)
+                afm_amplitude = scan['amplitude']
+                prepared = scan_cache.get(scan_id, afm_amplitude, scan['phase'], scan_extent(scan['params']))
+                sim_extent = lattice_extent(pmat.shape, arguments.get('site_spacing_nm'))
                 
-                # Get AFM data
-                afm_results = afm_manager.get_piezoresponse(scan_id)
-                afm_amplitude = np.array(afm_results['amplitude'])
+                timestep = arguments.get('timestep', -1)
+                search = None
+                if arguments.get('search_timesteps', False):
+                    indices = frame_indices(pmat.shape[1], arguments.get('stride', 1))
+                    search = await asyncio.to_thread(timestep_search, pmat, prepared, indices, component,
+                                                     sim_extent=sim_extent)
+                    timestep = search['best_timestep']
                 
-                # Resize simulation to match AFM resolution
-                if sim_data.shape != afm_amplitude.shape:
-                    from scipy.ndimage import zoom
-                    zoom_factor = afm_amplitude.shape[0] / sim_data.shape[0]
-                    sim_data_resized = zoom(sim_data, zoom_factor, order=1)
-                else:
-                    sim_data_resized = sim_data
-                
-                # Normalize both to [0, 1] range for fair comparison
-                sim_norm = (sim_data_resized - sim_data_resized.min()) / (sim_data_resized.max() - sim_data_resized.min() + 1e-10)
-                afm_norm = (afm_amplitude - afm_amplitude.min()) / (afm_amplitude.max() - afm_amplitude.min() + 1e-10)
+                frame = pmat[:, timestep]
+                sim_data = simulation_component(frame, component)
+                selected = arguments.get('metrics', DEFAULT_METRICS)
+                phase_weight = arguments.get('phase_weight', DEFAULT_PHASE_WEIGHT)
                 
-                # Calculate comparison metrics
-                correlation = float(np.corrcoef(
-                    sim_norm.flatten(),
-                    afm_norm.flatten()
-                )[0, 1])
+                def match():
+                    # Comparison and registration are CPU-bound: run them off the event loop
+                    prepared.prepare(selected)
+                    metrics = compare_to_scan(sim_data, prepared, metrics=selected, sim_up=frame[1] > 0,
+                                              phase_weight=phase_weight, sim_extent=sim_extent)
+                    if not arguments.get('align', False):
+                        return metrics, None
+                    aligned, aligned_up, alignment = align_to_scan(
+                        sim_data, prepared,
+                        rotation=arguments.get('allow_rotation', True),
+                        scale=arguments.get('allow_scale', True),
+                        sim_up=frame[1] > 0,
+                        sim_extent=sim_extent
+                    )
+                    alignment['metrics'] = compare_to_scan(aligned, prepared, metrics=selected, sim_up=aligned_up,
+                                                           phase_weight=phase_weight)
+                    return metrics, alignment
                 
-                mse = float(np.mean((sim_norm - afm_norm) ** 2))
-                rmse = float(np.sqrt(mse))
-                nrmse = rmse  # Already normalized
-                
-                # Structural similarity (if available)
-                try:
-                    from skimage.metrics import structural_similarity as ssim
-                    ssim_score = float(ssim(sim_norm, afm_norm, data_range=1.0))
-                except ImportError:
-                    ssim_score = None
+                metrics, alignment = await asyncio.to_thread(match)
                 
                 result = {
                     "success": True,
                     "sim_id": sim_id,
                     "scan_id": scan_id,
                     "component": component,
-                    "correlation": correlation,
-                    "mse": mse,
-                    "rmse": rmse,
-                    "nrmse": nrmse,
-                    "ssim": ssim_score,
-                    "match_quality": (
-                        "excellent" if correlation > 0.9 else
-                        "good" if correlation > 0.8 else
-                        "fair" if correlation > 0.7 else
-                        "poor"
-                    ),
+                    "timestep": timestep,
+                    **metrics,
                     "sim_shape": list(sim_data.shape),
                     "afm_shape": list(afm_amplitude.shape),
-                    "message": f"Theory-experiment matching complete. Correlation: {correlation:.3f}, Quality: {result.get('match_quality', 'N/A')}"
+                    "message": f"Theory-experiment matching complete. Correlation: {metrics['correlation']:.3f}, Quality: {metrics['match_quality']}"
+                }
+                if 'combined' in metrics:
+                    result["message"] += (f". Phase agreement: {metrics['phase_agreement']:.3f}, "
+                                          f"combined score: {metrics['combined']:.3f}")
+                if search is not None:
+                    result["timestep_search"] = search
+                    result["message"] += f". Best timestep: {timestep} of {pmat.shape[1]}"
+                if alignment is not None:
+                    result["alignment"] = alignment
+                    result["message"] += (f". Aligned (rotation {alignment['rotation_deg']:.1f} deg, scale {alignment['scale']:.2f}): "
+                                          f"correlation {alignment['metrics']['correlation']:.3f}")
+            
+        elif name == "rank_simulations_against_scan":
+            if not AFM_AVAILABLE or not afm_manager:
+                result = {"error": "AFM Digital Twin not available"}
+            else:
+                ranking = await rank_simulations_against_scan(
+                    arguments['scan_id'],
+                    sim_ids=arguments.get('sim_ids'),
+                    component=arguments.get('component', 'magnitude'),
+                    metrics=arguments.get('metrics', DEFAULT_METRICS),
+                    sort_by=arguments.get('sort_by', 'correlation'),
+                    phase_weight=arguments.get('phase_weight', DEFAULT_PHASE_WEIGHT),
+                    site_spacing_nm=arguments.get('site_spacing_nm'),
+                    coarse_to_fine=arguments.get('coarse_to_fine', True),
+                    keep=arguments.get('keep')
+                )
+                n_ranked = len(ranking['leaderboard']) + len(ranking['pruned'])
+                top_k = arguments.get('top_k')
+                if top_k is not None:
+                    ranking['leaderboard'] = ranking['leaderboard'][:top_k]
+                best = ranking['leaderboard'][0] if ranking['leaderboard'] else None
+                result = {
+                    "success": True,
+                    **ranking,
+                    "n_ranked": n_ranked,
+                    "message": (f"Ranked {n_ranked} simulations against {ranking['scan_id']} "
+                                f"({len(ranking['pruned'])} pruned at coarse resolution). "
+                                f"Best: {best['sim_id']} ({ranking['sort_by']} {best[ranking['sort_by']]:.3f})"
+                                if best else f"No simulations could be ranked against {ranking['scan_id']}")
+                }
+            
+        elif name == "fit_simulation_to_scan":
+            if not AFM_AVAILABLE or not afm_manager:
+                result = {"error": "AFM Digital Twin not available"}
+            else:
+                fit = await fit_simulation_to_scan(
+                    arguments['scan_id'],
+                    bounds=arguments.get('bounds'),
+                    base_params=arguments.get('base_params'),
+                    method=arguments.get('method', 'nelder_mead'),
+                    max_evaluations=arguments.get('max_evaluations', 30),
+                    batch_size=arguments.get('batch_size'),
+                    target=arguments.get('target'),
+                    objective=arguments.get('objective', 'correlation'),
+                    component=arguments.get('component', 'magnitude'),
+                    phase_weight=arguments.get('phase_weight', DEFAULT_PHASE_WEIGHT),
+                    site_spacing_nm=arguments.get('site_spacing_nm'),
+                    x0=arguments.get('x0'),
+                    seed=arguments.get('seed'),
+                    in_workers=arguments.get('in_workers', True),
+                    keep_simulations=arguments.get('keep_simulations', False),
+                    coarse_to_fine=arguments.get('coarse_to_fine', False),
+                    keep=arguments.get('keep')
+                )
+                fitted = fit['best_score'] is not None and np.isfinite(fit['best_score'])
+                result = {
+                    "success": bool(fitted),
+                    **fit,
+                    "message": (f"Fit finished after {fit['evaluations']} evaluations ({fit['stop_reason']}). "
+                                f"Best {fit['objective']}: {fit['best_score']:.4f} with {fit['best_params']}"
+                                if fitted else "No candidate could be evaluated")
+                }
+            
+        elif name == "pareto_search_simulations":
+            if not AFM_AVAILABLE or not afm_manager:
+                result = {"error": "AFM Digital Twin not available"}
+            else:
+                search = await pareto_search(
+                    arguments['scan_id'],
+                    bounds=arguments.get('bounds'),
+                    base_params=arguments.get('base_params'),
+                    objectives=arguments.get('objectives'),
+                    population_size=arguments.get('population_size', 8),
+                    generations=arguments.get('generations', 6),
+                    component=arguments.get('component', 'magnitude'),
+                    site_spacing_nm=arguments.get('site_spacing_nm'),
+                    nominal=arguments.get('nominal'),
+                    x0=arguments.get('x0'),
+                    seed=arguments.get('seed'),
+                    in_workers=arguments.get('in_workers', True),
+                    keep_simulations=arguments.get('keep_simulations', False)
+                )
+                result = {
+                    "success": bool(search['front']),
+                    **search,
+                    "message": (f"{len(search['front'])} Pareto-optimal configurations after "
+                                f"{search['evaluations']} evaluations over {search['generations']} generations"
+                                if search['front'] else "No candidate could be evaluated")
+                }
+            
+        elif name == "discover_defects":
+            if not AFM_AVAILABLE or not afm_manager:
+                result = {"error": "AFM Digital Twin not available"}
+            else:
+                discovery = await discover_defects(
+                    arguments['sim_id'],
+                    arguments['scan_id'],
+                    component=arguments.get('component', 'magnitude'),
+                    align=arguments.get('align', False),
+                    allow_rotation=arguments.get('allow_rotation', True),
+                    allow_scale=arguments.get('allow_scale', True),
+                    site_spacing_nm=arguments.get('site_spacing_nm'),
+                    max_sites=arguments.get('max_sites', 8),
+                    min_distance=arguments.get('min_distance', 2),
+                    sign=arguments.get('sign', 'abs'),
+                    strengths=arguments.get('strengths'),
+                    angle_deg=arguments.get('angle_deg', 90.0),
+                    objective=arguments.get('objective', 'correlation'),
+                    refine=arguments.get('refine', True),
+                    in_workers=arguments.get('in_workers', True),
+                    keep_simulations=arguments.get('keep_simulations', False)
+                )
+                best = discovery['best']
+                if best is None:
+                    message = "No residual peaks above threshold; the baseline needs no defects"
+                else:
+                    message = (f"Tried {len(discovery['candidates'])} defect sets from "
+                               f"{len(discovery['candidate_sites'])} residual peaks. Best: {len(best['sites'])} "
+                               f"defects, {discovery['objective']} {best['score']:.4f} "
+                               f"(baseline {discovery['baseline_score']:.4f})")
+                result = {
+                    "success": True,
+                    **discovery,
+                    "message": message
                 }
             
         else:
@@ -899,7 +3390,7 @@ async def call_tool(name: str, arguments: dict) -> list[types.TextContent]:
         return [types.TextContent(
             type="text",
             text=json.dumps(result, indent=2)
-        )]
+        )] + images
         
     except Exception as e:
         return [types.TextContent(
@@ -930,6 +3421,11 @@ async def main():
         import traceback
         traceback.print_exc(file=sys.stderr)
         raise
+    finally:
+        # Stop workers and free shared result blocks
+        sim_manager.shutdown()
+        if compare_executor is not None:
+            compare_executor.shutdown(wait=False, cancel_futures=True)
 
 if __name__ == "__main__":
     print("Starting FerroSim MCP Server...", file=sys.stderr)
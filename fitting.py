@@ -0,0 +1,701 @@
+#!/usr/bin/env python3
+"""
+Fitting - Batched black-box optimizers for simulation-to-scan parameter fits
+Nelder-Mead, CMA-ES and Gaussian-process Bayesian optimization over a box of
+simulation parameters, all in ask/tell form so each round's candidates can
+run in parallel; a Fitter adds the evaluation cache, history and stopping rules.
+NSGA-II with a non-dominated archive covers multi-objective (Pareto) searches
+"""
+
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+FIT_METHODS = ('nelder_mead', 'cmaes', 'bayesian')
+
+# Parameters that can be fitted, with the ranges the agent workflow suggests
+DEFAULT_BOUNDS = {
+    'k': (0.5, 3.0),
+    'dep_alpha': (0.0, 0.3),
+    'gamma': (0.5, 2.0),
+}
+
+# Amplitude fit, phase fit and closeness to nominal parameters
+DEFAULT_PARETO_OBJECTIVES = ('correlation', 'phase_correlation', 'plausibility')
+
+# create_simulation defaults; the plausibility objective penalizes departures from them
+NOMINAL_PARAMS = {
+    'k': 1.0,
+    'dep_alpha': 0.0,
+    'gamma': 1.0,
+}
+
+# Parameter vectors equal to this many decimals (in the unit cube) share a cache entry
+CACHE_DECIMALS = 9
+
+# Rounds in a row answered entirely from the cache before the fit counts as converged
+MAX_IDLE_ROUNDS = 10
+
+
+# ============================================================================
+# Parameter Space
+# ============================================================================
+
+class ParameterSpace:
+    """
+    Box of named parameters mapped to the unit cube
+
+    Optimizers work on [0, 1]^d so one step size suits every parameter.
+    """
+
+    def __init__(self, bounds: Dict[str, Sequence[float]]):
+        if not bounds:
+            raise ValueError("No parameters to fit")
+        self.names = list(bounds)
+        self.lower = np.array([float(bounds[name][0]) for name in self.names])
+        self.upper = np.array([float(bounds[name][1]) for name in self.names])
+        if np.any(self.upper <= self.lower):
+            raise ValueError("Each bound must be [low, high] with low < high")
+
+    @property
+    def dim(self) -> int:
+        return len(self.names)
+
+    def to_params(self, unit: np.ndarray) -> Dict[str, float]:
+        """Parameter dict for a point of the unit cube (clipped into the box)"""
+        values = self.lower + np.clip(unit, 0.0, 1.0) * (self.upper - self.lower)
+        return {name: float(value) for name, value in zip(self.names, values)}
+
+    def to_unit(self, params: Dict[str, float]) -> np.ndarray:
+        """Unit-cube coordinates of a parameter dict"""
+        values = np.array([float(params[name]) for name in self.names])
+        return np.clip((values - self.lower) / (self.upper - self.lower), 0.0, 1.0)
+
+
+# ============================================================================
+# Optimizers (minimize a loss over the unit cube)
+# ============================================================================
+
+class NelderMead:
+    """
+    Nelder-Mead simplex with speculative parallel steps
+
+    Each iteration asks for the reflection, expansion and both contraction
+    points at once, so one parallel round replaces up to three sequential
+    evaluations; a shrink asks for the d new vertices together.
+    """
+
+    def __init__(self, x0: np.ndarray, step: float = 0.25, xtol: float = 1e-3):
+        dim = len(x0)
+        self.xtol = xtol
+        simplex = [np.clip(x0, 0.0, 1.0)]
+        for i in range(dim):
+            vertex = simplex[0].copy()
+            # Step inward when the start sits on the upper bound
+            vertex[i] += step if vertex[i] + step <= 1.0 else -step
+            simplex.append(vertex)
+        self.simplex = np.array(simplex)
+        self.fvals = None
+        self.phase = 'init'
+        self.converged = False
+
+    def ask(self) -> np.ndarray:
+        if self.phase == 'init':
+            return self.simplex.copy()
+        if self.phase == 'shrink':
+            best = self.simplex[0]
+            return best + 0.5 * (self.simplex[1:] - best)
+
+        centroid = self.simplex[:-1].mean(axis=0)
+        worst = self.simplex[-1]
+        reflected = centroid + (centroid - worst)
+        self._candidates = np.clip(np.array([
+            reflected,
+            centroid + 2.0 * (centroid - worst),    # Expansion
+            centroid + 0.5 * (reflected - centroid),  # Outside contraction
+            centroid + 0.5 * (worst - centroid),    # Inside contraction
+        ]), 0.0, 1.0)
+        return self._candidates
+
+    def tell(self, points: np.ndarray, losses: np.ndarray):
+        if self.phase == 'init':
+            self.simplex, self.fvals = np.array(points), np.array(losses, dtype=float)
+            self.phase = 'iterate'
+        elif self.phase == 'shrink':
+            self.simplex[1:], self.fvals[1:] = points, losses
+            self.phase = 'iterate'
+        else:
+            f_r, f_e, f_oc, f_ic = losses
+            xr, xe, xoc, xic = points
+            if f_r < self.fvals[0]:
+                self._replace_worst(*((xe, f_e) if f_e < f_r else (xr, f_r)))
+            elif f_r < self.fvals[-2]:
+                self._replace_worst(xr, f_r)
+            elif f_r < self.fvals[-1] and f_oc <= f_r:
+                self._replace_worst(xoc, f_oc)
+            elif f_r >= self.fvals[-1] and f_ic < self.fvals[-1]:
+                self._replace_worst(xic, f_ic)
+            else:
+                self.phase = 'shrink'
+
+        order = np.argsort(self.fvals, kind='stable')
+        self.simplex, self.fvals = self.simplex[order], self.fvals[order]
+        diameter = np.max(np.abs(self.simplex[1:] - self.simplex[0]))
+        self.converged = self.phase == 'iterate' and diameter < self.xtol
+
+    def _replace_worst(self, point: np.ndarray, loss: float):
+        self.simplex[-1], self.fvals[-1] = point, loss
+
+
+class CMAES:
+    """
+    (mu/mu_w, lambda) CMA-ES with rank-one and rank-mu covariance updates
+
+    Follows Hansen's tutorial defaults; samples outside the unit cube are
+    clipped (the clipped point is what gets evaluated and learned from).
+    """
+
+    def __init__(self, x0: np.ndarray, sigma: float = 0.3, popsize: Optional[int] = None,
+                 seed: Optional[int] = None, xtol: float = 1e-4):
+        n = len(x0)
+        self.rng = np.random.default_rng(seed)
+        self.mean = np.clip(np.asarray(x0, dtype=float), 0.0, 1.0)
+        self.sigma = sigma
+        self.xtol = xtol
+        self.popsize = popsize or 4 + int(3 * np.log(n))
+        self.mu = self.popsize // 2
+        weights = np.log(self.mu + 0.5) - np.log(np.arange(1, self.mu + 1))
+        self.weights = weights / weights.sum()
+        self.mu_eff = 1.0 / np.sum(self.weights ** 2)
+
+        self.cc = (4 + self.mu_eff / n) / (n + 4 + 2 * self.mu_eff / n)
+        self.cs = (self.mu_eff + 2) / (n + self.mu_eff + 5)
+        self.c1 = 2 / ((n + 1.3) ** 2 + self.mu_eff)
+        self.cmu = min(1 - self.c1, 2 * (self.mu_eff - 2 + 1 / self.mu_eff) / ((n + 2) ** 2 + self.mu_eff))
+        self.damps = 1 + 2 * max(0.0, np.sqrt((self.mu_eff - 1) / (n + 1)) - 1) + self.cs
+        self.chi_n = np.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n ** 2))
+
+        self.pc = np.zeros(n)
+        self.ps = np.zeros(n)
+        self.C = np.eye(n)
+        self.generation = 0
+        self.converged = False
+
+    def ask(self) -> np.ndarray:
+        eigvals, eigvecs = np.linalg.eigh(self.C)
+        self._B, self._D = eigvecs, np.sqrt(np.maximum(eigvals, 1e-20))
+        z = self.rng.standard_normal((self.popsize, len(self.mean)))
+        return np.clip(self.mean + self.sigma * (z * self._D) @ self._B.T, 0.0, 1.0)
+
+    def tell(self, points: np.ndarray, losses: np.ndarray):
+        n = len(self.mean)
+        order = np.argsort(losses, kind='stable')[:self.mu]
+        y = (np.asarray(points)[order] - self.mean) / self.sigma
+        y_w = self.weights @ y
+        self.mean = self.mean + self.sigma * y_w
+        self.generation += 1
+
+        inv_sqrt_C = self._B @ np.diag(1 / self._D) @ self._B.T
+        self.ps = (1 - self.cs) * self.ps + np.sqrt(self.cs * (2 - self.cs) * self.mu_eff) * inv_sqrt_C @ y_w
+        h_sigma = (np.linalg.norm(self.ps) / np.sqrt(1 - (1 - self.cs) ** (2 * self.generation))
+                   < (1.4 + 2 / (n + 1)) * self.chi_n)
+        self.pc = (1 - self.cc) * self.pc + h_sigma * np.sqrt(self.cc * (2 - self.cc) * self.mu_eff) * y_w
+        rank_mu = (y.T * self.weights) @ y
+        self.C = ((1 - self.c1 - self.cmu) * self.C
+                  + self.c1 * (np.outer(self.pc, self.pc) + (1 - h_sigma) * self.cc * (2 - self.cc) * self.C)
+                  + self.cmu * rank_mu)
+        self.C = (self.C + self.C.T) / 2
+        self.sigma *= np.exp((self.cs / self.damps) * (np.linalg.norm(self.ps) / self.chi_n - 1))
+        self.converged = self.sigma * np.sqrt(np.max(np.diag(self.C))) < self.xtol
+
+
+class BayesianOptimizer:
+    """
+    Gaussian-process Bayesian optimization with expected improvement
+
+    A zero-mean GP with a Matern-5/2 kernel is fit to the standardized
+    losses (length scale by marginal likelihood over a small grid). Batches
+    come from the constant-liar heuristic: each chosen point is added with
+    the best observed loss before picking the next.
+    """
+
+    LENGTH_SCALES = (0.05, 0.1, 0.2, 0.35, 0.6, 1.0)
+    NOISE = 1e-6
+
+    def __init__(self, dim: int, batch_size: int = 4, n_initial: Optional[int] = None,
+                 n_candidates: int = 2048, seed: Optional[int] = None,
+                 x0: Optional[np.ndarray] = None):
+        self.dim = dim
+        self.batch_size = batch_size
+        self.n_initial = n_initial or max(batch_size, 2 * dim + 1)
+        self.n_candidates = n_candidates
+        self.rng = np.random.default_rng(seed)
+        self.x0 = x0
+        self.X = np.empty((0, dim))
+        self.y = np.empty(0)
+        self.converged = False
+
+    def _initial_design(self) -> np.ndarray:
+        """Latin hypercube sample (plus the start point, if given)"""
+        n = self.n_initial
+        design = (self.rng.permuted(np.tile(np.arange(n), (self.dim, 1)), axis=1).T
+                  + self.rng.random((n, self.dim))) / n
+        if self.x0 is not None:
+            design[0] = self.x0
+        return design
+
+    @staticmethod
+    def _kernel(a: np.ndarray, b: np.ndarray, length: float) -> np.ndarray:
+        r = np.sqrt(np.maximum(((a[:, None, :] - b[None, :, :]) ** 2).sum(-1), 0.0)) / length
+        s = np.sqrt(5.0) * r
+        return (1 + s + s * s / 3) * np.exp(-s)
+
+    def _fit(self, X: np.ndarray, y: np.ndarray):
+        """Cholesky factor and weights for the best length scale"""
+        best = None
+        for length in self.LENGTH_SCALES:
+            K = self._kernel(X, X, length) + self.NOISE * np.eye(len(X))
+            try:
+                L = np.linalg.cholesky(K)
+            except np.linalg.LinAlgError:
+                continue
+            alpha = np.linalg.solve(L.T, np.linalg.solve(L, y))
+            log_lik = -0.5 * y @ alpha - np.log(np.diag(L)).sum()
+            if best is None or log_lik > best[0]:
+                best = (log_lik, length, L, alpha)
+        return best[1:]
+
+    def _expected_improvement(self, candidates: np.ndarray, X: np.ndarray, y: np.ndarray) -> np.ndarray:
+        from scipy.stats import norm
+
+        length, L, alpha = self._fit(X, y)
+        k_star = self._kernel(candidates, X, length)
+        mu = k_star @ alpha
+        v = np.linalg.solve(L, k_star.T)
+        sd = np.sqrt(np.maximum(1.0 - (v * v).sum(axis=0), 1e-12))
+        improvement = y.min() - mu
+        z = improvement / sd
+        return improvement * norm.cdf(z) + sd * norm.pdf(z)
+
+    def ask(self) -> np.ndarray:
+        if len(self.y) < self.n_initial:
+            return self._initial_design()
+
+        scale = self.y.std() or 1.0
+        X, y = self.X.copy(), (self.y - self.y.mean()) / scale
+        batch = []
+        for _ in range(self.batch_size):
+            best = X[np.argmin(y)]
+            candidates = np.vstack([
+                self.rng.random((self.n_candidates, self.dim)),
+                np.clip(best + 0.05 * self.rng.standard_normal((self.n_candidates // 4, self.dim)), 0.0, 1.0),
+            ])
+            choice = candidates[np.argmax(self._expected_improvement(candidates, X, y))]
+            batch.append(choice)
+            X = np.vstack([X, choice])
+            y = np.append(y, y.min())  # Constant liar
+        return np.array(batch)
+
+    def tell(self, points: np.ndarray, losses: np.ndarray):
+        self.X = np.vstack([self.X, points])
+        self.y = np.append(self.y, losses)
+
+
+def make_optimizer(method: str, dim: int, x0: np.ndarray, batch_size: int, seed: Optional[int] = None):
+    """Optimizer instance for one of FIT_METHODS"""
+    if method == 'nelder_mead':
+        return NelderMead(x0)
+    if method == 'cmaes':
+        return CMAES(x0, popsize=max(batch_size, 4), seed=seed)
+    if method == 'bayesian':
+        return BayesianOptimizer(dim, batch_size=batch_size, seed=seed, x0=x0)
+    raise ValueError(f"Unknown fitting method: {method}")
+
+
+# ============================================================================
+# Fit Driver
+# ============================================================================
+
+class Fitter:
+    """
+    Ask/tell driver maximizing a score over a ParameterSpace
+
+    ask() returns only parameter sets not evaluated before in this fit
+    (repeats are answered from the cache); tell() takes their scores in the
+    same order. The fit is done when the evaluation budget is spent, the
+    target score is reached or the optimizer has converged.
+    """
+
+    def __init__(self, space: ParameterSpace, method: str = 'nelder_mead', max_evaluations: int = 40,
+                 batch_size: int = 4, target: Optional[float] = None,
+                 x0: Optional[Dict[str, float]] = None, seed: Optional[int] = None):
+        if method not in FIT_METHODS:
+            raise ValueError(f"Unknown fitting method: {method}")
+        self.space = space
+        self.method = method
+        self.max_evaluations = max_evaluations
+        self.target = target
+        start = space.to_unit(x0) if x0 else np.full(space.dim, 0.5)
+        self.optimizer = make_optimizer(method, space.dim, start, batch_size, seed)
+        self.cache: Dict[Tuple, float] = {}
+        self.history: List[Dict] = []
+        self.best: Optional[Dict] = None
+        self._pending = None
+        self._idle_rounds = 0
+
+    @staticmethod
+    def _key(point: np.ndarray) -> Tuple:
+        return tuple(np.round(point, CACHE_DECIMALS))
+
+    @property
+    def evaluations(self) -> int:
+        return len(self.history)
+
+    @property
+    def done(self) -> bool:
+        if self.evaluations >= self.max_evaluations or self.optimizer.converged:
+            return True
+        if self._idle_rounds >= MAX_IDLE_ROUNDS:
+            return True
+        return self.target is not None and self.best is not None and self.best['score'] >= self.target
+
+    @property
+    def stop_reason(self) -> str:
+        if self.target is not None and self.best is not None and self.best['score'] >= self.target:
+            return 'target_reached'
+        if self.optimizer.converged or self._idle_rounds >= MAX_IDLE_ROUNDS:
+            return 'converged'
+        return 'budget_exhausted'
+
+    def ask(self) -> List[Dict[str, float]]:
+        """New parameter sets to evaluate (may be empty if every point is cached)"""
+        points = np.clip(np.atleast_2d(self.optimizer.ask()), 0.0, 1.0)
+        new, seen = [], set()
+        for point in points:
+            key = self._key(point)
+            if key not in self.cache and key not in seen:
+                seen.add(key)
+                new.append(point)
+        # Never overspend the budget; the optimizer sees the trimmed points as failures
+        new = new[:max(self.max_evaluations - self.evaluations, 0)]
+        self._idle_rounds = 0 if new else self._idle_rounds + 1
+        self._pending = (points, new)
+        return [self.space.to_params(point) for point in new]
+
+    def tell(self, scores: Sequence[float], info: Optional[Sequence[Dict]] = None):
+        """Scores (higher is better) for the parameter sets from the last ask()"""
+        points, new = self._pending
+        self._pending = None
+        for i, (point, score) in enumerate(zip(new, scores)):
+            score = float(score) if np.isfinite(score) else -np.inf
+            self.cache[self._key(point)] = score
+            entry = {'evaluation': self.evaluations + 1, 'params': self.space.to_params(point), 'score': score}
+            if info is not None:
+                entry.update(info[i])
+            self.history.append(entry)
+            if self.best is None or score > self.best['score']:
+                self.best = entry
+
+        losses = np.array([-self.cache.get(self._key(point), -np.inf) for point in points])
+        finite = np.isfinite(losses)
+        # Failed or unevaluated points rank below every real evaluation
+        losses[~finite] = (losses[finite].max() if finite.any() else 0.0) + 1.0
+        self.optimizer.tell(points, losses)
+
+    def run(self, evaluate: Callable[[List[Dict[str, float]]], Sequence[float]]) -> Dict:
+        """Run to completion with a synchronous batch evaluator; returns summary()"""
+        while not self.done:
+            batch = self.ask()
+            self.tell(evaluate(batch) if batch else [])
+        return self.summary()
+
+    def summary(self) -> Dict:
+        """Best parameters, stop reason and the evaluation history"""
+        return {
+            'method': self.method,
+            'best_params': self.best['params'] if self.best else None,
+            'best_score': self.best['score'] if self.best else None,
+            'best': self.best,
+            'evaluations': self.evaluations,
+            'stop_reason': self.stop_reason,
+            'history': self.history,
+        }
+
+
+# ============================================================================
+# Pareto Search
+# ============================================================================
+
+def dominates(a: np.ndarray, b: np.ndarray) -> bool:
+    """True if score vector a is at least as good as b everywhere and better somewhere (maximizing)"""
+    return bool(np.all(a >= b) and np.any(a > b))
+
+
+def non_dominated_sort(scores: np.ndarray) -> List[np.ndarray]:
+    """
+    Fast non-dominated sort (Deb et al. 2002) of an (n, m) score matrix
+
+    Returns:
+        Index arrays of successive fronts, the Pareto front first
+    """
+    scores = np.asarray(scores, dtype=float)
+    better = np.all(scores[:, None] >= scores[None, :], axis=2) & np.any(scores[:, None] > scores[None, :], axis=2)
+    dominated_by = better.sum(axis=0)
+    fronts = []
+    current = np.flatnonzero(dominated_by == 0)
+    while current.size:
+        fronts.append(current)
+        dominated_by = dominated_by - better[current].sum(axis=0)
+        dominated_by[current] = -1
+        current = np.flatnonzero(dominated_by == 0)
+    return fronts
+
+
+def crowding_distance(scores: np.ndarray) -> np.ndarray:
+    """Crowding distance of each member of one front; boundary points get infinity"""
+    scores = np.asarray(scores, dtype=float)
+    n = len(scores)
+    distance = np.zeros(n)
+    if n <= 2:
+        return np.full(n, np.inf)
+    for column in scores.T:
+        order = np.argsort(column, kind='stable')
+        span = column[order[-1]] - column[order[0]]
+        distance[order[[0, -1]]] = np.inf
+        if span > 0:
+            distance[order[1:-1]] += (column[order[2:]] - column[order[:-2]]) / span
+    return distance
+
+
+def plausibility(params: Dict[str, float], space: ParameterSpace,
+                 nominal: Optional[Dict[str, float]] = None) -> float:
+    """
+    Negative mean squared distance from the nominal parameters, in unit-cube
+    coordinates (0 at the nominal point, -1 at the far corner of the box)
+    """
+    nominal = {**NOMINAL_PARAMS, **(nominal or {})}
+    reference = {name: nominal.get(name, (low + high) / 2)
+                 for name, low, high in zip(space.names, space.lower, space.upper)}
+    delta = space.to_unit(params) - space.to_unit(reference)
+    return 0.0 - float(np.mean(delta ** 2))
+
+
+class NSGA2:
+    """
+    NSGA-II over the unit cube (maximizing every objective)
+
+    Each generation asks for popsize offspring, produced by binary
+    tournaments on (rank, crowding), simulated binary crossover and
+    polynomial mutation; tell() keeps the best popsize of parents and
+    offspring by non-dominated rank, then crowding distance.
+    """
+
+    def __init__(self, dim: int, popsize: int = 8, seed: Optional[int] = None,
+                 x0: Optional[np.ndarray] = None, crossover_eta: float = 15.0,
+                 mutation_eta: float = 20.0):
+        self.dim = dim
+        self.popsize = max(popsize + popsize % 2, 4)
+        self.rng = np.random.default_rng(seed)
+        self.crossover_eta = crossover_eta
+        self.mutation_eta = mutation_eta
+        self.population: Optional[np.ndarray] = None
+        self.scores: Optional[np.ndarray] = None
+        self._x0 = x0
+        self.converged = False
+
+    def _initial(self) -> np.ndarray:
+        strata = (np.arange(self.popsize)[:, None] + self.rng.random((self.popsize, self.dim))) / self.popsize
+        points = np.array([self.rng.permutation(column) for column in strata.T]).T
+        if self._x0 is not None:
+            points[0] = np.clip(self._x0, 0.0, 1.0)
+        return points
+
+    def _rank(self, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        rank = np.empty(len(scores), dtype=int)
+        crowding = np.empty(len(scores))
+        for level, front in enumerate(non_dominated_sort(scores)):
+            rank[front] = level
+            crowding[front] = crowding_distance(scores[front])
+        return rank, crowding
+
+    def _tournament(self, rank: np.ndarray, crowding: np.ndarray) -> int:
+        a, b = self.rng.integers(len(rank), size=2)
+        if rank[a] != rank[b]:
+            return a if rank[a] < rank[b] else b
+        return a if crowding[a] >= crowding[b] else b
+
+    def _crossover(self, p1: np.ndarray, p2: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        u = self.rng.random(self.dim)
+        beta = np.where(u <= 0.5, (2 * u) ** (1 / (self.crossover_eta + 1)),
+                        (1 / (2 * (1 - u))) ** (1 / (self.crossover_eta + 1)))
+        swap = self.rng.random(self.dim) < 0.5
+        c1 = 0.5 * ((1 + beta) * p1 + (1 - beta) * p2)
+        c2 = 0.5 * ((1 - beta) * p1 + (1 + beta) * p2)
+        return np.where(swap, c2, c1), np.where(swap, c1, c2)
+
+    def _mutate(self, child: np.ndarray) -> np.ndarray:
+        u = self.rng.random(self.dim)
+        delta = np.where(u < 0.5, (2 * u) ** (1 / (self.mutation_eta + 1)) - 1,
+                         1 - (2 * (1 - u)) ** (1 / (self.mutation_eta + 1)))
+        mutate = self.rng.random(self.dim) < 1.0 / self.dim
+        return np.clip(child + mutate * delta, 0.0, 1.0)
+
+    def ask(self) -> np.ndarray:
+        if self.population is None:
+            return self._initial()
+        rank, crowding = self._rank(self.scores)
+        children = []
+        while len(children) < self.popsize:
+            p1 = self.population[self._tournament(rank, crowding)]
+            p2 = self.population[self._tournament(rank, crowding)]
+            children.extend(self._mutate(c) for c in self._crossover(p1, p2))
+        return np.clip(np.array(children[:self.popsize]), 0.0, 1.0)
+
+    def tell(self, points: np.ndarray, scores: np.ndarray):
+        points, scores = np.asarray(points, dtype=float), np.asarray(scores, dtype=float)
+        if self.population is not None:
+            points = np.vstack([self.population, points])
+            scores = np.vstack([self.scores, scores])
+        keep = []
+        for front in non_dominated_sort(scores):
+            if len(keep) + len(front) <= self.popsize:
+                keep.extend(front)
+            else:
+                by_crowding = np.argsort(-crowding_distance(scores[front]), kind='stable')
+                keep.extend(front[by_crowding[:self.popsize - len(keep)]])
+                break
+        self.population, self.scores = points[keep], scores[keep]
+
+
+class ParetoArchive:
+    """Non-dominated set of evaluated entries, each holding a 'scores' dict"""
+
+    def __init__(self, objectives: Sequence[str]):
+        self.objectives = list(objectives)
+        self.entries: List[Dict] = []
+
+    def vector(self, entry: Dict) -> np.ndarray:
+        return np.array([entry['scores'][name] for name in self.objectives], dtype=float)
+
+    def add(self, entry: Dict) -> bool:
+        """Insert an entry unless it is dominated; returns True if the front changed"""
+        vector = self.vector(entry)
+        if not np.all(np.isfinite(vector)):
+            return False
+        if any(dominates(self.vector(member), vector) for member in self.entries):
+            return False
+        self.entries = [member for member in self.entries if not dominates(vector, self.vector(member))]
+        self.entries.append(entry)
+        return True
+
+    def sorted(self) -> List[Dict]:
+        """Front ordered by the first objective, best first"""
+        return sorted(self.entries, key=lambda entry: -entry['scores'][self.objectives[0]])
+
+
+class ParetoSearch:
+    """
+    Ask/tell NSGA-II driver over a ParameterSpace with several objectives
+
+    Like Fitter, repeats within a search are answered from the cache and
+    failed evaluations (non-finite scores) rank below every real one.
+    tell() takes one score vector per parameter set, in objective order.
+    """
+
+    def __init__(self, space: ParameterSpace, objectives: Sequence[str], population_size: int = 8,
+                 max_evaluations: int = 64, x0: Optional[Dict[str, float]] = None,
+                 seed: Optional[int] = None):
+        if len(objectives) < 2:
+            raise ValueError("A Pareto search needs at least two objectives")
+        self.space = space
+        self.objectives = list(objectives)
+        self.max_evaluations = max_evaluations
+        start = space.to_unit(x0) if x0 else None
+        self.optimizer = NSGA2(space.dim, population_size, seed, start)
+        self.archive = ParetoArchive(self.objectives)
+        self.cache: Dict[Tuple, np.ndarray] = {}
+        self.history: List[Dict] = []
+        self.generation = 0
+        self._pending = None
+        self._idle_rounds = 0
+
+    @property
+    def evaluations(self) -> int:
+        return len(self.history)
+
+    @property
+    def done(self) -> bool:
+        return self.evaluations >= self.max_evaluations or self._idle_rounds >= MAX_IDLE_ROUNDS
+
+    @property
+    def stop_reason(self) -> str:
+        return 'budget_exhausted' if self.evaluations >= self.max_evaluations else 'converged'
+
+    @property
+    def front(self) -> List[Dict]:
+        return self.archive.sorted()
+
+    def ask(self) -> List[Dict[str, float]]:
+        """New parameter sets for the next generation (may be empty if every point is cached)"""
+        points = np.clip(np.atleast_2d(self.optimizer.ask()), 0.0, 1.0)
+        new, seen = [], set()
+        for point in points:
+            key = Fitter._key(point)
+            if key not in self.cache and key not in seen:
+                seen.add(key)
+                new.append(point)
+        new = new[:max(self.max_evaluations - self.evaluations, 0)]
+        self._idle_rounds = 0 if new else self._idle_rounds + 1
+        self._pending = (points, new)
+        return [self.space.to_params(point) for point in new]
+
+    def tell(self, scores: Sequence[Sequence[float]], info: Optional[Sequence[Dict]] = None) -> bool:
+        """
+        Score vectors for the parameter sets from the last ask()
+
+        Returns:
+            True if the Pareto front changed
+        """
+        points, new = self._pending
+        self._pending = None
+        changed = False
+        for i, (point, vector) in enumerate(zip(new, scores)):
+            vector = np.array(vector, dtype=float)
+            vector[~np.isfinite(vector)] = -np.inf
+            self.cache[Fitter._key(point)] = vector
+            entry = {'evaluation': self.evaluations + 1, 'generation': self.generation,
+                     'params': self.space.to_params(point),
+                     'scores': dict(zip(self.objectives, vector.tolist()))}
+            if info is not None:
+                entry.update(info[i])
+            self.history.append(entry)
+            changed = self.archive.add(entry) or changed
+
+        vectors = np.array([self.cache.get(Fitter._key(point), np.full(len(self.objectives), -np.inf))
+                            for point in points])
+        # Failed or unevaluated points rank below every real evaluation of each objective
+        for column in vectors.T:
+            finite = np.isfinite(column)
+            column[~finite] = (column[finite].min() if finite.any() else 0.0) - 1.0
+        self.optimizer.tell(points, vectors)
+        self.generation += 1
+        return changed
+
+    def run(self, evaluate: Callable[[List[Dict[str, float]]], Sequence[Sequence[float]]]) -> Dict:
+        """Run to completion with a synchronous batch evaluator; returns summary()"""
+        while not self.done:
+            batch = self.ask()
+            self.tell(evaluate(batch) if batch else [])
+        return self.summary()
+
+    def summary(self) -> Dict:
+        """Pareto front, stop reason and the evaluation history"""
+        return {
+            'objectives': self.objectives,
+            'front': self.front,
+            'generations': self.generation,
+            'evaluations': self.evaluations,
+            'stop_reason': self.stop_reason,
+            'history': self.history,
+        }
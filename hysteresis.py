@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Hysteresis - P-E loop extraction from simulated trajectories
+The applied field of each run is split into monotonic branches; the last
+complete rising and falling branches form the steady-state loop, from which
+coercive fields, remanence, loop area and imprint are read off by linear
+interpolation. Every step works on (runs, timesteps) arrays, so equally long
+runs are analysed together in one pass
+"""
+
+from typing import Dict, Tuple
+
+import numpy as np
+
+
+# Fraction of the full field range a branch must sweep to count as a loop branch
+BRANCH_SPAN = 0.9
+
+# Field points of the interpolated P(E) curves
+DEFAULT_CURVE_POINTS = 51
+
+# Field / polarization component analysed
+LOOP_COMPONENTS = {'x': 0, 'y': 1}
+
+
+# ============================================================================
+# Branches
+# ============================================================================
+
+def field_direction(field: np.ndarray) -> np.ndarray:
+    """
+    Sweep direction (+1, -1) of every segment between consecutive samples
+
+    Segments where the field holds still inherit the previous direction;
+    leading flat segments get 0.
+
+    Args:
+        field: (B, T) field traces
+
+    Returns:
+        (B, T - 1) integer array
+    """
+    direction = np.sign(np.diff(field, axis=1)).astype(np.int64)
+    columns = np.arange(direction.shape[1])
+    last_moving = np.maximum.accumulate(np.where(direction != 0, columns, 0), axis=1)
+    return np.take_along_axis(direction, last_moving, axis=1)
+
+
+def loop_branches(field: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Segments of the last complete rising and falling branch of each trace
+
+    A branch is a maximal run of segments with one sweep direction; it is
+    complete when it covers BRANCH_SPAN of the trace's field range, which
+    excludes the virgin branch from zero and a truncated final branch.
+
+    Args:
+        field: (B, T) field traces
+
+    Returns:
+        (rising, falling) boolean segment masks, each (B, T - 1); a row
+        without such a branch is all False
+    """
+    field = np.asarray(field, dtype=np.float64)
+    n_runs, n_segments = field.shape[0], field.shape[1] - 1
+    direction = field_direction(field)
+    changes = np.diff(direction, axis=1) != 0
+    branch = np.concatenate([np.zeros((n_runs, 1), dtype=np.int64), np.cumsum(changes, axis=1)], axis=1)
+
+    # Per-branch sweep and direction via one bincount over (run, branch) labels
+    labels = (branch + n_segments * np.arange(n_runs)[:, None]).ravel()
+    moving = direction.ravel() != 0
+    size = n_runs * n_segments
+    sweep = np.bincount(labels[moving], weights=np.abs(np.diff(field, axis=1)).ravel()[moving],
+                        minlength=size).reshape(n_runs, n_segments)
+    heading = np.sign(np.bincount(labels, weights=direction.ravel(), minlength=size)).reshape(n_runs, n_segments)
+
+    span = field.max(axis=1) - field.min(axis=1)
+    complete = (sweep >= BRANCH_SPAN * span[:, None]) & (span[:, None] > 0)
+    ids = np.arange(n_segments)
+    last_rise = np.where(complete & (heading > 0), ids, -1).max(axis=1)
+    last_fall = np.where(complete & (heading < 0), ids, -1).max(axis=1)
+    rising = (branch == last_rise[:, None]) & (last_rise[:, None] >= 0)
+    falling = (branch == last_fall[:, None]) & (last_fall[:, None] >= 0)
+    return rising, falling
+
+
+def level_crossings(x: np.ndarray, y: np.ndarray, mask: np.ndarray,
+                    levels: np.ndarray, direction: int) -> np.ndarray:
+    """
+    y at the first crossing of each level by x within the masked segments
+
+    Args:
+        x, y: (B, T) traces
+        mask: (B, T - 1) segments to search
+        levels: (B, L) levels per trace (or (L,) shared)
+        direction: +1 for upward crossings of x, -1 for downward
+
+    Returns:
+        (B, L) linearly interpolated y, NaN where x never crosses the level
+    """
+    levels = np.broadcast_to(np.asarray(levels, dtype=np.float64), (x.shape[0], np.shape(levels)[-1]))
+    x0, x1 = x[:, :-1, None], x[:, 1:, None]
+    level = levels[:, None, :]
+    if direction > 0:
+        hit = (x0 <= level) & (x1 >= level) & (x1 > x0)
+    else:
+        hit = (x0 >= level) & (x1 <= level) & (x1 < x0)
+    hit &= mask[:, :, None]
+
+    first = hit.argmax(axis=1)[:, None, :]
+    found = hit.any(axis=1)
+    xa = np.take_along_axis(np.broadcast_to(x0, hit.shape), first, axis=1)[:, 0]
+    xb = np.take_along_axis(np.broadcast_to(x1, hit.shape), first, axis=1)[:, 0]
+    ya = np.take_along_axis(np.broadcast_to(y[:, :-1, None], hit.shape), first, axis=1)[:, 0]
+    yb = np.take_along_axis(np.broadcast_to(y[:, 1:, None], hit.shape), first, axis=1)[:, 0]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        value = ya + (levels - xa) / (xb - xa) * (yb - ya)
+    return np.where(found, value, np.nan)
+
+
+def branch_curves(field: np.ndarray, polarization: np.ndarray, mask: np.ndarray,
+                  grid: np.ndarray, direction: int) -> np.ndarray:
+    """
+    P interpolated onto a field grid along one monotonic branch per trace
+
+    The branch samples of all traces are laid end to end on one increasing
+    axis (field normalized per trace, offset by twice the trace index), so
+    a single np.interp serves the whole batch.
+
+    Args:
+        field, polarization: (B, T) traces
+        mask: (B, T - 1) segments of the branch (as from loop_branches)
+        grid: (B, L) field values, inside each branch's range
+        direction: +1 for a rising branch, -1 for a falling one
+
+    Returns:
+        (B, L) polarization, NaN for traces without the branch
+    """
+    samples = np.zeros(field.shape, dtype=bool)
+    samples[:, :-1] |= mask
+    samples[:, 1:] |= mask
+    oriented = direction * field
+    low = np.where(samples, oriented, np.inf).min(axis=1, keepdims=True)
+    high = np.where(samples, oriented, -np.inf).max(axis=1, keepdims=True)
+    present = samples.any(axis=1, keepdims=True)
+    if not present.any():
+        return np.full(grid.shape, np.nan)
+    width = np.where(present & (high > low), high - low, 1.0)
+    offset = 2.0 * np.arange(field.shape[0])[:, None]
+
+    keys = np.where(present, (oriented - np.where(present, low, 0.0)) / width, 0.0) + offset
+    queries = (direction * grid - np.where(present, low, 0.0)) / width + offset
+    curve = np.interp(queries.ravel(), keys[samples], polarization[samples]).reshape(grid.shape)
+    return np.where(present, curve, np.nan)
+
+
+# ============================================================================
+# Loop Metrics
+# ============================================================================
+
+def hysteresis_loops(field: np.ndarray, polarization: np.ndarray,
+                     n_points: int = DEFAULT_CURVE_POINTS) -> Dict[str, np.ndarray]:
+    """
+    Loop metrics of a batch of equally long P(E) trajectories
+
+    Args:
+        field: (B, T) or (T,) applied field component
+        polarization: Matching lattice-averaged polarization component
+        n_points: Field points of the interpolated branches
+
+    Returns:
+        Dict of (B,) arrays: coercive_positive / coercive_negative (field
+        where P changes sign on the rising / falling branch),
+        coercive_field (half their difference), imprint (their mean),
+        remanence_positive / remanence_negative (P at E = 0 on the falling /
+        rising branch), loop_area (|closed integral of P dE| over both
+        branches), p_max / p_min, and has_loop; plus field_grid, p_rising
+        and p_falling, each (B, n_points). Quantities a run does not reach
+        (e.g. P never changes sign) are NaN.
+    """
+    field = np.atleast_2d(np.asarray(field, dtype=np.float64))
+    polarization = np.atleast_2d(np.asarray(polarization, dtype=np.float64))
+    if field.shape != polarization.shape:
+        raise ValueError(f"Field {field.shape} and polarization {polarization.shape} traces differ in shape")
+    if field.shape[1] < 3:
+        raise ValueError("Need at least 3 samples per trace")
+
+    rising, falling = loop_branches(field)
+    has_loop = rising.any(axis=1) & falling.any(axis=1)
+    zero = np.zeros(1)
+    coercive_positive = level_crossings(polarization, field, rising, zero, +1)[:, 0]
+    coercive_negative = level_crossings(polarization, field, falling, zero, -1)[:, 0]
+    remanence_positive = level_crossings(field, polarization, falling, zero, -1)[:, 0]
+    remanence_negative = level_crossings(field, polarization, rising, zero, +1)[:, 0]
+
+    loop = rising | falling
+    trapezoids = 0.5 * (polarization[:, :-1] + polarization[:, 1:]) * np.diff(field, axis=1)
+    loop_area = np.where(has_loop, np.abs(np.where(loop, trapezoids, 0.0).sum(axis=1)), np.nan)
+
+    # Samples touched by a loop segment; the curve grid spans the field range both branches cover
+    on_loop = np.zeros(field.shape, dtype=bool)
+    on_loop[:, :-1] |= loop
+    on_loop[:, 1:] |= loop
+    e_low = np.full(len(field), -np.inf)
+    e_high = np.full(len(field), np.inf)
+    for branch in (rising, falling):
+        samples = np.zeros(field.shape, dtype=bool)
+        samples[:, :-1] |= branch
+        samples[:, 1:] |= branch
+        e_low = np.maximum(e_low, np.where(samples, field, np.inf).min(axis=1))
+        e_high = np.minimum(e_high, np.where(samples, field, -np.inf).max(axis=1))
+    e_low, e_high = np.where(has_loop, e_low, 0.0), np.where(has_loop, e_high, 0.0)
+    grid = np.linspace(0.0, 1.0, n_points)[None, :] * (e_high - e_low)[:, None] + e_low[:, None]
+    p_rising = branch_curves(field, polarization, rising, grid, +1)
+    p_falling = branch_curves(field, polarization, falling, grid, -1)
+
+    return {
+        'coercive_positive': coercive_positive,
+        'coercive_negative': coercive_negative,
+        'coercive_field': 0.5 * (coercive_positive - coercive_negative),
+        'imprint': 0.5 * (coercive_positive + coercive_negative),
+        'remanence_positive': remanence_positive,
+        'remanence_negative': remanence_negative,
+        'loop_area': loop_area,
+        'p_max': np.where(has_loop, np.where(on_loop, polarization, -np.inf).max(axis=1), np.nan),
+        'p_min': np.where(has_loop, np.where(on_loop, polarization, np.inf).min(axis=1), np.nan),
+        'has_loop': has_loop,
+        'field_grid': np.where(has_loop[:, None], grid, np.nan),
+        'p_rising': np.where(has_loop[:, None], p_rising, np.nan),
+        'p_falling': np.where(has_loop[:, None], p_falling, np.nan),
+    }
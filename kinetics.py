@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Kinetics - Switching kinetics of step-field simulations
+The switched fraction is reduced from the polarization history in one
+chunked pass; Kolmogorov-Avrami-Ishibashi (KAI) and nucleation-limited
+switching (NLS) models are then fitted to all runs at once by a batched
+Levenberg-Marquardt solver, and characteristic times across a field sweep
+give Merz-law activation fields
+"""
+
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+
+KINETICS_MODELS = ('kai', 'nls')
+
+# Frames reduced per chunk when streaming a history
+FRAME_CHUNK = 64
+
+# Switched fractions used for the linearized KAI starting point
+LINEAR_RANGE = (0.02, 0.98)
+
+# NLS: exponent of each region's KAI term (2D growth) and quadrature points of
+# the Lorentzian distribution of log10 switching times
+NLS_EXPONENT = 2.0
+NLS_QUADRATURE = 64
+NLS_INITIAL_WIDTH = 0.3  # decades
+
+MAX_ITERATIONS = 60
+
+
+# ============================================================================
+# Switched Fraction
+# ============================================================================
+
+def aligned_fraction(history: np.ndarray, direction: np.ndarray, chunk: int = FRAME_CHUNK) -> np.ndarray:
+    """
+    Fraction of sites with P along direction, for every frame of a history
+
+    Args:
+        history: (2, T, n, n) polarization history (read chunk by chunk, so
+            shared-memory views are never copied whole)
+        direction: (2,) field direction
+
+    Returns:
+        (T,) fractions
+    """
+    direction = np.asarray(direction, dtype=np.float64)
+    n_frames = history.shape[1]
+    n_sites = history.shape[2] * history.shape[3]
+    fraction = np.empty(n_frames)
+    for start in range(0, n_frames, chunk):
+        block = history[:, start:start + chunk]
+        projected = direction[0] * block[0] + direction[1] * block[1]
+        fraction[start:start + chunk] = np.count_nonzero(projected > 0, axis=(-2, -1)) / n_sites
+    return fraction
+
+
+def switched_fraction(aligned: np.ndarray) -> np.ndarray:
+    """
+    Share of the initially unaligned sites that have switched
+
+    Args:
+        aligned: (..., T) aligned fractions, the first sample at field onset
+
+    Returns:
+        (..., T) values in [0, 1]; NaN where every site was already aligned
+    """
+    aligned = np.asarray(aligned, dtype=np.float64)
+    start = aligned[..., :1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        switched = (aligned - start) / (1.0 - start)
+    return np.where(start < 1.0, np.clip(switched, 0.0, 1.0), np.nan)
+
+
+def half_time(t: np.ndarray, s: np.ndarray) -> np.ndarray:
+    """(B,) time of the first crossing of s = 0.5, linearly interpolated; NaN if never reached"""
+    above = np.nan_to_num(s, nan=-1.0) >= 0.5
+    found = above.any(axis=1)
+    index = np.maximum(above.argmax(axis=1), 1)
+    rows = np.arange(len(t))
+    t0, t1 = t[rows, index - 1], t[rows, index]
+    s0, s1 = s[rows, index - 1], s[rows, index]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        crossing = np.where(s1 > s0, t0 + (0.5 - s0) / (s1 - s0) * (t1 - t0), t1)
+    crossing = np.where(above[:, 0], t[:, 0], crossing)
+    return np.where(found, crossing, np.nan)
+
+
+# ============================================================================
+# Models
+# ============================================================================
+
+def kai_model(t: np.ndarray, theta: np.ndarray) -> np.ndarray:
+    """KAI s(t) = 1 - exp(-(t / t0)^n) with theta = (log t0, log n), batched over rows"""
+    t0 = np.exp(theta[:, :1])
+    n = np.exp(theta[:, 1:2])
+    return 1.0 - np.exp(-np.power(t / t0, n))
+
+
+# Equal-weight quadrature nodes of a unit Lorentzian (its CDF is arctan)
+_LORENTZ_NODES = np.tan(np.pi * ((np.arange(NLS_QUADRATURE) + 0.5) / NLS_QUADRATURE - 0.5))
+
+
+def nls_model(t: np.ndarray, theta: np.ndarray) -> np.ndarray:
+    """
+    NLS s(t) = 1 - <exp(-(t / tau)^NLS_EXPONENT)> over log10 tau ~ Lorentzian
+
+    theta = (log10 tau_center, log width in decades), batched over rows.
+    """
+    log_tau = theta[:, :1] + np.exp(theta[:, 1:2]) * _LORENTZ_NODES[None, :]  # (B, Q)
+    ratio = t[:, :, None] / 10.0 ** log_tau[:, None, :]
+    return 1.0 - np.exp(-np.power(ratio, NLS_EXPONENT)).mean(axis=2)
+
+
+def fit_batch(model: Callable[[np.ndarray, np.ndarray], np.ndarray], t: np.ndarray, s: np.ndarray,
+              weights: np.ndarray, theta: np.ndarray,
+              max_iterations: int = MAX_ITERATIONS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Levenberg-Marquardt least squares for many curves at once
+
+    Every row has its own parameters and damping; Jacobians are forward
+    differences evaluated for the whole batch per parameter.
+
+    Args:
+        model: f(t (B, T), theta (B, P)) -> (B, T)
+        t, s, weights: (B, T) samples and their weights (0 for padding)
+        theta: (B, P) starting parameters
+
+    Returns:
+        (theta, residual sum of squares per row)
+    """
+    theta = np.array(theta, dtype=np.float64)
+    s = np.nan_to_num(s)
+    n_params = theta.shape[1]
+    damping = np.full(len(theta), 1e-2)
+
+    def residuals(params):
+        with np.errstate(over='ignore', invalid='ignore'):
+            r = weights * (model(t, params) - s)
+        return np.nan_to_num(r, nan=1e3)
+
+    r = residuals(theta)
+    rss = (r ** 2).sum(axis=1)
+    for _ in range(max_iterations):
+        step = 1e-6 * np.maximum(np.abs(theta), 1.0)
+        jacobian = np.empty(r.shape + (n_params,))
+        for p in range(n_params):
+            shifted = theta.copy()
+            shifted[:, p] += step[:, p]
+            jacobian[..., p] = (residuals(shifted) - r) / step[:, p:p + 1]
+        normal = np.einsum('btp,btq->bpq', jacobian, jacobian)
+        gradient = np.einsum('btp,bt->bp', jacobian, r)
+        diagonal = np.einsum('bpp->bp', normal)
+        lhs = normal + (damping[:, None] * diagonal + 1e-12)[:, :, None] * np.eye(n_params)
+        delta = -np.linalg.solve(lhs, gradient[:, :, None])[:, :, 0]
+
+        candidate = theta + delta
+        r_new = residuals(candidate)
+        rss_new = (r_new ** 2).sum(axis=1)
+        better = rss_new < rss
+        theta = np.where(better[:, None], candidate, theta)
+        r = np.where(better[:, None], r_new, r)
+        converged = better & (rss - rss_new <= 1e-12 * np.maximum(rss, 1e-12))
+        rss = np.where(better, rss_new, rss)
+        damping = np.where(better, damping / 3, damping * 4)
+        if np.all(converged | (damping > 1e8)):
+            break
+    return theta, rss
+
+
+# ============================================================================
+# Analysis
+# ============================================================================
+
+def _kai_start(t: np.ndarray, s: np.ndarray, weights: np.ndarray, t_half: np.ndarray) -> np.ndarray:
+    """Batched linearized KAI fit: ln(-ln(1 - s)) = n ln t - n ln t0"""
+    low, high = LINEAR_RANGE
+    usable = (weights > 0) & (t > 0) & (s > low) & (s < high)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = np.where(usable, np.log(t), 0.0)
+        y = np.where(usable, np.log(-np.log1p(-np.clip(s, low, high))), 0.0)
+    count = usable.sum(axis=1)
+    mean_x = x.sum(axis=1) / np.maximum(count, 1)
+    mean_y = y.sum(axis=1) / np.maximum(count, 1)
+    sxx = (np.where(usable, x - mean_x[:, None], 0.0) ** 2).sum(axis=1)
+    sxy = (np.where(usable, (x - mean_x[:, None]) * (y - mean_y[:, None]), 0.0)).sum(axis=1)
+    slope = np.where(sxx > 0, sxy / np.where(sxx > 0, sxx, 1.0), 2.0)
+    n = np.clip(np.where(count >= 2, slope, 2.0), 0.2, 10.0)
+    log_t0 = np.where(count >= 2, mean_x - mean_y / n, np.log(t_half / np.log(2) ** (1 / n)))
+    return np.stack([log_t0, np.log(n)], axis=1)
+
+
+def switching_kinetics(t: np.ndarray, s: np.ndarray, models=KINETICS_MODELS) -> Dict[str, np.ndarray]:
+    """
+    Fit switching kinetics to a batch of switched-fraction curves
+
+    Args:
+        t: (B, T) times since field onset, NaN-padded
+        s: (B, T) switched fractions, NaN-padded
+        models: Subset of KINETICS_MODELS
+
+    Returns:
+        Dict of (B,) arrays: t_half, and per model its parameters and r2
+        (kai_t0, kai_n; nls_tau, nls_width_decades). Rows whose fraction
+        never reaches 0.5 are still fitted; rows without valid samples get NaN.
+    """
+    unknown = sorted(set(models) - set(KINETICS_MODELS))
+    if unknown:
+        raise ValueError(f"Unknown kinetics models: {unknown}; use {list(KINETICS_MODELS)}")
+    t = np.atleast_2d(np.asarray(t, dtype=np.float64))
+    s = np.atleast_2d(np.asarray(s, dtype=np.float64))
+    valid = np.isfinite(t) & np.isfinite(s)
+    weights = valid.astype(np.float64)
+    t_filled = np.where(valid, t, 0.0)
+    fit_rows = valid.sum(axis=1) >= 3
+
+    t_half = half_time(np.where(valid, t, np.inf), np.where(valid, s, np.nan))
+    # Scale for starting points where s never reaches 0.5
+    t_scale = np.where(np.isfinite(t_half), t_half, np.nanmax(np.where(valid, t, np.nan), axis=1))
+    t_scale = np.where(np.isfinite(t_scale) & (t_scale > 0), t_scale, 1.0)
+
+    s_mean = (np.where(valid, s, 0.0).sum(axis=1) / np.maximum(valid.sum(axis=1), 1))[:, None]
+    total = (weights * (np.nan_to_num(s) - s_mean) ** 2).sum(axis=1)
+
+    def r2(rss):
+        return np.where(total > 0, 1.0 - rss / np.where(total > 0, total, 1.0), np.nan)
+
+    result = {'t_half': t_half}
+    if 'kai' in models:
+        theta, rss = fit_batch(kai_model, t_filled, s, weights, _kai_start(t_filled, s, weights, t_scale))
+        result['kai_t0'] = np.where(fit_rows, np.exp(theta[:, 0]), np.nan)
+        result['kai_n'] = np.where(fit_rows, np.exp(theta[:, 1]), np.nan)
+        result['kai_r2'] = np.where(fit_rows, r2(rss), np.nan)
+    if 'nls' in models:
+        start = np.stack([np.log10(t_scale), np.full(len(t), np.log(NLS_INITIAL_WIDTH))], axis=1)
+        theta, rss = fit_batch(nls_model, t_filled, s, weights, start)
+        result['nls_tau'] = np.where(fit_rows, 10.0 ** theta[:, 0], np.nan)
+        result['nls_width_decades'] = np.where(fit_rows, np.exp(theta[:, 1]), np.nan)
+        result['nls_r2'] = np.where(fit_rows, r2(rss), np.nan)
+    return result
+
+
+def merz_fit(fields: np.ndarray, times: np.ndarray) -> Optional[Dict[str, float]]:
+    """
+    Merz law tau = tau_inf * exp(E_a / |E|) across a field sweep
+
+    Args:
+        fields: (B,) step field magnitudes
+        times: (B,) characteristic switching times
+
+    Returns:
+        Dict with activation_field, tau_inf and r2, or None with fewer
+        than two distinct usable fields
+    """
+    fields = np.abs(np.asarray(fields, dtype=np.float64))
+    times = np.asarray(times, dtype=np.float64)
+    usable = np.isfinite(fields) & np.isfinite(times) & (fields > 0) & (times > 0)
+    if np.unique(fields[usable]).size < 2:
+        return None
+    x = 1.0 / fields[usable]
+    y = np.log(times[usable])
+    slope, intercept = np.polyfit(x, y, 1)
+    residual = y - (slope * x + intercept)
+    spread = ((y - y.mean()) ** 2).sum()
+    return {
+        'activation_field': float(slope),
+        'tau_inf': float(np.exp(intercept)),
+        'r2': float(1.0 - (residual ** 2).sum() / spread) if spread > 0 else 1.0,
+        'n_runs': int(usable.sum()),
+    }
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Lattice Integrator - Adaptive time stepping for the FerroSim lattice model
+Vectorized Landau-Khalatnikov dynamics with embedded Runge-Kutta error control
+"""
+
+import numpy as np
+from typing import Callable, Dict, List, Optional, Sequence
+
+from scipy import integrate
+
+
+# Default Landau coefficients (alpha1, alpha2, alpha3) per FerroSim mode
+LANDAU_DEFAULTS = {
+    'uniaxial': (-1.85, 1.25, 0.0),
+    'squareelectric': (-1.85, 1.25, 0.0),
+    'tetragonal': (-1.6, 12.2, 40.0),
+    'rhombohedral': (-10.6, 10.2, -10.0),
+}
+
+# Error-controlled solvers that expose the step-by-step OdeSolver API
+ADAPTIVE_METHODS = {
+    'RK23': integrate.RK23,
+    'RK45': integrate.RK45,
+    'DOP853': integrate.DOP853,
+}
+
+
+def _site_array(value, n: int) -> np.ndarray:
+    """Broadcast a scalar or per-site list (length n*n) to an (n, n) array"""
+    arr = np.asarray(value, dtype=float)
+    if arr.ndim == 0:
+        return np.full((n, n), float(arr))
+    return arr.reshape(n, n)
+
+
+class LandauLattice:
+    """
+    Free energy and kinetics of the FerroSim 2D lattice
+
+    dP/dt = -gamma * dF/dP on an n x n lattice with periodic boundaries, with
+    the functionals, default Landau coefficients and local field
+    (E_loc = E_ext + E_dep + E_defect) written out in FerroSim_v3.ipynb.
+
+    This is a separate model, not a port of Ferro2DSim's source: there is
+    no temperature term (Ferro2DSim's temp scales alpha1), and agreement
+    with Ferro2DSim.runSim is only checked when FerroSim is installed
+    (test_matches_ferrosim).
+    """
+
+    def __init__(self, n: int = 10, gamma: float = 1.0, k=1.0, mode: str = 'tetragonal',
+                 dep_alpha=0.0, defects: Optional[Sequence] = None,
+                 landau_parms: Optional[Dict] = None):
+        """
+        Args:
+            n: Lattice size (NxN grid)
+            gamma: Kinetic coefficient (domain wall mobility)
+            k: Coupling constant, scalar or per-site list of length n*n
+            mode: 'tetragonal', 'rhombohedral', 'uniaxial', 'squareelectric'
+            dep_alpha: Depolarization constant, scalar or per-site list
+            defects: List of (Ex, Ey) random-field tuples, one per site
+            landau_parms: Optional overrides {'alpha1', 'alpha2', 'alpha3'}
+        """
+        if mode not in LANDAU_DEFAULTS:
+            raise ValueError(f"Unknown mode: {mode}")
+
+        self.n = n
+        self.gamma = gamma
+        self.mode = mode
+        self.k = _site_array(k, n)
+        self.dep_alpha = _site_array(dep_alpha, n)
+
+        alpha1, alpha2, alpha3 = LANDAU_DEFAULTS[mode]
+        landau_parms = landau_parms or {}
+        self.alpha1 = landau_parms.get('alpha1', alpha1)
+        self.alpha2 = landau_parms.get('alpha2', alpha2)
+        self.alpha3 = landau_parms.get('alpha3', alpha3)
+
+        if defects is None:
+            self.defects = np.zeros((2, n, n))
+        else:
+            # Defect list is row-major over sites, as built by generate_defects
+            self.defects = np.asarray(defects, dtype=float).reshape(n, n, 2).transpose(2, 0, 1).copy()
+
+    def _neighbor_difference(self, p: np.ndarray) -> np.ndarray:
+        """Sum over nearest neighbours of (p_ij - p_kl) for each component"""
+        return (4 * p
+                - np.roll(p, 1, axis=-1) - np.roll(p, -1, axis=-1)
+                - np.roll(p, 1, axis=-2) - np.roll(p, -1, axis=-2))
+
+    def local_field(self, p: np.ndarray, applied: np.ndarray) -> np.ndarray:
+        """E_loc = E_ext + E_dep + E_defect, shape (2, n, n)"""
+        mean_p = p.mean(axis=(-2, -1))
+        e_dep = -self.dep_alpha[None, :, :] * mean_p[:, None, None]
+        return np.asarray(applied, dtype=float)[:, None, None] + e_dep + self.defects
+
+    def landau_gradient(self, p: np.ndarray) -> np.ndarray:
+        """On-site part of dF/dP, shape (2, n, n)"""
+        px, py = p[0], p[1]
+        a1, a2, a3 = self.alpha1, self.alpha2, self.alpha3
+        grad = np.empty_like(p)
+
+        if self.mode == 'uniaxial':
+            grad[0] = 0.0
+            grad[1] = a1 * py + a2 * py ** 3
+        elif self.mode == 'squareelectric':
+            grad[0] = a1 * px + a2 * px ** 3
+            grad[1] = a1 * py + a2 * py ** 3
+        else:  # tetragonal / rhombohedral
+            grad[0] = 2 * a1 * px + 4 * a2 * px ** 3 + 2 * a3 * px * py ** 2
+            grad[1] = 2 * a1 * py + 4 * a2 * py ** 3 + 2 * a3 * py * px ** 2
+
+        return grad
+
+    def derivative(self, p: np.ndarray, applied: np.ndarray) -> np.ndarray:
+        """dP/dt for state p (2, n, n) under applied field (Ex, Ey)"""
+        dpdt = -self.gamma * (
+            self.landau_gradient(p)
+            + self.k * self._neighbor_difference(p)
+            - self.local_field(p, applied)
+        )
+        if self.mode == 'uniaxial':
+            dpdt[0] = 0.0
+        return dpdt
+
+    def energy(self, p: np.ndarray, applied=(0.0, 0.0)) -> float:
+        """
+        Total free energy F of state p (2, n, n)
+
+        F is the functional the dynamics descend, dF/dP = -derivative / gamma:
+        each bond is counted once with weight k/2, and the depolarization
+        energy is dep_alpha/2 * P.<P>. This is exact for uniform k and
+        dep_alpha; per-site values have no exact potential, and F is then
+        their site-weighted analogue.
+        """
+        px, py = p[0], p[1]
+        a1, a2, a3 = self.alpha1, self.alpha2, self.alpha3
+
+        if self.mode == 'uniaxial':
+            landau = a1 / 2 * py ** 2 + a2 / 4 * py ** 4
+        elif self.mode == 'squareelectric':
+            landau = (a1 / 2 * (px ** 2 + py ** 2)
+                      + a2 / 4 * (px ** 4 + py ** 4))
+        else:
+            landau = (a1 * (px ** 2 + py ** 2)
+                      + a2 * (px ** 4 + py ** 4)
+                      + a3 * px ** 2 * py ** 2)
+
+        coupling = 0.0
+        for axis in (-1, -2):
+            coupling = coupling + ((p - np.roll(p, 1, axis=axis)) ** 2).sum(axis=0)
+
+        mean_p = p.mean(axis=(-2, -1))
+        external = np.asarray(applied, dtype=float)[:, None, None] + self.defects
+        field = (external * p).sum(axis=0)
+        depolarization = self.dep_alpha / 2 * (mean_p[:, None, None] * p).sum(axis=0)
+        return float(np.sum(landau + self.k / 2 * coupling + depolarization - field))
+
+    def initial_state(self, init: str = 'pr', seed: Optional[int] = None) -> np.ndarray:
+        """
+        Build an initial polarization state (2, n, n)
+
+        Args:
+            init: 'pr'/'up' (relaxed remnant state), 'down' (reversed remnant),
+                  'random' (small random polarization for ground states)
+            seed: Random seed for 'random'
+        """
+        n = self.n
+        if init == 'random':
+            rng = np.random.default_rng(seed)
+            p = rng.uniform(-0.1, 0.1, size=(2, n, n))
+            if self.mode == 'uniaxial':
+                p[0] = 0.0
+            return p
+
+        if init not in ('pr', 'up', 'down'):
+            raise ValueError(f"Unknown init mode: {init}")
+
+        # Relax a uniform up-state in zero field: the neighbour term vanishes,
+        # so a single site with the mean depolarization gives the remnant state
+        site = LandauLattice(n=1, gamma=1.0, k=0.0, mode=self.mode,
+                             dep_alpha=float(self.dep_alpha.mean()),
+                             landau_parms={'alpha1': self.alpha1,
+                                           'alpha2': self.alpha2,
+                                           'alpha3': self.alpha3})
+        p0 = np.array([0.05, 0.5]).reshape(2, 1, 1)
+        if self.mode == 'uniaxial':
+            p0[0] = 0.0
+        sol = integrate.solve_ivp(
+            lambda t, y: site.derivative(y.reshape(2, 1, 1), np.zeros(2)).ravel(),
+            (0.0, 200.0), p0.ravel(), rtol=1e-8, atol=1e-10
+        )
+        pr = sol.y[:, -1]
+        if init == 'down':
+            pr = pr * np.array([1.0, -1.0])
+        return np.broadcast_to(pr[:, None, None], (2, n, n)).copy()
+
+
+def interpolate_field(time_vec: np.ndarray, applied_field: np.ndarray) -> Callable[[float], np.ndarray]:
+    """
+    Build a continuous applied field E(t) by linear interpolation of samples
+
+    Args:
+        time_vec: Sample times
+        applied_field: (timesteps, 2) array with Ex and Ey components
+
+    Returns:
+        Callable returning (Ex, Ey) at time t
+    """
+    time_vec = np.asarray(time_vec, dtype=float)
+    applied_field = np.asarray(applied_field, dtype=float)
+
+    def field(t: float) -> np.ndarray:
+        return np.array([
+            np.interp(t, time_vec, applied_field[:, 0]),
+            np.interp(t, time_vec, applied_field[:, 1]),
+        ])
+
+    return field
+
+
+def integrate_fixed(lattice: LandauLattice, p0: np.ndarray, time_vec: np.ndarray,
+                    applied_field: np.ndarray) -> np.ndarray:
+    """
+    Fixed-step forward Euler reference on time_vec (FerroSim's update scheme)
+
+    Returns:
+        pmat: (2, timesteps, n, n) polarization history
+    """
+    time_vec = np.asarray(time_vec, dtype=float)
+    applied_field = np.asarray(applied_field, dtype=float)
+    pmat = np.empty((2, len(time_vec)) + p0.shape[1:])
+    p = np.array(p0, dtype=float)
+    pmat[:, 0] = p
+
+    for i in range(1, len(time_vec)):
+        dt = time_vec[i] - time_vec[i - 1]
+        p = p + dt * lattice.derivative(p, applied_field[i - 1])
+        pmat[:, i] = p
+
+    return pmat
+
+
+def integrate_adaptive(lattice: LandauLattice, p0: np.ndarray, output_times: np.ndarray,
+                       field: Callable[[float], np.ndarray], rtol: float = 1e-4,
+                       atol: float = 1e-6, method: str = 'RK45', max_step: float = np.inf,
+                       on_record: Optional[Callable[[int, float, np.ndarray], None]] = None,
+                       record_history: bool = True) -> Dict:
+    """
+    Integrate the lattice with an error-controlled embedded Runge-Kutta pair
+
+    Internal steps are chosen by the solver; the state is only evaluated at
+    output_times, through the solver's dense output.
+
+    Args:
+        lattice: LandauLattice model
+        p0: Initial state (2, n, n)
+        output_times: Increasing times at which to record the state
+        field: Callable E(t) -> (Ex, Ey)
+        rtol, atol: Relative / absolute error tolerances
+        method: 'RK23', 'RK45' or 'DOP853'
+        max_step: Upper bound on the internal step size
+        on_record: Optional callback(index, t, p) for every recorded frame
+        record_history: Store the full (2, T, n, n) history
+
+    Returns:
+        Dictionary with 'pmat' (or None), 'final_p', 'n_steps', 'nfev'
+    """
+    if method not in ADAPTIVE_METHODS:
+        raise ValueError(f"Unknown adaptive method: {method}")
+
+    output_times = np.asarray(output_times, dtype=float)
+    shape = p0.shape
+
+    def rhs(t, y):
+        return lattice.derivative(y.reshape(shape), field(t)).ravel()
+
+    pmat = np.empty((2, len(output_times)) + shape[1:]) if record_history else None
+
+    def record(idx, t, p):
+        if record_history:
+            pmat[:, idx] = p
+        if on_record is not None:
+            on_record(idx, t, p)
+
+    record(0, output_times[0], np.asarray(p0, dtype=float))
+    next_idx = 1
+
+    solver = ADAPTIVE_METHODS[method](
+        rhs, output_times[0], np.asarray(p0, dtype=float).ravel(), output_times[-1],
+        max_step=max_step, rtol=rtol, atol=atol
+    )
+    n_steps = 0
+    while next_idx < len(output_times):
+        message = solver.step()
+        if solver.status == 'failed':
+            raise RuntimeError(f"Adaptive integration failed: {message}")
+        n_steps += 1
+
+        # Record every requested time covered by this step
+        stop = np.searchsorted(output_times, solver.t, side='right')
+        if stop > next_idx:
+            dense = solver.dense_output()
+            for idx in range(next_idx, stop):
+                record(idx, output_times[idx], dense(output_times[idx]).reshape(shape))
+            next_idx = stop
+
+    final_p = pmat[:, -1].copy() if record_history else solver.y.reshape(shape).copy()
+    return {
+        'pmat': pmat,
+        'final_p': final_p,
+        'n_steps': n_steps,
+        'nfev': solver.nfev,
+    }
+
+
+class AdaptiveFerroSim:
+    """
+    LandauLattice simulation with adaptive time steps, behind Ferro2DSim's interface
+
+    Exposes the runSim()/getPmat()/results interface used by SimulationManager
+    but integrates LandauLattice, not Ferro2DSim's own functional, so results
+    can differ from a fixed-step FerroSim run; temp is not supported.
+    time_vec is the set of requested output times, not the integration grid.
+    """
+
+    supports_progress = True  # runSim accepts a progress(step, total) callback
+
+    def __init__(self, n: int = 10, gamma: float = 1.0, k=1.0, mode: str = 'tetragonal',
+                 dep_alpha=0.0, time_vec=None, appliedE=None, defects=None,
+                 init: str = 'pr', field_fn: Optional[Callable[[float], np.ndarray]] = None,
+                 rtol: float = 1e-4, atol: float = 1e-6, method: str = 'RK45',
+                 max_step: float = np.inf, seed: Optional[int] = None,
+                 observables: Optional[List[str]] = None, record_history: bool = True):
+        """
+        Args:
+            observables: Names of streaming observables updated at every output time
+            record_history: Keep the full (2, T, n, n) history; when False only
+                            the final state is kept and getPmat() has one frame
+        """
+        self.n = n
+        self.mode = mode
+        self.time_vec = np.linspace(0, 1, 100) if time_vec is None else np.asarray(time_vec, dtype=float)
+        if appliedE is None:
+            appliedE = np.zeros((len(self.time_vec), 2))
+        self.appliedE = np.asarray(appliedE, dtype=float)
+        self.field_fn = field_fn or interpolate_field(self.time_vec, self.appliedE)
+        self.rtol = rtol
+        self.atol = atol
+        self.method = method
+        self.max_step = max_step
+        self.observables = list(observables or [])
+        self.record_history = record_history
+
+        self.lattice = LandauLattice(n=n, gamma=gamma, k=k, mode=mode,
+                                     dep_alpha=dep_alpha, defects=defects)
+        self.initial_p = self.lattice.initial_state(init, seed=seed)
+        self.pmat = None
+        self.results = None
+
+    def runSim(self, calc_pr: bool = False, verbose: bool = False,
+               progress: Optional[Callable[[int, int], None]] = None) -> Dict:
+        """
+        Run the adaptive integration and return FerroSim-style results
+
+        Args:
+            progress: Optional callback(step, total) after every recorded output time
+        """
+        n_out = len(self.time_vec)
+        polarization = np.empty((2, len(self.time_vec)))
+        pipeline = None
+        if self.observables:
+            from observables import build_pipeline
+            pipeline = build_pipeline(self.observables, self.lattice, self.field_fn,
+                                      capacity=len(self.time_vec))
+
+        def on_record(idx, t, p):
+            polarization[:, idx] = p.mean(axis=(-2, -1))
+            if pipeline is not None:
+                pipeline.update(t, p)
+            if progress is not None:
+                progress(idx + 1, n_out)
+
+        out = integrate_adaptive(
+            self.lattice, self.initial_p, self.time_vec, self.field_fn,
+            rtol=self.rtol, atol=self.atol, method=self.method, max_step=self.max_step,
+            on_record=on_record, record_history=self.record_history
+        )
+        self.pmat = out['pmat'] if self.record_history else out['final_p'][:, None]
+        self.results = {
+            'Polarization': polarization,  # Lattice-averaged (2, timesteps)
+            'n_steps': out['n_steps'],
+            'nfev': out['nfev'],
+        }
+        if pipeline is not None:
+            self.results['observables'] = pipeline.series()
+        if verbose:
+            print(f"Adaptive {self.method}: {out['n_steps']} steps, "
+                  f"{out['nfev']} RHS evaluations for {len(self.time_vec)} output times")
+        return self.results
+
+    def getPmat(self) -> np.ndarray:
+        """Polarization history, shape (2, timesteps, n, n)"""
+        if self.pmat is None:
+            raise ValueError("Simulation has not been run")
+        return self.pmat
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Param Index - Nearest-neighbour lookup of completed simulations in parameter space
+Completed runs are grouped by configuration (as for the surrogate) and
+indexed by their normalized continuous parameters in a KD-tree, rebuilt
+lazily after changes, so "has something close to this been run already?"
+costs O(log N) even with tens of thousands of stored simulations
+"""
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from surrogate import configuration, describe
+
+
+# Distance below which a stored run counts as the same parameter set
+IDENTICAL_DISTANCE = 1e-9
+
+
+class ParameterIndex:
+    """
+    KD-trees over the continuous parameters of completed simulations
+
+    Each feature is divided by its range among the stored runs of the same
+    configuration, so distances are comparable across k, dep_alpha, field
+    amplitudes, etc. A feature all stored runs share gets unit scale.
+    """
+
+    def __init__(self):
+        self.entries: Dict[Tuple, Dict[str, np.ndarray]] = {}
+        self.feature_names: Dict[Tuple, List[str]] = {}
+        self.keys: Dict[str, Tuple] = {}
+        self._trees: Dict[Tuple, Tuple[cKDTree, List[str], np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, sim_id: str, params: Dict) -> bool:
+        """Index one completed run; returns False if its parameters cannot be indexed"""
+        split = configuration(params)
+        if split is None:
+            return False
+        key, features = split
+        with self._lock:
+            self.feature_names.setdefault(key, list(features))
+            self.entries.setdefault(key, {})[sim_id] = np.array(
+                [features[name] for name in self.feature_names[key]]
+            )
+            self.keys[sim_id] = key
+            self._trees.pop(key, None)
+        return True
+
+    def remove(self, sim_id: str):
+        """Drop a run from the index (no-op if it is not indexed)"""
+        with self._lock:
+            key = self.keys.pop(sim_id, None)
+            if key is not None:
+                del self.entries[key][sim_id]
+                self._trees.pop(key, None)
+
+    def _tree(self, key: Tuple) -> Tuple[cKDTree, List[str], np.ndarray]:
+        if key not in self._trees:
+            ids = list(self.entries[key])
+            points = np.stack([self.entries[key][sim_id] for sim_id in ids])
+            span = points.max(axis=0) - points.min(axis=0)
+            scale = np.where(span > 0, span, 1.0)
+            self._trees[key] = (cKDTree(points / scale), ids, scale)
+        return self._trees[key]
+
+    def query(self, params: Dict, k: int = 5,
+              max_distance: Optional[float] = None) -> Tuple[str, List[Dict]]:
+        """
+        Nearest completed runs with the same configuration as params
+
+        Args:
+            params: initialize_simulation parameters
+            k: Neighbours returned at most
+            max_distance: Optional cut-off in normalized units
+
+        Returns:
+            (configuration label, list of dicts with sim_id, distance,
+            identical (same continuous parameters) and the neighbour's
+            features), nearest first
+        """
+        split = configuration(params)
+        if split is None:
+            raise ValueError("Explicit applied_field, time_vec or defects cannot be indexed")
+        key, features = split
+        with self._lock:
+            if not self.entries.get(key):
+                return describe(key), []
+            tree, ids, scale = self._tree(key)
+            names = self.feature_names[key]
+            point = np.array([features[name] for name in names]) / scale
+            count = min(k, len(ids))
+            distances, indices = tree.query(point, k=count,
+                                            distance_upper_bound=np.inf if max_distance is None else max_distance)
+            distances, indices = np.atleast_1d(distances), np.atleast_1d(indices)
+            neighbours = []
+            for distance, index in zip(distances, indices):
+                if not np.isfinite(distance):
+                    continue  # Beyond max_distance
+                values = self.entries[key][ids[index]]
+                neighbours.append({
+                    'sim_id': ids[index],
+                    'distance': float(distance),
+                    'identical': bool(distance <= IDENTICAL_DISTANCE),
+                    'features': dict(zip(names, values.tolist())),
+                })
+            return describe(key), neighbours
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Phase Diagram - Final-state classification and adaptive two-parameter maps
+Batches of (2, n, n) polarization frames are reduced to descriptors (net
+order, stripe order from the structure factor, vortex count from plaquette
+winding numbers) in a few array operations and labelled with a state class;
+an adaptive grid spends further runs only on cells whose corners disagree
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from topology import plaquette_winding
+
+
+PHASE_CLASSES = ('single_domain', 'stripe', 'vortex', 'multidomain')
+
+# Label of grid points whose simulation failed; never triggers refinement
+FAILED = 'failed'
+
+# |<P>| / <|P|> above which the lattice is one domain
+SINGLE_DOMAIN_ORDER = 0.9
+
+# Share of the non-uniform structure-factor power in the strongest +-q pair for stripes
+STRIPE_PEAK_FRACTION = 0.5
+
+
+# ============================================================================
+# Descriptors
+# ============================================================================
+
+def state_descriptors(frames: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Vectorized descriptors of a batch of final states
+
+    Args:
+        frames: (B, 2, n, n) or a single (2, n, n) frame
+
+    Returns:
+        Dict of (B,) arrays: net_order (|<P>| / <|P|>), stripe_order (share of
+        the non-uniform structure-factor power in the strongest +-q pair),
+        vortices (plaquettes with non-zero winding), up_fraction
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    if frames.ndim == 3:
+        frames = frames[None]
+    mean_p = frames.mean(axis=(-2, -1))
+    mean_abs = np.hypot(frames[:, 0], frames[:, 1]).mean(axis=(-2, -1))
+    net_order = np.hypot(mean_p[:, 0], mean_p[:, 1]) / np.maximum(mean_abs, 1e-300)
+
+    # Structure factor of the fluctuations; a stripe concentrates it in one +-q pair
+    power = (np.abs(np.fft.fft2(frames - mean_p[..., None, None])) ** 2).sum(axis=1)
+    flat = power.reshape(len(frames), -1)
+    total = flat.sum(axis=1)
+    peak = flat.max(axis=1)
+    n_rows, n_cols = frames.shape[-2:]
+    peak_index = flat.argmax(axis=1)
+    rows, cols = np.divmod(peak_index, n_cols)
+    mirror = power[np.arange(len(frames)), (-rows) % n_rows, (-cols) % n_cols]
+    self_mirror = (rows == (-rows) % n_rows) & (cols == (-cols) % n_cols)
+    pair = np.where(self_mirror, peak, peak + mirror)
+    stripe_order = np.where(total > 0, pair / np.maximum(total, 1e-300), 0.0)
+
+    vortices = np.count_nonzero(plaquette_winding(frames), axis=(-2, -1))
+    return {
+        'net_order': net_order,
+        'stripe_order': stripe_order,
+        'vortices': vortices,
+        'up_fraction': np.count_nonzero(frames[:, 1] > 0, axis=(-2, -1)) / (n_rows * n_cols),
+    }
+
+
+def classify_states(frames: np.ndarray) -> Tuple[List[str], Dict[str, np.ndarray]]:
+    """
+    Label final states with PHASE_CLASSES
+
+    single_domain if net_order >= SINGLE_DOMAIN_ORDER, else vortex if any
+    plaquette winds, else stripe if stripe_order >= STRIPE_PEAK_FRACTION,
+    else multidomain.
+
+    Returns:
+        (labels, descriptors as from state_descriptors)
+    """
+    descriptors = state_descriptors(frames)
+    labels = np.where(
+        descriptors['net_order'] >= SINGLE_DOMAIN_ORDER, 'single_domain',
+        np.where(descriptors['vortices'] > 0, 'vortex',
+                 np.where(descriptors['stripe_order'] >= STRIPE_PEAK_FRACTION, 'stripe', 'multidomain'))
+    )
+    return labels.tolist(), descriptors
+
+
+# ============================================================================
+# Adaptive Grid
+# ============================================================================
+
+class AdaptiveGrid:
+    """
+    Two-parameter grid refined where neighbouring labels differ
+
+    Points live on a fine integer lattice with 2**levels fine steps per
+    coarse step. The coarse grid is evaluated first; afterwards every cell
+    whose evaluated corners disagree is split into four, adding its edge
+    midpoints and centre, until the finest level is reached.
+    """
+
+    def __init__(self, x_range: Sequence[float], y_range: Sequence[float],
+                 resolution: Tuple[int, int] = (5, 5), levels: int = 2):
+        if min(resolution) < 2:
+            raise ValueError("The coarse grid needs at least 2 points per axis")
+        self.x_range = (float(x_range[0]), float(x_range[1]))
+        self.y_range = (float(y_range[0]), float(y_range[1]))
+        self.step = 2 ** levels
+        self.shape = ((resolution[0] - 1) * self.step + 1, (resolution[1] - 1) * self.step + 1)
+        self.labels: Dict[Tuple[int, int], str] = {}
+        self.round = 0
+        self._cells = [(i, j, self.step)
+                       for i in range(0, self.shape[0] - 1, self.step)
+                       for j in range(0, self.shape[1] - 1, self.step)]
+        self._pending = sorted({(i + di, j + dj) for i, j, s in self._cells for di in (0, s) for dj in (0, s)})
+
+    def value(self, index: Tuple[int, int]) -> Tuple[float, float]:
+        """(x, y) of a fine-lattice index"""
+        fx = index[0] / (self.shape[0] - 1)
+        fy = index[1] / (self.shape[1] - 1)
+        return (self.x_range[0] + fx * (self.x_range[1] - self.x_range[0]),
+                self.y_range[0] + fy * (self.y_range[1] - self.y_range[0]))
+
+    @property
+    def done(self) -> bool:
+        return not self._pending
+
+    def ask(self, budget: Optional[int] = None) -> List[Tuple[int, int]]:
+        """Indices to evaluate next (at most budget)"""
+        return self._pending[:budget] if budget is not None else list(self._pending)
+
+    def tell(self, labels: Dict[Tuple[int, int], str]):
+        """Labels for evaluated indices; queues the next refinement round"""
+        self.labels.update(labels)
+        self.round += 1
+        remaining = [index for index in self._pending if index not in self.labels]
+        if remaining:
+            self._pending = remaining
+            return
+
+        split = []
+        for i, j, s in self._cells:
+            corners = [self.labels.get((i + di, j + dj)) for di in (0, s) for dj in (0, s)]
+            if s > 1 and None not in corners and FAILED not in corners and len(set(corners)) > 1:
+                h = s // 2
+                split.extend((i + di, j + dj, h) for di in (0, h) for dj in (0, h))
+        self._cells = split
+        self._pending = sorted({(i + di, j + dj) for i, j, s in split for di in (0, s) for dj in (0, s)}
+                               - set(self.labels))
+
+    def label_grid(self) -> List[List[str]]:
+        """Labels on the full fine lattice, each cell taking its nearest evaluated point"""
+        indices = list(self.labels)
+        tree = cKDTree(np.array(indices))
+        fine = np.stack(np.meshgrid(np.arange(self.shape[0]), np.arange(self.shape[1]), indexing='ij'), axis=-1)
+        _, nearest = tree.query(fine.reshape(-1, 2))
+        labels = np.array([self.labels[index] for index in indices], dtype=object)
+        return labels[nearest].reshape(self.shape).tolist()
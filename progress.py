@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Progress Reporting - Throttled progress updates from running simulations
+Feeds MCP progress notifications for direct runs and worker-process jobs
+"""
+
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+
+class ProgressReporter:
+    """
+    Turns (step, total) updates into throttled progress events
+
+    Each event is a dict with step, total, fraction, elapsed, steps_per_s and
+    eta_s. At most one event is emitted per min_interval seconds, plus the
+    final step.
+    """
+
+    def __init__(self, emit: Callable[[Dict], None], min_interval: float = 0.5):
+        self.emit = emit
+        self.min_interval = min_interval
+        self.start = time.perf_counter()
+        self._last_emit = float('-inf')
+        self.step = 0
+        self.total = None
+
+    def __call__(self, step: int, total: int):
+        self.step = step
+        self.total = total
+        now = time.perf_counter()
+        if step < total and now - self._last_emit < self.min_interval:
+            return
+        self._last_emit = now
+        self.emit(self.snapshot(now))
+
+    def snapshot(self, now: Optional[float] = None) -> Dict:
+        """Current progress, rate and ETA"""
+        if now is None:
+            now = time.perf_counter()
+        elapsed = now - self.start
+        rate = self.step / elapsed if elapsed > 0 else 0.0
+        remaining = (self.total or 0) - self.step
+        return {
+            'step': self.step,
+            'total': self.total,
+            'fraction': self.step / self.total if self.total else 0.0,
+            'elapsed': elapsed,
+            'steps_per_s': rate,
+            'eta_s': remaining / rate if rate > 0 else None,
+        }
+
+
+def format_progress(event: Dict) -> str:
+    """One-line progress message"""
+    eta = f"{event['eta_s']:.1f}s" if event['eta_s'] is not None else "?"
+    return (f"step {event['step']}/{event['total']} ({event['fraction']:.0%}), "
+            f"{event['steps_per_s']:.0f} steps/s, ETA {eta}")
+
+
+class TqdmProgressStream:
+    """
+    File-like stand-in for stdout/stderr during a FerroSim run
+
+    FerroSim only reports progress through its tqdm bar, so the bar's
+    'step/total' counter is parsed and fed to the reporter. Text is passed
+    through to the wrapped stream when echo is set.
+    """
+
+    _COUNTER = re.compile(r'(\d+)/(\d+)')
+
+    def __init__(self, stream, progress: Callable[[int, int], None], echo: bool = False):
+        self.stream = stream
+        self.progress = progress
+        self.echo = echo
+
+    def write(self, text: str) -> int:
+        matches = self._COUNTER.findall(text)
+        if matches:
+            step, total = matches[-1]
+            if int(total) > 0:
+                self.progress(int(step), int(total))
+        if self.echo:
+            self.stream.write(text)
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def isatty(self) -> bool:
+        return False
+
+
+class _ThreadRoutedStream:
+    """
+    Process-wide stdout/stderr replacement that routes writes per thread
+
+    Threads with a registered progress stream write to it; every other
+    thread (server logging included) goes straight to the original stream.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def _target(self):
+        return _routes.get(threading.get_ident(), self.stream)
+
+    def write(self, text: str) -> int:
+        return self._target().write(text)
+
+    def flush(self):
+        self._target().flush()
+
+    def isatty(self) -> bool:
+        return self._target().isatty()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+_route_lock = threading.Lock()
+_routes: Dict[int, TqdmProgressStream] = {}
+_original_streams = None
+
+
+@contextmanager
+def _route_progress(progress: Callable[[int, int], None], echo: bool):
+    """
+    Send this thread's stdout/stderr to a TqdmProgressStream
+
+    The routers are installed by the first active run and the original
+    streams restored by the last, under one lock, so concurrent runs never
+    restore each other's streams.
+    """
+    global _original_streams
+    ident = threading.get_ident()
+    with _route_lock:
+        if not _routes:
+            _original_streams = (sys.stdout, sys.stderr)
+            sys.stdout = _ThreadRoutedStream(_original_streams[0])
+            sys.stderr = _ThreadRoutedStream(_original_streams[1])
+        _routes[ident] = TqdmProgressStream(_original_streams[1], progress, echo=echo)
+    try:
+        yield
+    finally:
+        with _route_lock:
+            del _routes[ident]
+            if not _routes:
+                sys.stdout, sys.stderr = _original_streams
+                _original_streams = None
+
+
+def run_sim_with_progress(sim, progress: Optional[Callable[[int, int], None]] = None,
+                          verbose: bool = False) -> Dict:
+    """
+    Run sim.runSim, reporting (step, total) to progress when given
+
+    Simulations with a native progress hook (AdaptiveFerroSim) call it per
+    recorded step; FerroSim runs are tracked through their tqdm output.
+    Every run's output is captured per thread, echoed to stderr when
+    verbose, so concurrent runs and server logs stay separate and nothing
+    a simulation prints reaches stdout, which carries JSON-RPC.
+    """
+    native = getattr(sim, 'supports_progress', False)
+    parse = progress if progress is not None and not native else _ignore_progress
+    with _route_progress(parse, echo=verbose):
+        if native:
+            return sim.runSim(calc_pr=False, verbose=verbose, progress=progress)
+        return sim.runSim(calc_pr=False, verbose=verbose or progress is not None)
+
+
+def _ignore_progress(step: int, total: int):
+    pass
+
+
+def log_throughput(sim_id: str, frames: int, n: int, elapsed: float, execution: str) -> Dict:
+    """Print run throughput to stderr for capacity planning and return it"""
+    rate = frames / elapsed if elapsed > 0 else 0.0
+    stats = {
+        'frames': frames,
+        'lattice': n,
+        'elapsed_s': elapsed,
+        'steps_per_s': rate,
+        'site_steps_per_s': rate * n * n,
+        'execution': execution,
+    }
+    print(f"[throughput] sim={sim_id} execution={execution} frames={frames} n={n} "
+          f"elapsed={elapsed:.3f}s steps/s={rate:.1f} site-steps/s={rate * n * n:.3e}",
+          file=sys.stderr)
+    return stats
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Registration - FFT-based alignment of simulation images to AFM scans
+Translation from phase correlation, rotation and scale from phase correlation
+of log-polar resampled magnitude spectra (Reddy & Chatterji 1996), all at
+O(N log N) instead of a brute-force search
+"""
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from scipy.ndimage import affine_transform, map_coordinates
+
+
+# Scales outside this range are treated as spurious log-polar peaks
+MIN_SCALE = 0.5
+MAX_SCALE = 2.0
+
+# Cross-power magnitude floor, relative to its maximum
+WHITENING_FLOOR = 1e-3
+
+
+# ============================================================================
+# Phase Correlation
+# ============================================================================
+
+def _subpixel_offset(left: float, center: float, right: float) -> float:
+    """Vertex of the parabola through three samples around a peak"""
+    denom = left - 2 * center + right
+    if denom == 0:
+        return 0.0
+    return float(np.clip(0.5 * (left - right) / denom, -0.5, 0.5))
+
+
+def phase_correlation_spectra(fa: np.ndarray, fb: np.ndarray) -> Tuple[float, float, float]:
+    """
+    Shift between two images given their 2D FFTs
+
+    Returns:
+        (dy, dx, peak): a(y, x) ~ b(y - dy, x - dx); peak is the normalized
+        correlation peak height (1 for a pure circular shift)
+    """
+    cross = fa * np.conj(fb)
+    magnitude = np.abs(cross)
+    # Relative floor: near-empty frequencies would otherwise add whitened noise
+    cross /= magnitude + WHITENING_FLOOR * magnitude.max() + 1e-300
+    surface = np.fft.ifft2(cross).real / np.abs(cross).mean()
+    iy, ix = np.unravel_index(np.argmax(surface), surface.shape)
+    h, w = surface.shape
+
+    dy = iy + _subpixel_offset(surface[iy - 1, ix], surface[iy, ix], surface[(iy + 1) % h, ix])
+    dx = ix + _subpixel_offset(surface[iy, ix - 1], surface[iy, ix], surface[iy, (ix + 1) % w])
+    # Wrap to [-N/2, N/2)
+    dy = (dy + h / 2) % h - h / 2
+    dx = (dx + w / 2) % w - w / 2
+    return float(dy), float(dx), float(surface[iy, ix])
+
+
+def phase_correlation(a: np.ndarray, b: np.ndarray) -> Tuple[float, float, float]:
+    """Translation of image a relative to image b (see phase_correlation_spectra)"""
+    return phase_correlation_spectra(np.fft.fft2(a), np.fft.fft2(b))
+
+
+# ============================================================================
+# Log-Polar Spectra
+# ============================================================================
+
+def _window(shape: Tuple[int, int]) -> np.ndarray:
+    """2D Hann window, suppressing the cross-shaped spectrum of image edges"""
+    return np.outer(np.hanning(shape[0]), np.hanning(shape[1]))
+
+
+def _highpass(shape: Tuple[int, int]) -> np.ndarray:
+    """Reddy & Chatterji high-pass emphasis for centred spectra"""
+    fy = np.cos(np.pi * np.linspace(-0.5, 0.5, shape[0]))
+    fx = np.cos(np.pi * np.linspace(-0.5, 0.5, shape[1]))
+    x = np.outer(fy, fx)
+    return (1.0 - x) * (2.0 - x)
+
+
+def centered_fft(image: np.ndarray) -> np.ndarray:
+    """FFT of the mean-removed image, for circular translation estimates"""
+    return np.fft.fft2(image - image.mean())
+
+
+def windowed_fft(image: np.ndarray) -> np.ndarray:
+    """FFT of the mean-removed, Hann-windowed image, for log-polar spectra"""
+    return np.fft.fft2((image - image.mean()) * _window(image.shape))
+
+
+def log_polar_spectrum(image: np.ndarray, n_angles: Optional[int] = None,
+                       n_radii: Optional[int] = None) -> Tuple[np.ndarray, float]:
+    """
+    Log-polar resampling of the high-passed magnitude spectrum
+
+    Angles cover [0, pi), since magnitude spectra of real images are point
+    symmetric. Rotating the image shifts this map along the angle axis and
+    scaling it shifts the map along the log-radius axis.
+
+    Returns:
+        (map of shape (n_angles, n_radii), log-radius step)
+    """
+    h, w = image.shape
+    n_angles = n_angles or max(h, w)
+    n_radii = n_radii or max(h, w)
+    spectrum = np.abs(np.fft.fftshift(windowed_fft(image)))
+    spectrum *= _highpass(spectrum.shape)
+
+    radius = min(h, w) / 2.0
+    log_step = np.log(radius) / (n_radii - 1)
+    radii = np.exp(np.arange(n_radii) * log_step)
+    angles = np.arange(n_angles) * np.pi / n_angles
+    rows = h // 2 + np.sin(angles)[:, None] * radii[None, :]
+    cols = w // 2 + np.cos(angles)[:, None] * radii[None, :]
+    return map_coordinates(spectrum, [rows, cols], order=1, mode='constant'), log_step
+
+
+# ============================================================================
+# Warping and Registration
+# ============================================================================
+
+def warp(image: np.ndarray, rotation_deg: float = 0.0, scale: float = 1.0,
+         shift: Tuple[float, float] = (0.0, 0.0), order: int = 1,
+         mode: str = 'grid-wrap') -> np.ndarray:
+    """
+    Rotate (counter-clockwise) and scale about the centre, then translate
+
+    'grid-wrap' borders suit periodic simulation lattices.
+    """
+    theta = np.deg2rad(rotation_deg)
+    # Row/column coordinates: counter-clockwise in the displayed image
+    forward = scale * np.array([[np.cos(theta), np.sin(theta)],
+                                [-np.sin(theta), np.cos(theta)]])
+    inverse = np.linalg.inv(forward)
+    center = (np.array(image.shape) - 1) / 2.0
+    offset = center - inverse @ (center + np.asarray(shift, dtype=float))
+    return affine_transform(image, inverse, offset=offset, order=order, mode=mode)
+
+
+class RegistrationTarget:
+    """
+    Fixed image with the spectra every registration against it reuses
+
+    Holds the plain and windowed FFTs of the image and the FFT of its
+    log-polar magnitude spectrum, so aligning many moving images costs one log-polar transform
+    and three FFT correlations each.
+    """
+
+    def __init__(self, image: np.ndarray):
+        self.image = np.asarray(image, dtype=np.float64)
+        self.shape = self.image.shape
+        self.fft = centered_fft(self.image)
+        self.windowed_fft = windowed_fft(self.image)
+        log_polar, self.log_step = log_polar_spectrum(self.image)
+        self.log_polar_fft = np.fft.fft2(log_polar)
+
+
+def register(moving: np.ndarray, target: RegistrationTarget, rotation: bool = True,
+             scale: bool = True) -> Dict:
+    """
+    Find the similarity transform that best maps moving onto the target image
+
+    Rotation and scale come from the log-polar spectra; both candidate
+    rotations (theta and theta + 180 deg, which the spectra cannot tell
+    apart) are tried and the one with the stronger translation peak kept.
+
+    Args:
+        moving: Image of the target's shape
+        target: Prepared fixed image
+        rotation: Search rotation
+        scale: Search scale
+
+    Returns:
+        Dict with rotation_deg, scale, shift_px [dy, dx], peak and the aligned image
+    """
+    moving = np.asarray(moving, dtype=np.float64)
+    if moving.shape != target.shape:
+        raise ValueError(f"Moving image shape {moving.shape} differs from target {target.shape}")
+
+    angle, factor = 0.0, 1.0
+    if rotation or scale:
+        log_polar, _ = log_polar_spectrum(moving)
+        d_angle, d_radius, _ = phase_correlation_spectra(target.log_polar_fft, np.fft.fft2(log_polar))
+        if rotation:
+            angle = d_angle * 180.0 / log_polar.shape[0]
+        if scale:
+            factor = float(np.exp(-d_radius * target.log_step))
+            if not MIN_SCALE <= factor <= MAX_SCALE:
+                factor = 1.0
+
+    best = None
+    candidates = (angle, angle + 180.0) if rotation else (angle,)
+    for candidate in candidates:
+        if candidate or factor != 1.0:
+            # Rotated or scaled content is no longer periodic: window out the seams
+            rotated = warp(moving, candidate, factor)
+            dy, dx, peak = phase_correlation_spectra(target.windowed_fft, windowed_fft(rotated))
+        else:
+            dy, dx, peak = phase_correlation_spectra(target.fft, centered_fft(moving))
+        if best is None or peak > best['peak']:
+            best = {'rotation_deg': (candidate + 180.0) % 360.0 - 180.0, 'scale': factor,
+                    'shift_px': [dy, dx], 'peak': peak}
+
+    best['aligned'] = warp(moving, best['rotation_deg'], best['scale'], tuple(best['shift_px']))
+    return best
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Render Cache - Reuse visualizations of unchanged simulations
+Renders are keyed by (sim_id, viz_type, timestep, content hash) and stored
+under deterministic filenames in display_demo/, which is pruned by size and age
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+# Names written by the cache: <sim_id>_<viz_type>_t<timestep>_<hash>.png, or
+# without the extension for renders that are directories of frames
+CACHE_FILENAME = re.compile(r'^[0-9a-f]{8}_[a-z0-9_]+_t(-?\d+|all)_[0-9a-f]{12}(\.png)?$')
+
+
+def content_hash(pmat: np.ndarray) -> str:
+    """Digest of a polarization history, so re-runs invalidate old renders"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str((pmat.shape, pmat.dtype.str)).encode())
+    digest.update(np.ascontiguousarray(pmat).data)
+    return digest.hexdigest()
+
+
+def _tree_size(directory: str) -> int:
+    """Total size of the files directly inside a directory"""
+    total = 0
+    for entry in os.scandir(directory):
+        if entry.is_file():
+            total += entry.stat().st_size
+    return total
+
+
+class RenderCache:
+    """
+    Maps render keys to PNG files in an output directory
+
+    Filenames are derived from the key, so cached renders are also found
+    again after a server restart. Only files matching CACHE_FILENAME are
+    ever pruned; anything else in the directory is left alone.
+    """
+
+    def __init__(self, output_dir: str, max_bytes: int = 200 * 1024 ** 2,
+                 max_age_s: float = 7 * 24 * 3600):
+        """
+        Args:
+            output_dir: Directory for rendered PNGs
+            max_bytes: Total size budget for cached renders
+            max_age_s: Renders older than this are deleted
+        """
+        self.output_dir = output_dir
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.entries: Dict[Tuple, str] = {}
+
+    def path_for(self, key: Tuple, extension: str = '.png') -> str:
+        """
+        Deterministic output path for a (sim_id, viz_type, timestep, hash) key
+
+        Args:
+            extension: '.png' for image files, '' for directories of frames
+        """
+        sim_id, viz_type, timestep, digest = key
+        step = 'all' if timestep is None else str(timestep)
+        return os.path.join(self.output_dir, f"{sim_id}_{viz_type}_t{step}_{digest[:12]}{extension}")
+
+    def get(self, key: Tuple, extension: str = '.png') -> Optional[str]:
+        """Path of a cached render, or None on a miss"""
+        path = self.entries.get(key) or self.path_for(key, extension)
+        if os.path.exists(path):
+            self.entries[key] = path
+            return path
+        self.entries.pop(key, None)
+        return None
+
+    def put(self, key: Tuple, path: str):
+        """Record a new render and enforce the retention policy"""
+        self.entries[key] = path
+        self.prune(keep=path)
+
+    def prune(self, keep: Optional[str] = None) -> int:
+        """
+        Delete cached renders that are too old, then the oldest ones until the
+        directory fits the size budget
+
+        Frame directories count with the total size of their files and are
+        removed as a whole.
+
+        Args:
+            keep: Path that must survive (the render just produced)
+
+        Returns:
+            Number of files deleted
+        """
+        if not os.path.isdir(self.output_dir):
+            return 0
+
+        now = time.time()
+        files = []
+        for name in os.listdir(self.output_dir):
+            if not CACHE_FILENAME.match(name):
+                continue
+            path = os.path.join(self.output_dir, name)
+            try:
+                stat = os.stat(path)
+                size = _tree_size(path) if os.path.isdir(path) else stat.st_size
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, size, path))
+
+        files.sort()  # Oldest first
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for mtime, size, path in files:
+            if path == keep:
+                continue
+            if now - mtime <= self.max_age_s and total <= self.max_bytes:
+                continue
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+
+        if removed:
+            self.entries = {k: p for k, p in self.entries.items() if os.path.exists(p)}
+        return removed
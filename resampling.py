@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Resampling - Cached sparse resampling operators between image grids
+Per-axis linear operators map a simulation lattice onto an AFM pixel grid
+(rectangular shapes, optional physical extents, area-averaged anti-aliasing
+when shrinking); they are built once per grid pair, so repeat comparisons
+cost two sparse matrix products
+"""
+
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+
+RESAMPLE_MODES = ('nearest', 'wrap')
+
+# Operators kept per (src, dst, extent, mode, order) combination
+OPERATOR_CACHE_SIZE = 128
+
+
+# ============================================================================
+# 1D Operators
+# ============================================================================
+
+def _fold(index: np.ndarray, n: int, mode: str) -> np.ndarray:
+    """Map out-of-range source indices back onto the grid"""
+    if mode == 'wrap':
+        return index % n
+    return np.clip(index, 0, n - 1)
+
+
+@lru_cache(maxsize=OPERATOR_CACHE_SIZE)
+def axis_operator(n_src: int, n_dst: int, scale: float = None, mode: str = 'nearest',
+                  order: int = 1, antialias: bool = True) -> sparse.csr_matrix:
+    """
+    Sparse (n_dst, n_src) matrix resampling one axis
+
+    Both grids start at the same physical origin. Destination pixel i
+    covers source coordinates [i * scale, (i + 1) * scale), with source
+    pixel k covering [k, k + 1).
+
+    Args:
+        n_src: Source samples
+        n_dst: Destination samples
+        scale: Destination pixel size in source pixels (default n_src / n_dst,
+            i.e. both grids span the same extent)
+        mode: 'nearest' (clamp at the edges) or 'wrap' (periodic source)
+        order: 1 for linear interpolation, 0 for nearest sample (masks)
+        antialias: Average over the covered source pixels when scale > 1
+
+    Returns:
+        CSR matrix whose rows sum to 1
+    """
+    if mode not in RESAMPLE_MODES:
+        raise ValueError(f"Unknown resample mode: {mode}")
+    if scale is None:
+        scale = n_src / n_dst
+    rows = np.arange(n_dst)
+
+    if antialias and order == 1 and scale > 1.0:
+        # Area average: overlap of [a, b) with each source pixel
+        start = rows * scale
+        end = start + scale
+        first = np.floor(start).astype(np.int64)
+        span = int(np.ceil(scale)) + 1
+        cells = first[:, None] + np.arange(span)[None, :]
+        overlap = np.minimum(end[:, None], cells + 1) - np.maximum(start[:, None], cells)
+        weights = np.clip(overlap, 0.0, None) / scale
+        row_idx = np.repeat(rows, span)
+        col_idx = cells.ravel()
+        values = weights.ravel()
+    else:
+        center = (rows + 0.5) * scale - 0.5
+        if order == 0:
+            row_idx = rows
+            col_idx = np.floor(center + 0.5).astype(np.int64)
+            values = np.ones(n_dst)
+        else:
+            left = np.floor(center).astype(np.int64)
+            frac = center - left
+            row_idx = np.repeat(rows, 2)
+            col_idx = np.stack([left, left + 1], axis=1).ravel()
+            values = np.stack([1.0 - frac, frac], axis=1).ravel()
+
+    keep = values > 0
+    col_idx = _fold(col_idx[keep], n_src, mode)
+    matrix = sparse.csr_matrix((values[keep], (row_idx[keep], col_idx)), shape=(n_dst, n_src))
+    matrix.sum_duplicates()
+    return matrix
+
+
+# ============================================================================
+# 2D Resampling
+# ============================================================================
+
+class Resampler:
+    """
+    Separable resampling between two 2D grids: out = A_rows @ image @ A_cols.T
+
+    Attributes:
+        rows, cols: Sparse per-axis operators
+        scale: Destination pixel size in source pixels per axis
+    """
+
+    def __init__(self, src_shape: Tuple[int, int], dst_shape: Tuple[int, int],
+                 src_extent: Optional[Tuple[float, float]] = None,
+                 dst_extent: Optional[Tuple[float, float]] = None,
+                 mode: str = 'nearest', order: int = 1, antialias: bool = True):
+        self.src_shape = tuple(src_shape)
+        self.dst_shape = tuple(dst_shape)
+        if (src_extent is None) != (dst_extent is None):
+            raise ValueError("Give both physical extents or neither")
+        if src_extent is None:
+            self.scale = (src_shape[0] / dst_shape[0], src_shape[1] / dst_shape[1])
+        else:
+            self.scale = tuple(
+                (dst_extent[axis] / dst_shape[axis]) / (src_extent[axis] / src_shape[axis])
+                for axis in (0, 1)
+            )
+        self.rows = axis_operator(src_shape[0], dst_shape[0], self.scale[0], mode, order, antialias)
+        self.cols = axis_operator(src_shape[1], dst_shape[1], self.scale[1], mode, order, antialias)
+
+    def __call__(self, image: np.ndarray) -> np.ndarray:
+        """Resample one (h, w) image"""
+        if image.shape != self.src_shape:
+            raise ValueError(f"Expected an image of shape {self.src_shape}, got {image.shape}")
+        out = self.rows @ np.asarray(image, dtype=np.float64)
+        return np.asarray((self.cols @ out.T).T)
+
+    def gram(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Dense A_rows.T @ A_rows and A_cols.T @ A_cols, for sums of squares of outputs"""
+        return (self.rows.T @ self.rows).toarray(), (self.cols.T @ self.cols).toarray()
+
+    def adjoint(self, image: np.ndarray) -> np.ndarray:
+        """Pull a destination-grid image back onto the source grid: A_rows.T @ image @ A_cols"""
+        out = self.rows.T @ np.asarray(image, dtype=np.float64)
+        return np.asarray((self.cols.T @ out.T).T)
+
+
+def _key(extent) -> Optional[Tuple[float, float]]:
+    return None if extent is None else (float(extent[0]), float(extent[1]))
+
+
+@lru_cache(maxsize=OPERATOR_CACHE_SIZE)
+def _cached_resampler(src_shape, dst_shape, src_extent, dst_extent, mode, order, antialias) -> Resampler:
+    return Resampler(src_shape, dst_shape, src_extent, dst_extent, mode, order, antialias)
+
+
+def get_resampler(src_shape: Tuple[int, int], dst_shape: Tuple[int, int],
+                  src_extent: Optional[Tuple[float, float]] = None,
+                  dst_extent: Optional[Tuple[float, float]] = None,
+                  mode: str = 'nearest', order: int = 1, antialias: bool = True) -> Resampler:
+    """Shared Resampler for a grid pair, built on first use"""
+    return _cached_resampler(tuple(src_shape), tuple(dst_shape), _key(src_extent), _key(dst_extent),
+                             mode, order, antialias)
+
+
+def resample(image: np.ndarray, shape: Tuple[int, int],
+             src_extent: Optional[Tuple[float, float]] = None,
+             dst_extent: Optional[Tuple[float, float]] = None,
+             mode: str = 'nearest', order: int = 1, antialias: bool = True) -> np.ndarray:
+    """
+    Resample an image onto a grid of the given shape
+
+    Without extents the image is stretched over the whole destination
+    (per-axis factors, so rectangular grids are fine). With physical
+    extents (height, width) the source keeps its physical size; use
+    mode='wrap' to tile a periodic lattice over a larger destination.
+    """
+    return get_resampler(image.shape, shape, src_extent, dst_extent, mode, order, antialias)(image)
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Similarity Metrics - Native image similarity measures for theory-experiment matching
+SSIM and MS-SSIM on separable box/Gaussian filters, normalized mutual
+information, histogram distances and domain-statistics distances, without
+depending on skimage
+"""
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from scipy.ndimage import correlate1d, uniform_filter1d
+
+
+# SSIM constants (Wang et al. 2004)
+SSIM_K1 = 0.01
+SSIM_K2 = 0.03
+
+# MS-SSIM scale weights (Wang, Simoncelli & Bovik 2003)
+MS_SSIM_WEIGHTS = (0.0448, 0.2856, 0.3001, 0.2363, 0.1333)
+
+# Grey levels for histogram-based metrics on [0, 1] images
+DEFAULT_BINS = 64
+
+
+# ============================================================================
+# Separable Filters
+# ============================================================================
+
+def box_filter(image: np.ndarray, size: int) -> np.ndarray:
+    """Mean over a size x size window, as two 1D passes (reflected borders)"""
+    out = uniform_filter1d(image, size, axis=0, mode='reflect')
+    return uniform_filter1d(out, size, axis=1, mode='reflect')
+
+
+def gaussian_kernel(sigma: float, truncate: float = 3.5) -> np.ndarray:
+    """Normalized 1D Gaussian taps out to truncate * sigma"""
+    radius = int(truncate * sigma + 0.5)
+    x = np.arange(-radius, radius + 1)
+    kernel = np.exp(-0.5 * (x / sigma) ** 2)
+    return kernel / kernel.sum()
+
+
+def gaussian_filter(image: np.ndarray, sigma: float = 1.5, truncate: float = 3.5) -> np.ndarray:
+    """Gaussian blur as two 1D passes (reflected borders)"""
+    kernel = gaussian_kernel(sigma, truncate)
+    out = correlate1d(image, kernel, axis=0, mode='reflect')
+    return correlate1d(out, kernel, axis=1, mode='reflect')
+
+
+def _window_filter(gaussian: bool, win_size: int, sigma: float):
+    """Filter function, crop margin and effective sample count for a window"""
+    if gaussian:
+        truncate = 3.5
+        radius = int(truncate * sigma + 0.5)
+        return (lambda img: gaussian_filter(img, sigma, truncate)), radius, (2 * radius + 1) ** 2
+    return (lambda img: box_filter(img, win_size)), (win_size - 1) // 2, win_size ** 2
+
+
+# ============================================================================
+# Structural Similarity
+# ============================================================================
+
+def ssim_components(x: np.ndarray, y: np.ndarray, data_range: float = 1.0, win_size: int = 7,
+                    gaussian: bool = False, sigma: float = 1.5, sample_covariance: bool = True,
+                    y_moments: Optional[Tuple[np.ndarray, np.ndarray]] = None
+                    ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Luminance and contrast-structure maps of SSIM, border cropped
+
+    SSIM = mean(luminance * contrast_structure). Defaults match
+    skimage.metrics.structural_similarity (7x7 box window, sample covariance).
+
+    Args:
+        y_moments: Optional (local mean, local variance) of y over the same
+            window, when the caller keeps them for a fixed reference image
+
+    Returns:
+        (luminance, contrast_structure) maps
+    """
+    filt, pad, n_samples = _window_filter(gaussian, win_size, sigma)
+    if min(x.shape) <= 2 * pad:
+        raise ValueError(f"Images of shape {x.shape} are smaller than the SSIM window")
+    cov_norm = n_samples / (n_samples - 1) if sample_covariance else 1.0
+
+    ux = filt(x)
+    if y_moments is None:
+        uy = filt(y)
+        vy = cov_norm * (filt(y * y) - uy * uy)
+    else:
+        uy, vy = y_moments
+    vx = cov_norm * (filt(x * x) - ux * ux)
+    vxy = cov_norm * (filt(x * y) - ux * uy)
+
+    c1 = (SSIM_K1 * data_range) ** 2
+    c2 = (SSIM_K2 * data_range) ** 2
+    luminance = (2 * ux * uy + c1) / (ux * ux + uy * uy + c1)
+    contrast_structure = (2 * vxy + c2) / (vx + vy + c2)
+
+    crop = (slice(pad, x.shape[0] - pad), slice(pad, x.shape[1] - pad))
+    return luminance[crop], contrast_structure[crop]
+
+
+def ssim(x: np.ndarray, y: np.ndarray, data_range: float = 1.0, win_size: int = 7,
+         gaussian: bool = False, sigma: float = 1.5, sample_covariance: bool = True) -> float:
+    """Mean structural similarity of two images (see ssim_components)"""
+    luminance, contrast_structure = ssim_components(x, y, data_range, win_size, gaussian,
+                                                    sigma, sample_covariance)
+    return float(np.mean(luminance * contrast_structure))
+
+
+def _downsample2(image: np.ndarray) -> np.ndarray:
+    """2x2 mean pooling (odd trailing row/column dropped)"""
+    h, w = image.shape[0] // 2 * 2, image.shape[1] // 2 * 2
+    return image[:h, :w].reshape(h // 2, 2, w // 2, 2).mean(axis=(1, 3))
+
+
+def ms_ssim(x: np.ndarray, y: np.ndarray, data_range: float = 1.0, weights=MS_SSIM_WEIGHTS,
+            win_size: int = 7, gaussian: bool = True, sigma: float = 1.5) -> float:
+    """
+    Multi-scale SSIM
+
+    Contrast-structure is taken at every scale and luminance at the coarsest.
+    Scales that would be smaller than the window are dropped and the
+    remaining weights renormalized, so small lattices still get a score.
+    Negative per-scale terms are clipped to zero.
+    """
+    _, pad, _ = _window_filter(gaussian, win_size, sigma)
+    levels = len(weights)
+    while levels > 1 and min(x.shape) // 2 ** (levels - 1) <= 2 * pad:
+        levels -= 1
+    w = np.asarray(weights[:levels], dtype=float)
+    w /= w.sum()
+
+    score = 1.0
+    for level in range(levels):
+        luminance, contrast_structure = ssim_components(x, y, data_range, win_size, gaussian,
+                                                        sigma, sample_covariance=False)
+        if level == levels - 1:
+            term = np.mean(luminance * contrast_structure)
+        else:
+            term = np.mean(contrast_structure)
+            x, y = _downsample2(x), _downsample2(y)
+        score *= max(float(term), 0.0) ** w[level]
+    return float(score)
+
+
+# ============================================================================
+# Information and Histogram Metrics
+# ============================================================================
+
+def quantize(image: np.ndarray, bins: int = DEFAULT_BINS) -> np.ndarray:
+    """Bin index of each pixel of a [0, 1] image"""
+    return np.clip((image * bins).astype(np.int64), 0, bins - 1)
+
+
+def histogram(image: np.ndarray, bins: int = DEFAULT_BINS, quantized: Optional[np.ndarray] = None) -> np.ndarray:
+    """Normalized grey-level histogram of a [0, 1] image"""
+    if quantized is None:
+        quantized = quantize(image, bins)
+    counts = np.bincount(quantized.ravel(), minlength=bins).astype(float)
+    return counts / counts.sum()
+
+
+def _entropy(p: np.ndarray) -> float:
+    p = p[p > 0]
+    return float(-np.sum(p * np.log(p)))
+
+
+def normalized_mutual_information(x: np.ndarray, y: np.ndarray, bins: int = DEFAULT_BINS,
+                                  qx: Optional[np.ndarray] = None,
+                                  qy: Optional[np.ndarray] = None) -> float:
+    """
+    (H(X) + H(Y)) / H(X, Y) of two [0, 1] images, from 1 (independent) to 2 (identical)
+
+    Same definition as skimage.metrics.normalized_mutual_information.
+    Pre-quantized images (qx, qy) may be passed to skip binning.
+    """
+    if qx is None:
+        qx = quantize(x, bins)
+    if qy is None:
+        qy = quantize(y, bins)
+    joint = np.bincount((qx * bins + qy).ravel(), minlength=bins * bins).astype(float)
+    joint = joint.reshape(bins, bins) / joint.sum()
+    h_joint = _entropy(joint)
+    if h_joint == 0:
+        return 2.0
+    return (_entropy(joint.sum(axis=1)) + _entropy(joint.sum(axis=0))) / h_joint
+
+
+def histogram_distances(hx: np.ndarray, hy: np.ndarray) -> Dict[str, float]:
+    """
+    Distances between two normalized histograms over the same [0, 1] bins
+
+    Returns:
+        hist_intersection (1 = identical), hist_chi2 (symmetric, 0 = identical),
+        hist_bhattacharyya (0 = identical) and hist_emd (earth mover's
+        distance in grey levels of [0, 1])
+    """
+    total = hx + hy
+    nonzero = total > 0
+    bc = float(np.sum(np.sqrt(hx * hy)))
+    return {
+        'hist_intersection': float(np.minimum(hx, hy).sum()),
+        'hist_chi2': float(0.5 * np.sum((hx - hy)[nonzero] ** 2 / total[nonzero])),
+        'hist_bhattacharyya': max(float(-np.log(max(bc, 1e-300))), 0.0),
+        'hist_emd': float(np.abs(np.cumsum(hx - hy)).sum() / len(hx)),
+    }
+
+
+# ============================================================================
+# Domain Statistics
+# ============================================================================
+
+def domain_statistics(up: np.ndarray) -> Dict[str, float]:
+    """
+    Up-domain fraction and wall density of a binary domain map
+
+    Wall density is the fraction of pixels with an opposite-domain 4-neighbour
+    (non-periodic), comparable between maps of the same size.
+    """
+    wall = np.zeros(up.shape, dtype=bool)
+    vertical = up[1:] != up[:-1]
+    horizontal = up[:, 1:] != up[:, :-1]
+    wall[1:] |= vertical
+    wall[:-1] |= vertical
+    wall[:, 1:] |= horizontal
+    wall[:, :-1] |= horizontal
+    return {
+        'up_fraction': float(np.count_nonzero(up) / up.size),
+        'wall_density': float(np.count_nonzero(wall) / up.size),
+    }
+
+
+def domain_distances(stats_x: Dict[str, float], stats_y: Dict[str, float]) -> Dict[str, float]:
+    """Absolute differences of up fraction and wall density"""
+    return {
+        'up_fraction_diff': abs(stats_x['up_fraction'] - stats_y['up_fraction']),
+        'wall_density_diff': abs(stats_x['wall_density'] - stats_y['wall_density']),
+    }
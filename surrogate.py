@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Surrogate - Gaussian-process emulator of completed simulations
+Every completed run adds (parameters -> summary observables, low-rank final
+state) to a per-configuration training set of the most recent MAX_TRAINING
+runs; a Matern-5/2 GP fitted lazily on that set predicts new parameter sets
+with uncertainty in microseconds once fitted, so candidates can be screened
+before paying for a real run
+"""
+
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from similarity_metrics import domain_statistics
+
+
+# Continuous parameters the surrogate interpolates over (create_simulation defaults)
+FEATURE_DEFAULTS = {
+    'k': 1.0,
+    'dep_alpha': 0.0,
+    'gamma': 1.0,
+    't_end': 1.0,
+}
+
+# Predicted summary observables of the final frame
+SUMMARY_OUTPUTS = ('mean_Px', 'mean_Py', 'mean_abs_P', 'up_fraction', 'wall_density')
+
+# Principal components of the final state kept as embedding
+MAX_COMPONENTS = 8
+
+# Completed runs a configuration needs before it can be predicted
+MIN_TRAINING = 3
+
+# Most recent runs kept per configuration, bounding the SVD and O(N^3) refits
+MAX_TRAINING = 200
+
+# Hyperparameter grid, chosen by marginal likelihood on every refit
+LENGTH_SCALES = (0.1, 0.2, 0.35, 0.6, 1.0, 2.0)
+NOISE_LEVELS = (1e-6, 1e-3, 1e-2, 1e-1)  # Relative nugget; random initial states are noisy
+
+
+def summary_observables(frame: np.ndarray) -> Dict[str, float]:
+    """SUMMARY_OUTPUTS of one (2, n, n) polarization frame"""
+    stats = domain_statistics(frame[1] > 0)
+    return {
+        'mean_Px': float(frame[0].mean()),
+        'mean_Py': float(frame[1].mean()),
+        'mean_abs_P': float(np.hypot(frame[0], frame[1]).mean()),
+        'up_fraction': stats['up_fraction'],
+        'wall_density': stats['wall_density'],
+    }
+
+
+def configuration(params: Dict) -> Optional[Tuple[Tuple, Dict[str, float]]]:
+    """
+    Split initialize_simulation parameters into a configuration key and features
+
+    Runs share a surrogate when they agree on everything except the
+    continuous features: k, dep_alpha, gamma, t_end and the numeric field
+    parameters. The key holds every other parameter that changes the
+    result: lattice, mode, initial state, field and defect configuration,
+    integrator, time discretization (n_steps, t_start), adaptive solver
+    settings (rtol, atol, method) and, for random initial states, the seed.
+    Explicit per-step fields or defect lists cannot be interpolated.
+
+    Returns:
+        (key, {feature: value}) or None if the run cannot be emulated
+    """
+    if any(name in params for name in ('applied_field', 'time_vec', 'defects')):
+        return None
+    field_config = params.get('field_config') or {'type': 'sine (default)'}
+    field_params = field_config.get('params', {})
+    numeric = {name: float(value) for name, value in field_params.items()
+               if isinstance(value, (int, float)) and not isinstance(value, bool)}
+    fixed = {name: value for name, value in field_params.items() if name not in numeric}
+
+    init = params.get('init', 'pr')
+    integrator = params.get('integrator', 'fixed')
+    solver = None
+    if integrator == 'adaptive':
+        solver = (float(params.get('rtol', 1e-4)), float(params.get('atol', 1e-6)),
+                  params.get('method', 'RK45'))
+
+    key = (
+        int(params.get('n', 10)),
+        params.get('mode', 'tetragonal'),
+        init,
+        field_config.get('type', 'sine'),
+        json.dumps(fixed, sort_keys=True, default=str),
+        tuple(sorted(numeric)),
+        json.dumps(params.get('defect_config') or {}, sort_keys=True, default=str),
+        integrator,
+        int(params.get('n_steps', 1000)),
+        float(params.get('t_start', 0.0)),
+        solver,
+        params.get('seed') if init == 'random' else None,
+    )
+    features = {name: float(params.get(name, default)) for name, default in FEATURE_DEFAULTS.items()}
+    features.update({f'field.{name}': value for name, value in sorted(numeric.items())})
+    return key, features
+
+
+def describe(key: Tuple) -> str:
+    """Readable configuration label"""
+    n, mode, init, field_type = key[:4]
+    integrator, n_steps = key[7:9]
+    return f"n={n} {mode} init={init} field={field_type} {integrator} n_steps={n_steps}"
+
+
+# ============================================================================
+# Gaussian Process
+# ============================================================================
+
+def matern52(a: np.ndarray, b: np.ndarray, length: float) -> np.ndarray:
+    """Matern-5/2 kernel matrix between the rows of a and b"""
+    d = np.sqrt(np.maximum(((a[:, None, :] - b[None, :, :]) ** 2).sum(axis=2), 0.0)) / length
+    return (1 + np.sqrt(5) * d + 5 * d ** 2 / 3) * np.exp(-np.sqrt(5) * d)
+
+
+class GaussianProcess:
+    """
+    Multi-output GP regression with a shared isotropic Matern-5/2 kernel
+
+    Inputs are scaled to the unit box of the training data and every
+    output is standardized; length scale and nugget are picked from a grid
+    by the summed log marginal likelihood of all outputs.
+    """
+
+    def fit(self, X: np.ndarray, Y: np.ndarray):
+        X = np.asarray(X, dtype=float)
+        Y = np.asarray(Y, dtype=float)
+        self.low = X.min(axis=0)
+        self.span = np.where(X.max(axis=0) > self.low, X.max(axis=0) - self.low, 1.0)
+        self.X = (X - self.low) / self.span
+        self.y_mean = Y.mean(axis=0)
+        # Constant outputs get a negligible scale (and so a negligible std)
+        self.y_std = np.maximum(Y.std(axis=0), 1e-12)
+        Z = (Y - self.y_mean) / self.y_std
+
+        best = None
+        for length in LENGTH_SCALES:
+            base = matern52(self.X, self.X, length)
+            for noise in NOISE_LEVELS:
+                try:
+                    L = np.linalg.cholesky(base + noise * np.eye(len(Z)))
+                except np.linalg.LinAlgError:
+                    continue
+                alpha = np.linalg.solve(L.T, np.linalg.solve(L, Z))
+                nll = 0.5 * np.sum(Z * alpha) + Z.shape[1] * np.log(np.diag(L)).sum()
+                if best is None or nll < best[0]:
+                    best = (nll, length, noise, L, alpha)
+        _, self.length, self.noise, self.L, self.alpha = best
+        return self
+
+    def scale(self, X: np.ndarray) -> np.ndarray:
+        """Inputs in training-box coordinates"""
+        return (np.atleast_2d(np.asarray(X, dtype=float)) - self.low) / self.span
+
+    def predict(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Posterior mean and standard deviation, each (len(X), n_outputs)"""
+        Xs = self.scale(X)
+        K = matern52(Xs, self.X, self.length)
+        mean = K @ self.alpha
+        v = np.linalg.solve(self.L, K.T)
+        var = np.maximum(1.0 + self.noise - np.sum(v * v, axis=0), 0.0)
+        return self.y_mean + mean * self.y_std, np.sqrt(var)[:, None] * self.y_std
+
+
+# ============================================================================
+# Surrogate Store
+# ============================================================================
+
+class SurrogateModel:
+    """Training set and fitted emulator of one simulation configuration"""
+
+    def __init__(self, key: Tuple, feature_names: List[str]):
+        self.key = key
+        self.feature_names = feature_names
+        self.features: List[np.ndarray] = []
+        self.frames: List[np.ndarray] = []
+        self.sim_ids: List[str] = []
+        self.gp: Optional[GaussianProcess] = None
+
+    def add(self, features: Dict[str, float], frame: np.ndarray, sim_id: Optional[str] = None):
+        if sim_id is not None and sim_id in self.sim_ids:
+            return
+        self.features.append(np.array([features[name] for name in self.feature_names]))
+        self.frames.append(np.array(frame, dtype=np.float64))
+        self.sim_ids.append(sim_id)
+        if len(self.sim_ids) > MAX_TRAINING:
+            for values in (self.features, self.frames, self.sim_ids):
+                del values[0]
+        self.gp = None
+
+    def remove(self, sim_id: str):
+        index = self.sim_ids.index(sim_id)
+        for values in (self.features, self.frames, self.sim_ids):
+            del values[index]
+        self.gp = None
+
+    def fit(self):
+        """Refit the embedding and GP on everything added so far"""
+        flat = np.stack([frame.ravel() for frame in self.frames])
+        self.frame_mean = flat.mean(axis=0)
+        _, singular, vt = np.linalg.svd(flat - self.frame_mean, full_matrices=False)
+        rank = int(np.count_nonzero(singular > 1e-8 * max(singular[0], 1e-300)))
+        self.components = vt[:min(MAX_COMPONENTS, rank)]
+        coefficients = (flat - self.frame_mean) @ self.components.T
+        summaries = np.array([[summary_observables(frame)[name] for name in SUMMARY_OUTPUTS]
+                              for frame in self.frames])
+        self.gp = GaussianProcess().fit(np.stack(self.features), np.hstack([summaries, coefficients]))
+
+    def predict(self, features: Dict[str, float], return_state: bool = False) -> Dict:
+        if self.gp is None:
+            self.fit()
+        x = np.array([features[name] for name in self.feature_names])
+        mean, std = self.gp.predict(x)
+        mean, std = mean[0], std[0]
+        n_summary = len(SUMMARY_OUTPUTS)
+        coefficients, coefficient_std = mean[n_summary:], std[n_summary:]
+        unit = self.gp.scale(x)[0]
+
+        prediction = {
+            'configuration': describe(self.key),
+            'n_training': len(self.frames),
+            'observables': {name: {'mean': float(mean[i]), 'std': float(std[i])}
+                            for i, name in enumerate(SUMMARY_OUTPUTS)},
+            'embedding': {'coefficients': coefficients.tolist(), 'std': coefficient_std.tolist()},
+            # Pixel-wise std of the reconstructed state, averaged over the lattice
+            'state_std': float(np.sqrt((coefficient_std ** 2) @ self.components ** 2).mean()),
+            'extrapolating': bool(np.any((unit < 0) | (unit > 1))),
+        }
+        if return_state:
+            shape = self.frames[0].shape
+            prediction['final_state'] = (self.frame_mean + coefficients @ self.components).reshape(shape)
+        return prediction
+
+
+class SurrogateStore:
+    """
+    Surrogates for every configuration seen, fed by completed simulations
+
+    add() is cheap (the models refit lazily on the next prediction) and
+    thread-safe, so it can be called from any completion path.
+    """
+
+    def __init__(self):
+        self.models: Dict[Tuple, SurrogateModel] = {}
+        self._lock = threading.Lock()
+
+    def add(self, params: Dict, final_frame: np.ndarray, sim_id: Optional[str] = None) -> bool:
+        """Record one completed run; returns False if its parameters cannot be emulated"""
+        split = configuration(params)
+        if split is None:
+            return False
+        key, features = split
+        with self._lock:
+            if key not in self.models:
+                self.models[key] = SurrogateModel(key, list(features))
+            self.models[key].add(features, final_frame, sim_id)
+        return True
+
+    def remove(self, sim_id: str):
+        """Drop a run from the training sets (no-op if it was never added)"""
+        with self._lock:
+            for key, model in list(self.models.items()):
+                if sim_id in model.sim_ids:
+                    model.remove(sim_id)
+                    if not model.frames:
+                        del self.models[key]
+
+    def predict(self, params: Dict, return_state: bool = False) -> Dict:
+        """
+        Predicted final-state observables and embedding for one parameter set
+
+        Raises:
+            ValueError: If the parameters cannot be emulated or their
+                configuration has fewer than MIN_TRAINING completed runs
+        """
+        split = configuration(params)
+        if split is None:
+            raise ValueError("Explicit applied_field, time_vec or defects cannot be emulated")
+        key, features = split
+        with self._lock:
+            model = self.models.get(key)
+            count = len(model.frames) if model else 0
+            if count < MIN_TRAINING:
+                raise ValueError(f"Surrogate for {describe(key)} needs {MIN_TRAINING} completed "
+                                 f"simulations, has {count}")
+            return model.predict(features, return_state)
+
+    def summary(self) -> List[Dict]:
+        """Training-set size and features per configuration"""
+        with self._lock:
+            return [{'configuration': describe(key), 'n_training': len(model.frames),
+                     'features': model.feature_names} for key, model in self.models.items()]
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Test streaming animation export to APNG and frame folders"""
+
+import os
+import struct
+import sys
+import tempfile
+import zlib
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from animation import animate_history, frame_indices, write_apng
+
+
+def read_chunks(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert data[:8] == b'\x89PNG\r\n\x1a\n'
+    pos, chunks = 8, []
+    while pos < len(data):
+        length, tag = struct.unpack('>I4s', data[pos:pos + 8])
+        chunks.append((tag, data[pos + 8:pos + 8 + length]))
+        pos += 12 + length
+    return chunks
+
+
+def history(n_frames=23, n=8):
+    rng = np.random.default_rng(0)
+    return rng.normal(size=(2, n_frames, n, n))
+
+
+def test_frame_indices_end_on_final_state():
+    """Strided frames always include the last timestep"""
+    assert list(frame_indices(10, 1)) == list(range(10))
+    assert list(frame_indices(10, 4)) == [1, 5, 9]
+    assert list(frame_indices(3, 10)) == [2]
+    print("✓ Strided frames end on the final state")
+
+
+def test_apng_structure():
+    """APNG has one fcTL per frame, sequential numbering and decodable frame data"""
+    pmat = history()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'anim.png')
+        info = animate_history(pmat, path, stride=5, fps=20, scale=4)
+        chunks = read_chunks(path)
+
+    assert info['frames'] == 5 and info['size_px'] == 32
+    tags = [tag for tag, _ in chunks]
+    assert tags[:3] == [b'IHDR', b'acTL', b'fcTL'] and tags[-1] == b'IEND'
+    assert struct.unpack('>II', chunks[1][1]) == (5, 0)
+    assert tags.count(b'fcTL') == 5 and tags.count(b'IDAT') == 1 and tags.count(b'fdAT') == 4
+
+    sequence = []
+    for tag, body in chunks:
+        if tag in (b'fcTL', b'fdAT'):
+            sequence.append(struct.unpack('>I', body[:4])[0])
+        if tag == b'fdAT':
+            assert len(zlib.decompress(body[4:])) == 32 * (1 + 32 * 3)
+    assert sequence == list(range(len(sequence)))
+    print("✓ APNG chunks are complete and sequential")
+
+
+def test_frames_directory_matches_pool():
+    """Frame folders hold one PNG per frame; pooled encoding gives identical files"""
+    from concurrent.futures import ThreadPoolExecutor
+    pmat = history()
+    with tempfile.TemporaryDirectory() as tmp:
+        serial = os.path.join(tmp, 'serial')
+        pooled = os.path.join(tmp, 'pooled')
+        animate_history(pmat, serial, viz_type='quiver', stride=3, output_format='frames', scale=4)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            animate_history(pmat, pooled, viz_type='quiver', stride=3, output_format='frames',
+                            scale=4, executor=pool, workers=2)
+        names = sorted(os.listdir(serial))
+        assert names == sorted(os.listdir(pooled))
+        assert len(names) == len(frame_indices(23, 3))
+        for name in names:
+            with open(os.path.join(serial, name), 'rb') as a, open(os.path.join(pooled, name), 'rb') as b:
+                assert a.read() == b.read()
+    print("✓ Frame folder written in order, serial and pooled output identical")
+
+
+def test_failed_apng_leaves_no_file():
+    """An encoder error midway removes the partial animation"""
+    def frames():
+        yield zlib.compress(b'\0' * 4)
+        raise RuntimeError("encoder failed")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'anim.png.part')
+        try:
+            write_apng(path, frames(), 2, 1, 1)
+            assert False, "Expected the encoder error"
+        except RuntimeError:
+            pass
+        assert not os.path.exists(path)
+    print("✓ Failed APNG export leaves no partial file")
+
+
+if __name__ == "__main__":
+    test_frame_indices_end_on_final_state()
+    test_apng_structure()
+    test_frames_directory_matches_pool()
+    test_failed_apng_leaves_no_file()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""Test the fused theory-experiment comparison against direct computations"""
+
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from comparison import (
+    LRUCache, PreparedScan, ScanCache, compare_frame_to_scan, compare_to_scan, correlation_curve, normalize, rank_matches,
+    pyramid_factor, residual_map, residual_peaks, resize_to, screen_frames, simulation_component,
+    site_residuals, timestep_search
+)
+from registration import warp
+from similarity_metrics import ssim
+
+
+def smooth_image(shape, seed):
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=shape).cumsum(axis=0).cumsum(axis=1)
+
+
+def test_metrics_match_direct_computation():
+    """Fused moments agree with corrcoef, MSE and the metrics module's SSIM"""
+    afm = smooth_image((96, 80), 0)
+    sim = simulation_component(np.random.default_rng(1).normal(size=(2, 12, 12)), 'magnitude')
+    metrics = compare_to_scan(sim, PreparedScan(afm))
+
+    x = normalize(resize_to(sim, afm.shape))
+    y = normalize(afm)
+    assert x.shape == afm.shape
+    assert np.isclose(metrics['correlation'], np.corrcoef(x.ravel(), y.ravel())[0, 1])
+    assert np.isclose(metrics['mse'], np.mean((x - y) ** 2))
+    assert np.isclose(metrics['rmse'], np.sqrt(metrics['mse']))
+    assert np.isclose(metrics['ssim'], ssim(x, y))  # Same SSIM as the metrics module
+    print("✓ Correlation, MSE and SSIM match direct computation")
+
+
+def test_ssim_matches_skimage():
+    """Fused SSIM agrees with skimage's structural_similarity"""
+    structural_similarity = pytest.importorskip('skimage.metrics').structural_similarity
+    afm = smooth_image((96, 80), 0)
+    sim = simulation_component(np.random.default_rng(1).normal(size=(2, 12, 12)), 'magnitude')
+    metrics = compare_to_scan(sim, PreparedScan(afm))
+    x = normalize(resize_to(sim, afm.shape))
+    assert np.isclose(metrics['ssim'], structural_similarity(x, normalize(afm), data_range=1.0))
+    print("✓ SSIM matches skimage")
+
+
+def test_identical_images():
+    """An image compared with itself is a perfect match"""
+    afm = smooth_image((40, 40), 2)
+    metrics = compare_to_scan(afm, PreparedScan(afm))
+    assert np.isclose(metrics['correlation'], 1.0)
+    assert np.isclose(metrics['ssim'], 1.0)
+    assert metrics['mse'] < 1e-12 and metrics['match_quality'] == 'excellent'
+    print("✓ Self-comparison scores a perfect match")
+
+
+def test_scan_cache_reuse():
+    """Scans are prepared once and rebuilt when the array is replaced"""
+    cache = ScanCache()
+    afm = smooth_image((32, 32), 3)
+    first = cache.get('scan1', afm)
+    assert cache.get('scan1', afm) is first
+    first.scores.put('params', {'metrics': {}})
+    replaced = cache.get('scan1', afm.copy())
+    assert replaced is not first
+    assert 'params' not in replaced.scores, "Scores must not outlive their scan"
+    print("✓ Prepared scans are cached per scan")
+
+
+def test_lru_cache_bound():
+    """The least recently used entry is evicted past max_entries"""
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # 'b' is now the oldest
+    cache.put('c', 3)
+    assert len(cache) == 2 and 'b' not in cache and cache.get('a') == 1
+    print("✓ LRU cache stays bounded")
+
+
+def test_rank_matches():
+    """Leaderboards put the best match first in the metric's direction"""
+    afm = smooth_image((48, 48), 4)
+    scan = PreparedScan(afm, phase=np.where(afm > afm.mean(), 0.0, 180.0))
+    scan.prepare(['nmi', 'domain'])
+    rng = np.random.default_rng(5)
+    frames = {
+        'exact': np.stack([np.zeros_like(afm), afm - afm.mean()]),
+        'noisy': np.stack([np.zeros_like(afm), afm - afm.mean() + 40 * rng.normal(size=afm.shape)]),
+        'random': rng.normal(size=(2, 16, 16)),
+    }
+    results = [{'sim_id': sim_id, **compare_frame_to_scan(frame, scan, 'y', ['correlation', 'rmse', 'domain'])}
+               for sim_id, frame in frames.items()]
+
+    by_correlation = rank_matches(results, 'correlation')
+    assert [r['sim_id'] for r in by_correlation] == ['exact', 'noisy', 'random']
+    assert [r['rank'] for r in by_correlation] == [1, 2, 3]
+    assert rank_matches(results, 'rmse')[0]['sim_id'] == 'exact'
+    assert rank_matches(results, 'up_fraction_diff')[0]['up_fraction_diff'] < 1e-9
+    try:
+        rank_matches(results, 'ssim')
+        assert False, "ranking by an uncomputed metric should fail"
+    except ValueError:
+        pass
+    print("✓ Simulations are ranked best match first")
+
+
+def test_timestep_search():
+    """Batched correlations equal per-frame comparisons and find the matching frame"""
+    rng = np.random.default_rng(6)
+    pmat = rng.normal(size=(2, 30, 20, 24))
+    pmat[:, 5] = 1.0  # Flat frame
+    scan = PreparedScan(resize_to(np.hypot(pmat[0, 17], pmat[1, 17]), (90, 70)))
+    curve = correlation_curve(simulation_component(pmat, 'magnitude'), scan)
+    direct = [compare_frame_to_scan(pmat[:, t], scan)['correlation'] for t in range(30)]
+    assert np.allclose(curve, direct) and curve[5] == 0.0
+
+    search = timestep_search(pmat, scan, range(2, 30, 3), chunk=4)
+    assert search['timesteps'] == list(range(2, 30, 3))
+    assert search['best_timestep'] == 17 and np.isclose(search['best_correlation'], 1.0)
+    print("✓ Timestep search matches per-frame correlation and finds the best frame")
+
+
+def test_phase_metrics():
+    """Simulated Py sign is scored against the phase channel and blended with amplitude"""
+    afm = smooth_image((60, 60), 7)
+    up = afm > np.median(afm)
+    phase = np.where(up, 10.0, 170.0)
+    scan = PreparedScan(np.abs(afm), phase=phase)
+    frame = np.stack([np.zeros((60, 60)), np.where(up, 1.0, -1.0)])
+
+    same = compare_frame_to_scan(frame, scan, 'y', ['correlation', 'phase'], phase_weight=0.25)
+    assert np.isclose(same['phase_agreement'], 1.0) and np.isclose(same['phase_correlation'], 1.0)
+    assert np.isclose(same['phase_error_deg'], 10.0)
+    assert np.isclose(same['combined'], 0.75 * same['correlation'] + 0.25)
+
+    flipped = compare_frame_to_scan(-frame, scan, 'y', ['phase'])
+    assert np.isclose(flipped['phase_agreement'], 0.0) and np.isclose(flipped['phase_correlation'], -1.0)
+    assert np.isclose(flipped['phase_error_deg'], 170.0)
+
+    coarse = compare_frame_to_scan(frame[:, ::2, ::2], scan, 'y', ['phase'])
+    expected = np.mean(up[::2, ::2].repeat(2, 0).repeat(2, 1) == up)
+    assert np.isclose(coarse['phase_agreement'], expected)
+    print("✓ Phase metrics score domain polarity and blend it into the combined score")
+
+
+def test_coarse_to_fine_screening():
+    """The coarse stage keeps the true match and prunes unrelated candidates"""
+    assert pyramid_factor((1024, 1024)) == 8
+    assert pyramid_factor((128, 96)) == 2 and pyramid_factor((40, 40)) == 1
+
+    rng = np.random.default_rng(8)
+    frames = [np.cumsum(np.cumsum(rng.normal(size=(2, 32, 32)), axis=1), axis=2) for _ in range(40)]
+    target = frames[23]
+    scan = PreparedScan(resize_to(np.hypot(target[0], target[1]), (512, 384)))
+
+    kept, scores = screen_frames(frames, scan, keep=5)
+    assert kept[0] == 23 and len(kept) == 5 and scores[23] > 0.99
+    assert len(screen_frames(frames, scan)[0]) == 10  # A quarter of 40
+
+    # Coarse scores track the full-resolution correlation
+    full = [compare_frame_to_scan(frame, scan, metrics=['correlation'])['correlation'] for frame in frames]
+    assert np.corrcoef(scores, full)[0, 1] > 0.95
+    print("✓ Coarse screening keeps the best candidates")
+
+
+def test_residual_defect_sites():
+    """Sites suppressed in the scan stand out as the strongest residual peaks"""
+    lattice = smooth_image((24, 24), 7)
+    truth = lattice.copy()
+    sites = [(5, 7), (18, 16)]
+    for row, col in sites:
+        truth[row, col] = lattice.min() - 3 * lattice.std()
+
+    scan = PreparedScan(resize_to(truth, (96, 96)))
+    residual = residual_map(lattice, scan)
+    assert residual.shape == (96, 96)
+    peaks = residual_peaks(site_residuals(residual, lattice.shape, scan), max_peaks=2, sign='positive')
+    assert sorted((p['row'], p['col']) for p in peaks) == sites
+    assert all(p['residual'] > 0 for p in peaks)
+
+    # A shifted scan: the same sites once the alignment is undone
+    transform = {'rotation_deg': 0.0, 'scale': 1.0, 'shift_px': [8.0, -4.0]}
+    shifted = PreparedScan(warp(resize_to(truth, (96, 96)), 0.0, 1.0, (8.0, -4.0)))
+    per_site = site_residuals(residual_map(lattice, shifted, transform), lattice.shape, shifted, transform)
+    assert sorted((p['row'], p['col']) for p in residual_peaks(per_site, max_peaks=2)) == sites
+
+    frame = np.stack([np.zeros_like(truth), truth])
+    aligned = compare_frame_to_scan(frame, shifted, 'y', ['correlation'], transform=transform)
+    assert aligned['correlation'] > 0.99
+    assert compare_frame_to_scan(frame, shifted, 'y', ['correlation'])['correlation'] < aligned['correlation']
+    print("✓ Residual peaks locate the suppressed sites")
+
+
+if __name__ == "__main__":
+    test_metrics_match_direct_computation()
+    test_ssim_matches_skimage()
+    test_identical_images()
+    test_scan_cache_reuse()
+    test_lru_cache_bound()
+    test_rank_matches()
+    test_timestep_search()
+    test_phase_metrics()
+    test_coarse_to_fine_screening()
+    test_residual_defect_sites()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Test the matplotlib-free polarization renderer and PNG encoder"""
+
+import os
+import struct
+import sys
+import time
+import zlib
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from fast_render import encode_png, png_size, polarization_rgb, render_frame, render_png
+
+
+def decode_png(data):
+    """Minimal decoder for the Sub/Up filtered 8-bit RGB files the encoder writes"""
+    assert data[:8] == b'\x89PNG\r\n\x1a\n'
+    pos, idat = 8, b''
+    while pos < len(data):
+        length, tag = struct.unpack('>I4s', data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        crc, = struct.unpack('>I', data[pos + 8 + length:pos + 12 + length])
+        assert crc == zlib.crc32(tag + body) & 0xffffffff
+        if tag == b'IHDR':
+            width, height = struct.unpack('>II', body[:8])
+        elif tag == b'IDAT':
+            idat += body
+        pos += 12 + length
+
+    raw = np.frombuffer(zlib.decompress(idat), dtype=np.uint8).reshape(height, -1)
+    rows = np.zeros((height, width * 3), dtype=np.uint8)
+    for i in range(height):
+        if raw[i, 0] == 2:
+            rows[i] = rows[i - 1] + raw[i, 1:]
+        else:
+            line = raw[i, 1:].reshape(width, 3)
+            rows[i] = np.cumsum(line, axis=0, dtype=np.uint8).ravel()
+    return rows.reshape(height, width, 3)
+
+
+def test_png_round_trip():
+    """Encoded images decode back to the same pixels"""
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, size=(7, 5, 3), dtype=np.uint8)
+    img[3] = img[2]  # Exercises the Up filter
+    assert np.array_equal(decode_png(encode_png(img)), img)
+    print("✓ PNG encoder round-trips")
+
+
+def test_colour_wheel():
+    """Hue follows the polarization angle and brightness follows |P|"""
+    px = np.array([[1.0, 0.0, -1.0, 0.5]])
+    py = np.array([[0.0, 1.0, 0.0, 0.0]])
+    rgb = polarization_rgb(px, py).astype(int)
+    assert tuple(rgb[0, 0]) == (255, 0, 0)            # +x: red
+    assert rgb[0, 1, 0] > 100 and rgb[0, 1, 1] > 200  # +y: yellow-green
+    assert rgb[0, 2, 2] == 255 and rgb[0, 2, 0] == 0  # -x: cyan
+    assert abs(rgb[0, 3, 0] - 127) <= 1               # half |P|: half brightness
+    print("✓ Colour wheel maps angle to hue and |P| to brightness")
+
+
+def test_render_png_all_types():
+    """Every visualization type renders a valid image quickly"""
+    rng = np.random.default_rng(1)
+    pmat = rng.normal(size=(2, 30, 20, 20))
+    for viz_type in ('summary', 'quiver', 'magnitude_angle'):
+        img = decode_png(render_png(pmat, viz_type))
+        assert img.shape[0] >= 100 and img.shape[2] == 3
+
+    frame = render_frame(pmat[:, -1], 'quiver', scale=10)
+    assert frame.shape == (200, 200, 3)
+    assert (frame == 0).all(axis=2).any(), "Quiver glyphs should be drawn"
+
+    start = time.perf_counter()
+    for _ in range(10):
+        render_png(pmat, 'magnitude_angle')
+    per_frame = (time.perf_counter() - start) / 10 * 1000
+    print(f"✓ Fast renderer: {per_frame:.1f} ms per frame")
+
+
+def test_size_limit():
+    """Images respect the requested width, downsampling lattices larger than it"""
+    pmat = np.random.default_rng(2).normal(size=(2, 4, 150, 150))
+    for viz_type in ('summary', 'quiver', 'magnitude_angle'):
+        for size in (64, 300, 1000):
+            width, height = png_size(render_png(pmat, viz_type, size=size))
+            assert max(width, height) <= size, (viz_type, size, width, height)
+            assert width >= size // 3
+    print("✓ Rendered images stay within the pixel limit")
+
+
+if __name__ == "__main__":
+    test_png_round_trip()
+    test_colour_wheel()
+    test_render_png_all_types()
+    test_size_limit()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Test the batched ask/tell parameter fitting"""
+
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from fitting import (
+    DEFAULT_BOUNDS, FIT_METHODS, Fitter, ParameterSpace, ParetoArchive, ParetoSearch,
+    crowding_distance, non_dominated_sort, plausibility
+)
+
+OPTIMUM = {'k': 1.7, 'dep_alpha': 0.12}
+SPACE = ParameterSpace({'k': DEFAULT_BOUNDS['k'], 'dep_alpha': DEFAULT_BOUNDS['dep_alpha']})
+
+
+def score(params):
+    """Smooth peak of height 1 at OPTIMUM"""
+    return 1.0 - ((params['k'] - OPTIMUM['k']) / 2.5) ** 2 - ((params['dep_alpha'] - OPTIMUM['dep_alpha']) / 0.3) ** 2
+
+
+def evaluate(batch):
+    return [score(params) for params in batch]
+
+
+def test_parameter_space_round_trip():
+    params = {'k': 1.2, 'dep_alpha': 0.3}
+    unit = SPACE.to_unit(params)
+    assert np.allclose(unit, [0.28, 1.0])
+    assert np.allclose(list(SPACE.to_params(unit).values()), [1.2, 0.3])
+    print("✓ Parameter space maps bounds onto the unit cube")
+
+
+def test_methods_find_optimum():
+    for method in FIT_METHODS:
+        summary = Fitter(SPACE, method, max_evaluations=60, batch_size=4, seed=0).run(evaluate)
+        assert summary['evaluations'] <= 60
+        assert summary['best_score'] > 0.99, (method, summary['best_score'])
+        assert abs(summary['best_params']['k'] - OPTIMUM['k']) < 0.3, method
+        print(f"✓ {method}: best score {summary['best_score']:.4f} in {summary['evaluations']} evaluations")
+
+
+def test_target_stop_and_cache():
+    calls = []
+
+    def counting(batch):
+        calls.extend(tuple(sorted(params.items())) for params in batch)
+        return evaluate(batch)
+
+    summary = Fitter(SPACE, 'cmaes', max_evaluations=200, batch_size=6, target=0.95, seed=1).run(counting)
+    assert summary['stop_reason'] == 'target_reached'
+    assert summary['best_score'] >= 0.95
+    assert summary['evaluations'] < 200
+    # Each parameter set is simulated once
+    assert len(calls) == len(set(calls)) == summary['evaluations']
+    print("✓ Target score stops the fit and evaluations are not repeated")
+
+
+def test_failures_rank_worst():
+    def flaky(batch):
+        return [np.nan if params['k'] > 2.5 else score(params) for params in batch]
+
+    fitter = Fitter(SPACE, 'nelder_mead', max_evaluations=40, batch_size=4, seed=0)
+    summary = fitter.run(flaky)
+    assert np.isfinite(summary['best_score'])
+    assert all(entry['score'] == -np.inf for entry in fitter.history if entry['params']['k'] > 2.5)
+    print("✓ Failed evaluations rank below every real score")
+
+
+def test_non_dominated_sort():
+    scores = np.array([[1.0, 0.0], [0.0, 1.0], [0.5, 0.5], [0.4, 0.4], [0.0, 0.0]])
+    fronts = non_dominated_sort(scores)
+    assert [sorted(front.tolist()) for front in fronts] == [[0, 1, 2], [3], [4]]
+    distance = crowding_distance(scores[fronts[0]])
+    assert np.isinf(distance[0]) and np.isinf(distance[1]) and np.isfinite(distance[2])
+
+    archive = ParetoArchive(['a', 'b'])
+    assert archive.add({'scores': {'a': 0.4, 'b': 0.4}})
+    assert archive.add({'scores': {'a': 0.5, 'b': 0.5}})  # Replaces the dominated entry
+    assert not archive.add({'scores': {'a': 0.1, 'b': 0.1}})
+    assert not archive.add({'scores': {'a': -np.inf, 'b': 2.0}})
+    assert len(archive.entries) == 1
+    print("✓ Non-dominated sorting, crowding and the archive agree")
+
+
+def test_pareto_search_spans_front():
+    """Two conflicting objectives: the front should spread along k between the two optima"""
+    space = ParameterSpace({'k': (0.0, 1.0), 'dep_alpha': (0.0, 1.0)})
+
+    def evaluate_pair(batch):
+        return [[-p['k'] ** 2 - p['dep_alpha'] ** 2, -(p['k'] - 1) ** 2 - p['dep_alpha'] ** 2] for p in batch]
+
+    search = ParetoSearch(space, ['left', 'right'], population_size=12, max_evaluations=180, seed=0)
+    summary = search.run(evaluate_pair)
+    k = np.array([entry['params']['k'] for entry in summary['front']])
+    alpha = np.array([entry['params']['dep_alpha'] for entry in summary['front']])
+    assert summary['evaluations'] == 180
+    assert k.min() < 0.1 and k.max() > 0.9
+    assert np.median(alpha) < 0.05
+    # The returned front is mutually non-dominated
+    scores = np.array([[entry['scores']['left'], entry['scores']['right']] for entry in summary['front']])
+    assert len(non_dominated_sort(scores)) == 1
+
+    bounds = ParameterSpace(DEFAULT_BOUNDS)
+    assert plausibility({'k': 1.0, 'dep_alpha': 0.0, 'gamma': 1.0}, bounds) == 0.0
+    assert plausibility({'k': 3.0, 'dep_alpha': 0.3, 'gamma': 2.0}, bounds) < -0.5
+    print(f"✓ Pareto search: {len(k)} front points spanning k {k.min():.2f}-{k.max():.2f}")
+
+
+if __name__ == "__main__":
+    test_parameter_space_round_trip()
+    test_methods_find_optimum()
+    test_target_stop_and_cache()
+    test_failures_rank_worst()
+    test_non_dominated_sort()
+    test_pareto_search_spans_front()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Test switched-fraction reduction and batched switching-kinetics fits"""
+
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from kinetics import aligned_fraction, merz_fit, nls_model, switched_fraction, switching_kinetics
+
+
+def test_switched_fraction_streams_history():
+    rng = np.random.default_rng(0)
+    history = rng.normal(size=(2, 50, 8, 8))
+    direction = np.array([0.6, 0.8])
+    streamed = aligned_fraction(history, direction, chunk=7)
+    direct = ((0.6 * history[0] + 0.8 * history[1]) > 0).mean(axis=(-2, -1))
+    assert np.allclose(streamed, direct)
+
+    switched = switched_fraction(np.array([[0.25, 0.25, 0.625, 1.0], [1.0, 1.0, 1.0, 1.0]]))
+    assert np.allclose(switched[0], [0.0, 0.0, 0.5, 1.0])
+    assert np.isnan(switched[1]).all()
+    print("✓ Switched fraction from a chunked pass over the history")
+
+
+def test_batched_kai_and_nls_fits():
+    rng = np.random.default_rng(1)
+    t = np.tile(np.linspace(0.0, 5.0, 200), (4, 1))
+    t0 = np.array([0.5, 1.0, 2.0, 3.0])
+    n = np.array([1.5, 2.0, 3.0, 2.0])
+    s = 1 - np.exp(-(t / t0[:, None]) ** n[:, None]) + 0.005 * rng.normal(size=t.shape)
+    t[3, 150:] = np.nan  # Shorter run, padded
+    s[3, 150:] = np.nan
+    fits = switching_kinetics(t, s, ['kai'])
+    assert np.allclose(fits['kai_t0'], t0, rtol=0.02)
+    assert np.allclose(fits['kai_n'], n, rtol=0.05)
+    assert (fits['kai_r2'] > 0.99).all()
+    assert np.allclose(fits['t_half'], t0 * np.log(2) ** (1 / n), rtol=0.03)
+
+    theta = np.array([[np.log10(0.7), np.log(0.2)], [0.0, np.log(0.5)]])
+    t = np.tile(np.linspace(0.0, 5.0, 200), (2, 1))
+    fits = switching_kinetics(t, nls_model(t, theta), ['nls'])
+    assert np.allclose(fits['nls_tau'], [0.7, 1.0], rtol=1e-3)
+    assert np.allclose(fits['nls_width_decades'], [0.2, 0.5], rtol=1e-3)
+    print("✓ KAI and NLS parameters are recovered for a whole batch")
+
+
+def test_merz_fit():
+    fields = np.array([1.0, 2.0, 4.0, 8.0])
+    merz = merz_fit(fields, 0.1 * np.exp(3.0 / fields))
+    assert np.isclose(merz['activation_field'], 3.0) and np.isclose(merz['tau_inf'], 0.1)
+    assert merz_fit([2.0, 2.0], [1.0, 1.1]) is None
+    print("✓ Merz activation field across a field sweep")
+
+
+if __name__ == "__main__":
+    test_switched_fraction_streams_history()
+    test_batched_kai_and_nls_fits()
+    test_merz_fit()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Test adaptive time stepping against the fixed-step integrate_fixed reference and FerroSim"""
+
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from lattice_integrator import (
+    AdaptiveFerroSim, LandauLattice, integrate_adaptive, integrate_fixed
+)
+
+
+def sine_field(t):
+    return np.array([0.0, 10.0 * np.sin(2 * np.pi * 2 * t)])
+
+
+def test_adaptive_matches_fixed_reference():
+    """Adaptive RK45 should reproduce a finely resolved Euler run with far fewer steps"""
+    lattice = LandauLattice(n=10, k=1.0, mode='tetragonal', dep_alpha=0.1)
+    p0 = lattice.initial_state('random', seed=1)
+
+    fine_t = np.linspace(0, 1, 20001)
+    fine_field = np.array([sine_field(t) for t in fine_t])
+    reference = integrate_fixed(lattice, p0, fine_t, fine_field)
+
+    output_t = fine_t[::200]
+    out = integrate_adaptive(lattice, p0, output_t, sine_field, rtol=1e-5, atol=1e-7)
+
+    assert out['pmat'].shape == (2, len(output_t), 10, 10)
+    error = np.abs(out['pmat'] - reference[:, ::200]).max()
+    assert error < 1e-3, f"Adaptive result deviates from reference by {error}"
+    assert out['n_steps'] < len(fine_t) // 50, "Adaptive run should take far fewer steps"
+    print(f"✓ Adaptive: {out['n_steps']} steps vs {len(fine_t) - 1} fixed, max error {error:.2e}")
+
+
+def test_records_only_requested_times():
+    """Observers see exactly the requested output times, in order"""
+    lattice = LandauLattice(n=6, mode='tetragonal')
+    seen = []
+    output_t = np.array([0.0, 0.1, 0.35, 0.9])
+    out = integrate_adaptive(lattice, lattice.initial_state('pr'), output_t, sine_field,
+                             on_record=lambda idx, t, p: seen.append((idx, t)),
+                             record_history=False)
+    assert out['pmat'] is None
+    assert [idx for idx, _ in seen] == [0, 1, 2, 3]
+    assert np.allclose([t for _, t in seen], output_t)
+    print("✓ Output recorded only at requested times")
+
+
+def test_energy_gradient_matches_dynamics():
+    """Finite-difference dF/dP equals -derivative / gamma in every mode"""
+    rng = np.random.default_rng(3)
+    n = 5
+    applied = np.array([0.3, -0.2])
+    for mode in ('tetragonal', 'rhombohedral', 'uniaxial', 'squareelectric'):
+        lattice = LandauLattice(n=n, gamma=2.0, k=1.3, mode=mode, dep_alpha=0.4,
+                                defects=rng.normal(0, 0.2, size=(n * n, 2)).tolist())
+        p = rng.uniform(-0.5, 0.5, size=(2, n, n))
+        gradient = np.zeros_like(p)
+        h = 1e-6
+        for idx in np.ndindex(p.shape):
+            step = np.zeros_like(p)
+            step[idx] = h
+            gradient[idx] = (lattice.energy(p + step, applied) - lattice.energy(p - step, applied)) / (2 * h)
+        if mode == 'uniaxial':
+            gradient[0] = 0.0  # Px is frozen
+        expected = -lattice.derivative(p, applied) / lattice.gamma
+        error = np.abs(gradient - expected).max()
+        assert error < 1e-6, f"{mode}: energy gradient deviates from dynamics by {error}"
+    print("✓ Energy gradient matches the integrated dynamics")
+
+
+def test_energy_decreases_at_zero_field():
+    """Relaxation without a field never raises the free energy"""
+    lattice = LandauLattice(n=8, k=1.0, mode='tetragonal', dep_alpha=0.2)
+    output_t = np.linspace(0, 2, 41)
+    energies = []
+    integrate_adaptive(lattice, lattice.initial_state('random', seed=4), output_t,
+                       lambda t: np.zeros(2),
+                       on_record=lambda idx, t, p: energies.append(lattice.energy(p)),
+                       record_history=False)
+    assert np.all(np.diff(energies) <= 1e-9), "Energy increased during relaxation"
+    print(f"✓ Energy decreases at zero field ({energies[0]:.3f} -> {energies[-1]:.3f})")
+
+
+def test_matches_ferrosim():
+    """AdaptiveFerroSim follows Ferro2DSim.runSim from the same initial state"""
+    Ferro2DSim = pytest.importorskip('ferrosim').Ferro2DSim
+
+    time_vec = np.linspace(0, 1, 2001)
+    applied = np.array([sine_field(t) for t in time_vec])
+    kwargs = dict(n=6, gamma=1.0, k=1.0, mode='tetragonal', dep_alpha=0.1,
+                  time_vec=time_vec, appliedE=applied, init='pr')
+    reference = Ferro2DSim(**kwargs)
+    reference.runSim(calc_pr=False, verbose=False)
+    expected = np.asarray(reference.getPmat())
+
+    sim = AdaptiveFerroSim(rtol=1e-6, atol=1e-8, **kwargs)
+    sim.initial_p = expected[:, 0].copy()
+    sim.runSim(calc_pr=False, verbose=False)
+    scale = np.abs(expected).max()
+    error = np.abs(sim.getPmat() - expected).max()
+    assert error < 0.02 * scale, f"Adaptive result deviates from FerroSim by {error} (|P| up to {scale})"
+    print(f"✓ Matches FerroSim runSim, max error {error:.2e}")
+
+
+def test_adaptive_sim_interface():
+    """AdaptiveFerroSim exposes the runSim/getPmat interface"""
+    time_vec = np.linspace(0, 0.5, 25)
+    applied = np.array([sine_field(t) for t in time_vec])
+    sim = AdaptiveFerroSim(n=5, time_vec=time_vec, appliedE=applied, init='pr')
+    results = sim.runSim(calc_pr=False, verbose=False)
+    assert results['Polarization'].shape == (2, 25)
+    assert sim.getPmat().shape == (2, 25, 5, 5)
+    print("✓ AdaptiveFerroSim runSim/getPmat interface works")
+
+
+if __name__ == "__main__":
+    test_adaptive_matches_fixed_reference()
+    test_records_only_requested_times()
+    test_energy_gradient_matches_dynamics()
+    test_energy_decreases_at_zero_field()
+    test_matches_ferrosim()
+    test_adaptive_sim_interface()
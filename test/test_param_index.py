@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Test the KD-tree index of completed simulations"""
+
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from param_index import ParameterIndex
+
+
+def test_nearest_matches_brute_force():
+    rng = np.random.default_rng(0)
+    index = ParameterIndex()
+    points = {}
+    for i in range(500):
+        params = {'n': 16, 'k': rng.uniform(0.5, 3.0), 'dep_alpha': rng.uniform(0.0, 0.3)}
+        points[f"s{i}"] = params
+        assert index.add(f"s{i}", params)
+    assert len(index) == 500
+
+    query = {'n': 16, 'k': 1.3, 'dep_alpha': 0.12}
+    _, neighbours = index.query(query, k=5)
+    # Distances in range-normalized units, computed directly
+    ks = np.array([p['k'] for p in points.values()])
+    alphas = np.array([p['dep_alpha'] for p in points.values()])
+    dist = np.hypot((ks - 1.3) / np.ptp(ks), (alphas - 0.12) / np.ptp(alphas))
+    expected = [list(points)[i] for i in np.argsort(dist)[:5]]
+    assert [n['sim_id'] for n in neighbours] == expected
+    assert np.allclose([n['distance'] for n in neighbours], np.sort(dist)[:5])
+    print("✓ KD-tree neighbours match a brute-force search")
+
+
+def test_configurations_removal_and_cutoff():
+    index = ParameterIndex()
+    index.add('a', {'n': 16, 'k': 1.0})
+    index.add('b', {'n': 16, 'k': 2.0})
+    index.add('c', {'n': 32, 'k': 1.0})
+
+    label, neighbours = index.query({'n': 16, 'k': 1.0}, k=5)
+    assert 'n=16' in label
+    assert [n['sim_id'] for n in neighbours] == ['a', 'b']
+    assert neighbours[0]['identical'] and not neighbours[1]['identical']
+
+    assert index.query({'n': 16, 'k': 1.9}, max_distance=0.2)[1][0]['sim_id'] == 'b'
+    assert index.query({'n': 16, 'k': 1.5}, max_distance=0.2)[1] == []
+    index.remove('a')
+    assert [n['sim_id'] for n in index.query({'n': 16, 'k': 1.0})[1]] == ['b']
+    assert index.query({'n': 64})[1] == []
+    assert not index.add('d', {'n': 16, 'defects': [(0, 0)] * 256})
+    print("✓ Configurations are indexed separately; removal and cut-off work")
+
+
+def test_different_dynamics_are_not_neighbours():
+    """Fixed-step and adaptive runs, or different time grids, are never compared"""
+    index = ParameterIndex()
+    index.add('fixed', {'n': 16, 'k': 1.0})
+    index.add('adaptive', {'n': 16, 'k': 1.0, 'integrator': 'adaptive', 'n_steps': 200})
+    index.add('coarse', {'n': 16, 'k': 1.0, 'n_steps': 200})
+
+    assert [n['sim_id'] for n in index.query({'n': 16, 'k': 1.0})[1]] == ['fixed']
+    _, neighbours = index.query({'n': 16, 'k': 1.0, 'integrator': 'adaptive', 'n_steps': 200})
+    assert [n['sim_id'] for n in neighbours] == ['adaptive'] and neighbours[0]['identical']
+    assert index.query({'n': 16, 'k': 1.0, 'integrator': 'adaptive', 'n_steps': 200, 'rtol': 1e-7})[1] == []
+    print("✓ Runs with different dynamics are indexed separately")
+
+
+if __name__ == "__main__":
+    test_nearest_matches_brute_force()
+    test_configurations_removal_and_cutoff()
+    test_different_dynamics_are_not_neighbours()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Test final-state classification and the adaptive phase-diagram grid"""
+
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from phase_diagram import AdaptiveGrid, classify_states
+from topology import plaquette_winding
+
+
+def synthetic_states(n=16):
+    rows, cols = np.meshgrid(np.arange(n) - (n - 1) / 2, np.arange(n) - (n - 1) / 2, indexing='ij')
+    uniform = np.stack([np.zeros((n, n)), np.ones((n, n))])
+    stripes = np.where((np.arange(n) // 4) % 2 == 0, 1.0, -1.0)[None, :].repeat(n, axis=0)
+    stripe = np.stack([np.zeros((n, n)), stripes])
+    vortex = np.stack([-rows, cols]) / np.hypot(rows, cols)
+    rng = np.random.default_rng(0)
+    multidomain = np.stack([np.zeros((n, n)), np.sign(rng.normal(size=(n, n)))])
+    return np.stack([uniform, stripe, vortex, multidomain])
+
+
+def test_classify_synthetic_states():
+    frames = synthetic_states()
+    labels, descriptors = classify_states(frames)
+    assert labels == ['single_domain', 'stripe', 'vortex', 'multidomain']
+    assert descriptors['net_order'][0] == 1.0
+    assert descriptors['stripe_order'][1] > 0.8
+
+    # The vortex centred between sites (7, 7)-(8, 8) winds once; sharp 180 degree walls do not
+    winding = plaquette_winding(frames[2])
+    assert winding[7, 7] == 1
+    assert not plaquette_winding(frames[1]).any()
+    assert classify_states(frames[0])[0] == ['single_domain']
+    print("✓ Uniform, stripe, vortex and random states are classified")
+
+
+def test_adaptive_grid_refines_boundary():
+    def label(x, y):
+        return 'stripe' if x + 0.5 * y > 1.3 else 'single_domain'
+
+    grid = AdaptiveGrid((0.0, 2.0), (0.0, 1.0), resolution=(5, 5), levels=3)
+    evaluated = 0
+    while not grid.done:
+        indices = grid.ask()
+        evaluated += len(indices)
+        grid.tell({index: label(*grid.value(index)) for index in indices})
+
+    assert grid.shape == (33, 33)
+    assert evaluated < 33 * 33 / 2
+    filled = np.array(grid.label_grid())
+    xs = np.linspace(0.0, 2.0, 33)
+    ys = np.linspace(0.0, 1.0, 33)
+    truth = np.array([[label(x, y) for y in ys] for x in xs])
+    assert (filled == truth).mean() > 0.97
+    print(f"✓ Adaptive grid resolves the boundary with {evaluated} of {33 * 33} points")
+
+
+def test_failed_points_do_not_refine():
+    grid = AdaptiveGrid((0.0, 1.0), (0.0, 1.0), resolution=(2, 2), levels=2)
+    indices = grid.ask()
+    labels = {index: 'stripe' for index in indices}
+    labels[indices[0]] = 'failed'
+    grid.tell(labels)
+    assert grid.done and len(grid.labels) == 4
+
+    grid = AdaptiveGrid((0.0, 1.0), (0.0, 1.0), resolution=(2, 2), levels=2)
+    first = grid.ask(budget=2)
+    grid.tell({index: 'stripe' for index in first})
+    assert grid.ask() == [index for index in [(0, 0), (0, 4), (4, 0), (4, 4)] if index not in first]
+    print("✓ Failed corners stop refinement; partial rounds resume")
+
+
+if __name__ == "__main__":
+    test_classify_synthetic_states()
+    test_adaptive_grid_refines_boundary()
+    test_failed_points_do_not_refine()
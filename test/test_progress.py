@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Test throttled progress reporting from simulation runs"""
+
+import io
+import os
+import sys
+import threading
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from lattice_integrator import AdaptiveFerroSim
+from progress import ProgressReporter, TqdmProgressStream, run_sim_with_progress
+
+
+def test_reporter_throttles_and_reports_final_step():
+    """Only the first update and the last step pass a long throttle interval"""
+    events = []
+    reporter = ProgressReporter(events.append, min_interval=60.0)
+    for step in range(1, 101):
+        reporter(step, 100)
+    assert [e['step'] for e in events] == [1, 100]
+    assert events[-1]['fraction'] == 1.0
+    assert events[-1]['steps_per_s'] > 0
+    print("✓ Progress events are throttled")
+
+
+def test_tqdm_stream_parsing():
+    """Step counters are read from tqdm bar text"""
+    seen = []
+    sink = io.StringIO()
+    stream = TqdmProgressStream(sink, lambda step, total: seen.append((step, total)), echo=True)
+    stream.write("\r 37%|███▋      | 370/1000 [00:01<00:02, 300.00it/s]")
+    stream.write("no counter here\n")
+    assert seen == [(370, 1000)]
+    assert "370/1000" in sink.getvalue()
+    print("✓ tqdm progress text is parsed")
+
+
+def test_adaptive_run_reports_every_output_time():
+    """The adaptive integrator reports one step per recorded output time"""
+    seen = []
+    sim = AdaptiveFerroSim(n=5, time_vec=np.linspace(0, 0.3, 20))
+    run_sim_with_progress(sim, lambda step, total: seen.append((step, total)))
+    assert seen[-1] == (20, 20)
+    assert len(seen) == 20
+    print("✓ Adaptive runs report progress per output time")
+
+
+class _TqdmSim:
+    """Stand-in for FerroSim: reports progress only through tqdm-style stderr text"""
+
+    def __init__(self, total, barrier):
+        self.total = total
+        self.barrier = barrier
+
+    def runSim(self, calc_pr=False, verbose=False):
+        for step in range(1, self.total + 1):
+            sys.stderr.write(f"\r{step}/{self.total}")
+            if step == 1:
+                self.barrier.wait()
+        return {}
+
+
+def test_concurrent_tqdm_runs_keep_streams_separate():
+    """Overlapping runs see only their own counters and restore the original streams"""
+    original = sys.stdout, sys.stderr
+    barrier = threading.Barrier(2)
+    seen = {10: [], 20: []}
+
+    def run(total):
+        run_sim_with_progress(_TqdmSim(total, barrier), lambda step, n: seen[total].append(n))
+
+    threads = [threading.Thread(target=run, args=(total,)) for total in seen]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert (sys.stdout, sys.stderr) == original
+    assert set(seen[10]) == {10} and len(seen[10]) == 10
+    assert set(seen[20]) == {20} and len(seen[20]) == 20
+    print("✓ Concurrent tqdm runs keep their progress and streams separate")
+
+
+class _PrintingSim:
+    """Stand-in for a verbose FerroSim run that prints to stdout"""
+
+    def __init__(self, barrier):
+        self.barrier = barrier
+
+    def runSim(self, calc_pr=False, verbose=False):
+        self.barrier.wait()
+        if verbose:
+            print("---Performing simulation---")
+        return {}
+
+
+def test_verbose_runs_never_print_to_stdout():
+    """Concurrent verbose runs, with or without progress, echo to stderr only"""
+    original = sys.stdout, sys.stderr
+    stdout, stderr = io.StringIO(), io.StringIO()
+    barrier = threading.Barrier(3)
+    sys.stdout, sys.stderr = stdout, stderr
+    try:
+        threads = [threading.Thread(target=run_sim_with_progress, args=(_PrintingSim(barrier), progress, True))
+                   for progress in (None, None, lambda step, total: None)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert (sys.stdout, sys.stderr) == (stdout, stderr)
+    finally:
+        sys.stdout, sys.stderr = original
+    assert stdout.getvalue() == ""
+    assert stderr.getvalue().count("---Performing simulation---") == 3
+    print("✓ Verbose simulation output goes to stderr on every path")
+
+
+if __name__ == "__main__":
+    test_reporter_throttles_and_reports_final_step()
+    test_tqdm_stream_parsing()
+    test_adaptive_run_reports_every_output_time()
+    test_concurrent_tqdm_runs_keep_streams_separate()
+    test_verbose_runs_never_print_to_stdout()
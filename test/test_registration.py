@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Test FFT-based registration of simulation images onto scans"""
+
+import os
+import sys
+import numpy as np
+from scipy.ndimage import gaussian_filter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from comparison import PreparedScan, align_to_scan, compare_to_scan
+from registration import RegistrationTarget, phase_correlation, register, warp
+
+
+def domain_pattern(n=128, seed=0):
+    """Smooth periodic random field, like a relaxed domain structure"""
+    rng = np.random.default_rng(seed)
+    return gaussian_filter(rng.normal(size=(n, n)), 3, mode='wrap')
+
+
+def test_phase_correlation_shift():
+    """Circular shifts are recovered exactly"""
+    image = domain_pattern()
+    dy, dx, peak = phase_correlation(np.roll(image, (7, -12), axis=(0, 1)), image)
+    assert np.allclose((dy, dx), (7, -12), atol=1e-6) and peak > 0.99
+    print("✓ Phase correlation recovers translation")
+
+
+def test_recovers_similarity_transform():
+    """Rotation, scale and shift are recovered from the spectra"""
+    image = domain_pattern()
+    for rotation, scale, shift in [(20.0, 1.0, (0.0, 0.0)), (-35.0, 0.8, (10.0, 7.0)),
+                                   (120.0, 1.0, (2.0, 2.0)), (0.0, 1.2, (0.0, 0.0))]:
+        fixed = warp(image, rotation, scale, shift)
+        found = register(image, RegistrationTarget(fixed))
+        assert abs(found['rotation_deg'] - rotation) < 1.5, (rotation, found['rotation_deg'])
+        assert abs(found['scale'] - scale) < 0.03, (scale, found['scale'])
+        assert np.allclose(found['shift_px'], shift, atol=0.5), (shift, found['shift_px'])
+        error = np.abs(found['aligned'] - fixed).mean() / np.abs(fixed).mean()
+        assert error < 0.15, error
+    print("✓ Log-polar registration recovers rotation, scale and shift")
+
+
+def test_alignment_improves_match():
+    """A shifted copy of the simulation matches after alignment"""
+    sim = domain_pattern(32, seed=1)
+    scan_image = np.roll(np.kron(sim, np.ones((4, 4))), (9, -5), axis=(0, 1))
+    scan = PreparedScan(scan_image, phase=np.where(scan_image > 0, 0.0, 180.0))
+
+    before = compare_to_scan(sim, scan, metrics=['correlation', 'domain'], sim_up=sim > 0)
+    aligned, aligned_up, transform = align_to_scan(sim, scan, rotation=False, scale=False, sim_up=sim > 0)
+    after = compare_to_scan(aligned, scan, metrics=['correlation', 'domain'], sim_up=aligned_up)
+
+    assert np.allclose(transform['shift_px'], (9, -5), atol=0.5)
+    assert np.allclose(transform['shift_sites'], (9 / 4, -5 / 4), atol=0.2)
+    assert after['correlation'] > 0.95 > before['correlation']
+    assert after['wall_density_diff'] < 0.05
+    print(f"✓ Alignment raises correlation {before['correlation']:.2f} -> {after['correlation']:.2f}")
+
+
+if __name__ == "__main__":
+    test_phase_correlation_shift()
+    test_recovers_similarity_transform()
+    test_alignment_improves_match()
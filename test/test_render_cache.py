@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Test render cache keys, hits and display_demo retention"""
+
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from render_cache import RenderCache, content_hash
+
+
+def write_png(path, size=100):
+    with open(path, 'wb') as f:
+        f.write(b'\0' * size)
+
+
+def test_content_hash_tracks_data():
+    """Identical histories hash equally; any change invalidates"""
+    pmat = np.random.default_rng(0).normal(size=(2, 4, 5, 5))
+    assert content_hash(pmat) == content_hash(pmat.copy())
+    changed = pmat.copy()
+    changed[1, -1, 2, 2] += 1e-9
+    assert content_hash(changed) != content_hash(pmat)
+    print("✓ Content hash follows the polarization history")
+
+
+def test_hit_after_put():
+    """A render is found again by its key, also from a fresh cache instance"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = RenderCache(tmp)
+        key = ('abcd1234', 'quiver', -1, 'f' * 32)
+        assert cache.get(key) is None
+        path = cache.path_for(key)
+        write_png(path)
+        cache.put(key, path)
+        assert cache.get(key) == path
+        assert RenderCache(tmp).get(key) == path
+        assert cache.get(('abcd1234', 'quiver', 3, 'f' * 32)) is None
+        print("✓ Cached render reused for the same key")
+
+
+def test_prune_by_size_and_age():
+    """Oldest and expired renders go first; unrelated files are kept"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = RenderCache(tmp, max_bytes=250, max_age_s=3600)
+        keys = [('abcd1234', 'summary', None, f'{i:x}' * 32) for i in range(4)]
+        now = time.time()
+        for i, key in enumerate(keys):
+            path = cache.path_for(key)
+            write_png(path)
+            os.utime(path, (now - 100 * (4 - i), now - 100 * (4 - i)))
+        os.utime(cache.path_for(keys[3]), (now - 7200, now - 7200))
+        other = os.path.join(tmp, 'notes.png')
+        write_png(other, size=1000)
+
+        removed = cache.prune(keep=cache.path_for(keys[3]))
+        remaining = sorted(os.listdir(tmp))
+        assert removed == 2, remaining
+        assert os.path.exists(other)
+        assert os.path.exists(cache.path_for(keys[3]))  # Kept despite its age
+        assert not os.path.exists(cache.path_for(keys[0]))
+        assert os.path.exists(cache.path_for(keys[2]))
+        print("✓ Retention policy prunes by age and size")
+
+
+def test_frame_directories_are_pruned():
+    """Frame folders count with their contents and are removed whole"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = RenderCache(tmp, max_bytes=250, max_age_s=3600)
+        key = ('abcd1234', 'quiver_frames_s1', None, 'a' * 32)
+        directory = cache.path_for(key, extension='')
+        os.makedirs(directory)
+        for i in range(3):
+            write_png(os.path.join(directory, f"frame_{i:05d}.png"))
+        assert cache.get(key, extension='') == directory
+        newer = ('abcd1234', 'summary', None, 'b' * 32)
+        write_png(cache.path_for(newer))
+        os.utime(directory, (time.time() - 100, time.time() - 100))
+
+        cache.put(newer, cache.path_for(newer))
+        assert not os.path.exists(directory)
+        assert cache.get(key, extension='') is None
+        print("✓ Frame folders fall under the retention policy")
+
+
+if __name__ == "__main__":
+    test_content_hash_tracks_data()
+    test_hit_after_put()
+    test_prune_by_size_and_age()
+    test_frame_directories_are_pruned()
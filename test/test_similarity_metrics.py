@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Test native similarity metrics; run directly for the full 512x512 benchmark against skimage"""
+
+import os
+import sys
+import time
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from comparison import PreparedScan, compare_to_scan, normalize
+from similarity_metrics import (
+    domain_statistics, histogram, histogram_distances, ms_ssim, normalized_mutual_information, ssim
+)
+
+
+def image_pair(shape=(128, 128), noise=0.3, seed=0):
+    rng = np.random.default_rng(seed)
+    x = normalize(rng.normal(size=shape).cumsum(axis=0).cumsum(axis=1))
+    y = normalize(x + noise * rng.normal(size=shape))
+    return x, y
+
+
+def test_agreement_with_skimage():
+    """SSIM (box and Gaussian) and NMI agree with skimage"""
+    metrics = pytest.importorskip('skimage.metrics')
+    sk_nmi, sk_ssim = metrics.normalized_mutual_information, metrics.structural_similarity
+
+    x, y = image_pair()
+    assert np.isclose(ssim(x, y), sk_ssim(x, y, data_range=1.0))
+    assert np.isclose(ssim(x, y, gaussian=True),
+                      sk_ssim(x, y, data_range=1.0, gaussian_weights=True, sigma=1.5))
+    assert np.isclose(ssim(x, y, gaussian=True, sample_covariance=False),
+                      sk_ssim(x, y, data_range=1.0, gaussian_weights=True, sigma=1.5,
+                              use_sample_covariance=False))
+    assert np.isclose(normalized_mutual_information(x, y, bins=100), sk_nmi(x, y, bins=100))
+    print("✓ SSIM and NMI agree with skimage")
+
+
+def test_identity_and_ordering():
+    """Identical images score perfectly; more noise scores worse"""
+    x, slight = image_pair(noise=0.05)
+    _, heavy = image_pair(noise=0.5)
+    assert np.isclose(ms_ssim(x, x), 1.0)
+    assert ms_ssim(x, slight) > ms_ssim(x, heavy)
+    assert np.isclose(normalized_mutual_information(x, x), 2.0)
+    assert normalized_mutual_information(x, slight) > normalized_mutual_information(x, heavy)
+
+    same = histogram_distances(histogram(x), histogram(x))
+    assert same['hist_intersection'] == 1.0 and same['hist_emd'] == 0.0
+    assert same['hist_chi2'] == 0.0 and same['hist_bhattacharyya'] == 0.0
+    assert 0 <= ms_ssim(x[:24, :24], heavy[:24, :24]) <= 1  # Fewer scales on small images
+    print("✓ Metrics rank identical > slightly noisy > heavily noisy")
+
+
+def test_domain_statistics():
+    """Up fraction and wall density of a half-up stripe map"""
+    up = np.zeros((10, 10), dtype=bool)
+    up[:, :5] = True
+    stats = domain_statistics(up)
+    assert stats['up_fraction'] == 0.5
+    assert stats['wall_density'] == 0.2  # Two wall columns of ten pixels
+    print("✓ Domain statistics of a stripe pattern")
+
+
+def test_selectable_metrics():
+    """compare_to_scan returns only the requested metric groups"""
+    x, y = image_pair(shape=(64, 64))
+    phase = np.where(y > 0.5, 0.0, 180.0)
+    scan = PreparedScan(y, phase=phase)
+    minimal = compare_to_scan(x, scan, metrics=['correlation'])
+    assert set(minimal) == {'correlation', 'match_quality'}
+
+    full = compare_to_scan(x, scan, metrics=['ssim', 'ms_ssim', 'nmi', 'histogram', 'domain'],
+                           sim_up=x > 0.5)
+    for key in ('ssim', 'ms_ssim', 'nmi', 'hist_emd', 'up_fraction_diff', 'wall_density_diff'):
+        assert key in full, key
+    assert np.isclose(full['ssim'], ssim(x, y))
+    print("✓ Metrics are selectable per comparison")
+
+
+def benchmark_against_skimage(shape=(512, 512), repeats=10):
+    """Print native vs skimage timings and differences"""
+    from skimage.metrics import normalized_mutual_information as sk_nmi
+    from skimage.metrics import structural_similarity as sk_ssim
+
+    x, y = image_pair(shape)
+    cases = [
+        ('ssim (box)', lambda: ssim(x, y), lambda: sk_ssim(x, y, data_range=1.0)),
+        ('ssim (gaussian)', lambda: ssim(x, y, gaussian=True),
+         lambda: sk_ssim(x, y, data_range=1.0, gaussian_weights=True, sigma=1.5)),
+        ('nmi', lambda: normalized_mutual_information(x, y, bins=100), lambda: sk_nmi(x, y, bins=100)),
+    ]
+    print(f"Benchmark on {shape[0]}x{shape[1]}, {repeats} repeats")
+    for name, native, reference in cases:
+        timings = []
+        for fn in (native, reference):
+            fn()
+            start = time.perf_counter()
+            for _ in range(repeats):
+                value = fn()
+            timings.append(((time.perf_counter() - start) / repeats * 1000, value))
+        (t_native, v_native), (t_ref, v_ref) = timings
+        print(f"  {name:16s} native {t_native:7.2f} ms   skimage {t_ref:7.2f} ms   "
+              f"|diff| {abs(v_native - v_ref):.1e}")
+
+
+def test_benchmark_against_skimage():
+    """Smaller benchmark run under pytest (timings only, nothing asserted); see with -s"""
+    pytest.importorskip('skimage.metrics')
+    benchmark_against_skimage(shape=(256, 256), repeats=3)
+
+
+if __name__ == "__main__":
+    test_agreement_with_skimage()
+    test_identity_and_ordering()
+    test_domain_statistics()
+    test_selectable_metrics()
+    try:
+        benchmark_against_skimage()
+    except ImportError:
+        print("skimage not installed, benchmark skipped")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Test the Gaussian-process simulation surrogate"""
+
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from surrogate import MAX_TRAINING, MIN_TRAINING, GaussianProcess, SurrogateStore, configuration, summary_observables
+
+
+def synthetic_frame(k, dep_alpha, n=12):
+    """Smooth parameter dependence: amplitude from k, a tilt from dep_alpha"""
+    rows, cols = np.meshgrid(np.linspace(-1, 1, n), np.linspace(-1, 1, n), indexing='ij')
+    py = np.tanh(k * (rows + 2 * dep_alpha * cols))
+    return np.stack([0.1 * k * np.ones((n, n)), py])
+
+
+def test_gaussian_process_interpolates():
+    rng = np.random.default_rng(0)
+    X = rng.random((40, 2))
+    Y = np.column_stack([np.sin(3 * X[:, 0]) + X[:, 1], np.full(40, 2.0)])
+    gp = GaussianProcess().fit(X, Y)
+    mean, std = gp.predict([[0.4, 0.6], [0.5, 0.5]])
+    assert np.allclose(mean[:, 0], np.sin(3 * np.array([0.4, 0.5])) + [0.6, 0.5], atol=0.02)
+    assert np.allclose(mean[:, 1], 2.0) and np.all(std[:, 1] < 1e-9)
+    # Uncertainty grows away from the data
+    assert gp.predict([[3.0, 3.0]])[1][0, 0] > 5 * std[0, 0]
+    print("✓ GP interpolates and reports larger uncertainty off the data")
+
+
+def test_store_predicts_observables_and_state():
+    store = SurrogateStore()
+    base = {'n': 12, 'init': 'up', 'field_config': {'type': 'sine', 'params': {'amplitude_y': 10.0}}}
+    for k in np.linspace(0.5, 3.0, 6):
+        for dep_alpha in (0.0, 0.15, 0.3):
+            assert store.add({**base, 'k': k, 'dep_alpha': dep_alpha}, synthetic_frame(k, dep_alpha))
+
+    params = {**base, 'k': 1.7, 'dep_alpha': 0.1}
+    prediction = store.predict(params, return_state=True)
+    truth = synthetic_frame(1.7, 0.1)
+    assert prediction['n_training'] == 18 and not prediction['extrapolating']
+    assert np.abs(prediction['final_state'] - truth).mean() < 0.02
+    expected = summary_observables(truth)
+    assert abs(prediction['observables']['mean_Px']['mean'] - expected['mean_Px']) < 0.01
+    assert abs(prediction['observables']['mean_abs_P']['mean'] - expected['mean_abs_P']) < 0.02
+    assert store.predict({**params, 'k': 6.0})['extrapolating']
+    print(f"✓ Surrogate predicts the final state (mean error "
+          f"{np.abs(prediction['final_state'] - truth).mean():.4f})")
+
+
+def test_configurations_are_separate():
+    store = SurrogateStore()
+    assert configuration({'n': 12})[0] != configuration({'n': 16})[0]
+    assert configuration({'k': 1.0})[0] == configuration({'k': 2.0})[0]
+    assert configuration({'defects': [(0, 0)]}) is None
+    assert not store.add({'defects': [(0, 0)] * 144, 'n': 12}, synthetic_frame(1, 0))
+
+    for k in (1.0, 2.0):
+        store.add({'n': 12, 'k': k}, synthetic_frame(k, 0.0), sim_id=f"s{k}")
+    store.add({'n': 12, 'k': 2.0}, synthetic_frame(2.0, 0.0), sim_id="s2.0")  # Same run again
+    try:
+        store.predict({'n': 12, 'k': 1.5})
+        assert False, "Expected too few training runs"
+    except ValueError as e:
+        assert f"needs {MIN_TRAINING}" in str(e)
+    assert store.summary()[0]['n_training'] == 2
+    print("✓ Configurations are emulated separately and need enough runs")
+
+
+def test_dynamics_settings_split_configurations():
+    """Integrator, time discretization, solver tolerances and random seeds are not pooled"""
+    base = configuration({'n': 12})[0]
+    for change in ({'integrator': 'adaptive'}, {'n_steps': 500}, {'t_start': 0.5}):
+        assert configuration({'n': 12, **change})[0] != base
+    adaptive = configuration({'n': 12, 'integrator': 'adaptive'})[0]
+    assert configuration({'n': 12, 'integrator': 'adaptive', 'rtol': 1e-6})[0] != adaptive
+    assert configuration({'n': 12, 'integrator': 'adaptive', 'method': 'DOP853'})[0] != adaptive
+    assert configuration({'n': 12, 'init': 'random', 'seed': 1})[0] != \
+        configuration({'n': 12, 'init': 'random', 'seed': 2})[0]
+    # Settings that cannot change the result do not fragment the training set
+    assert configuration({'n': 12, 'rtol': 1e-6})[0] == base
+    assert configuration({'n': 12, 'seed': 1})[0] == base
+    print("✓ Dynamics settings keep configurations separate")
+
+
+def test_removed_runs_leave_the_store():
+    store = SurrogateStore()
+    for i, k in enumerate((1.0, 2.0, 3.0)):
+        store.add({'n': 12, 'k': k}, synthetic_frame(k, 0.0), sim_id=f"s{i}")
+    store.predict({'n': 12, 'k': 1.5})
+    store.remove('s1')
+    assert store.summary()[0]['n_training'] == 2
+    for sim_id in ('s0', 's2', 'missing'):
+        store.remove(sim_id)
+    assert store.summary() == []
+    print("✓ Deleted runs are dropped from the surrogate store")
+
+
+def test_training_set_keeps_most_recent_runs():
+    store = SurrogateStore()
+    for i in range(MAX_TRAINING + 5):
+        store.add({'n': 6, 'k': 1.0 + i / MAX_TRAINING}, synthetic_frame(1.0, 0.0, n=6), sim_id=f"s{i}")
+    model = next(iter(store.models.values()))
+    assert model.sim_ids == [f"s{i}" for i in range(5, MAX_TRAINING + 5)]
+    assert store.predict({'n': 6, 'k': 1.5})['n_training'] == MAX_TRAINING
+    print(f"✓ Training sets keep the {MAX_TRAINING} most recent runs")
+
+
+if __name__ == "__main__":
+    test_gaussian_process_interpolates()
+    test_store_predicts_observables_and_state()
+    test_configurations_are_separate()
+    test_dynamics_settings_split_configurations()
+    test_removed_runs_leave_the_store()
+    test_training_set_keeps_most_recent_runs()
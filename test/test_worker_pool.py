@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""Test worker-process simulation runs with shared-memory results"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from worker_pool import SharedArray, WorkerJobs, create_executor, run_simulation_job
+
+
+def small_job_kwargs(steps=11):
+    time_vec = np.linspace(0, 0.2, steps)
+    return {'n': 5, 'time_vec': time_vec, 'appliedE': np.zeros((steps, 2)), 'init': 'pr'}
+
+
+def track(jobs, future):
+    """Track a job; the returned event is set once WorkerJobs has recorded it"""
+    recorded = threading.Event()
+    jobs.track(future)
+    future.add_done_callback(lambda _: recorded.set())  # Callbacks run in order
+    return recorded
+
+
+def block_exists(handle):
+    try:
+        SharedArray.attach(handle).close()
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def test_shared_array_round_trip():
+    """Attaching to a block sees the same memory, without a copy"""
+    data = np.arange(2 * 3 * 4 * 4, dtype=float).reshape(2, 3, 4, 4)
+    owner = SharedArray.from_array(data)
+    view = SharedArray.attach(owner.handle)
+    try:
+        assert np.array_equal(view.array, data)
+        owner.array[0, -1, 0, 0] = -1.0
+        assert view.array[0, -1, 0, 0] == -1.0, "Views should share memory"
+    finally:
+        view.close()
+        owner.unlink()
+    print("✓ Shared array round trip works")
+
+
+def test_views_outlive_unlink():
+    """Views taken from a block stay readable after it is unlinked"""
+    data = np.arange(2 * 3 * 4 * 4, dtype=float).reshape(2, 3, 4, 4)
+    owner = SharedArray.from_array(data)
+    handle = owner.handle
+    final = owner.array[:, -1]
+    owner.unlink()
+    del owner
+    assert not block_exists(handle)
+    assert np.array_equal(final, data[:, -1])
+    print("✓ Views outlive the unlinked block")
+
+
+def test_retained_view_after_delete_simulation():
+    """A get_pmat view held by another request survives delete_simulation"""
+    pytest.importorskip('mcp')
+    pytest.importorskip('ferrosim')
+    from ferrosim_mcp_server_minimal import SimulationManager
+
+    manager = SimulationManager(max_workers=1)
+    try:
+        sim_id = manager.create_simulation({'n': 5, 'n_steps': 11, 'integrator': 'adaptive'})
+        manager.run_simulation(sim_id, in_worker=True)
+        pmat = manager.get_pmat(sim_id)
+        expected = pmat.copy()
+        handle = manager.simulations[sim_id]['pmat_block'].handle
+        manager.delete_simulation(sim_id)
+        assert not block_exists(handle)
+        assert np.array_equal(pmat[:, -1], expected[:, -1])
+    finally:
+        manager.shutdown()
+    print("✓ Retained views survive delete_simulation")
+
+
+def test_worker_result_through_shared_memory():
+    """A worker publishes the history; the parent only receives a handle"""
+    time_vec = np.linspace(0, 0.2, 11)
+    sim_kwargs = {
+        'n': 5,
+        'time_vec': time_vec,
+        'appliedE': np.zeros((len(time_vec), 2)),
+        'init': 'pr',
+    }
+    executor = create_executor(max_workers=1)
+    try:
+        payload = executor.submit(run_simulation_job, 'adaptive', sim_kwargs).result()
+    finally:
+        executor.shutdown()
+
+    assert set(payload['pmat']) == {'name', 'shape', 'dtype'}
+    assert payload['polarization'].shape == (2, 11)
+
+    block = SharedArray.attach(payload['pmat'])
+    try:
+        assert block.array.shape == (2, 11, 5, 5)
+        final_py = block.array[1, -1]
+        assert np.all(final_py > 0), "Remnant state should stay polarized up in zero field"
+    finally:
+        block.unlink()
+    print("✓ Worker result returned through shared memory")
+
+
+def test_abandoned_jobs_free_their_blocks():
+    """Blocks of cancelled or never-collected jobs are unlinked, even if the job was still running"""
+    jobs = WorkerJobs()
+    executor = create_executor(max_workers=1)
+    try:
+        running = executor.submit(run_simulation_job, 'adaptive', small_job_kwargs(2001))
+        jobs.track(running)
+        while not running.running():
+            time.sleep(0.01)
+        jobs.abandon(running)  # Too late to cancel: freed when it finishes
+        finished = executor.submit(run_simulation_job, 'adaptive', small_job_kwargs())
+        track(jobs, finished).wait()
+        handle = finished.result()['pmat']
+        assert block_exists(handle) and len(jobs) == 1
+        jobs.abandon(finished)
+        assert not block_exists(handle)
+
+        uncollected = executor.submit(run_simulation_job, 'adaptive', small_job_kwargs())
+        track(jobs, uncollected).wait()
+        handle = uncollected.result()['pmat']
+    finally:
+        executor.shutdown()
+        jobs.close()
+    assert not block_exists(running.result()['pmat'])
+    assert not block_exists(handle) and len(jobs) == 0
+    print("✓ Uncollected worker results are freed on cancellation and close")
+
+
+def test_claim_before_completion_callback():
+    """A block claimed before its job is recorded is never freed by the tracker"""
+    jobs = WorkerJobs()
+    block = SharedArray.create((2, 1, 3, 3))
+    future = Future()
+    jobs.track(future)
+    future.set_running_or_notify_cancel()
+    jobs.claim(block.handle)  # result() waiters can run ahead of the callbacks
+    future.set_result({'pmat': block.handle})
+    try:
+        assert len(jobs) == 0
+        jobs.abandon(future)
+        jobs.close()
+        assert block_exists(block.handle), "Claimed block must stay alive"
+    finally:
+        block.unlink()
+    print("✓ Early claims are not undone by the completion callback")
+
+
+if __name__ == "__main__":
+    test_shared_array_round_trip()
+    test_views_outlive_unlink()
+    test_retained_view_after_delete_simulation()
+    test_worker_result_through_shared_memory()
+    test_abandoned_jobs_free_their_blocks()
+    test_claim_before_completion_callback()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Worker Pool - Run FerroSim simulations in worker processes
+Results are handed back through multiprocessing.shared_memory blocks, so the
+server process only holds views and handles instead of unpickled copies
+"""
+
+import os
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from progress import ProgressReporter, run_sim_with_progress
+
+
+class SharedArray:
+    """
+    NumPy array backed by a named shared memory block
+
+    The handle (name, shape, dtype) is a small picklable dict that any
+    process can use to attach to the same memory without copying it.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, shape: Tuple[int, ...], dtype):
+        self.shm = shm
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf)
+
+    @classmethod
+    def create(cls, shape: Tuple[int, ...], dtype=np.float64) -> 'SharedArray':
+        """Allocate a new shared block for an array of the given shape"""
+        nbytes = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+        shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        return cls(shm, shape, dtype)
+
+    @classmethod
+    def from_array(cls, data: np.ndarray) -> 'SharedArray':
+        """Copy an existing array into a new shared block"""
+        block = cls.create(data.shape, data.dtype)
+        block.array[...] = data
+        return block
+
+    @classmethod
+    def attach(cls, handle: Dict) -> 'SharedArray':
+        """Attach to a block created by another process"""
+        shm = shared_memory.SharedMemory(name=handle['name'])
+        return cls(shm, handle['shape'], handle['dtype'])
+
+    @property
+    def handle(self) -> Dict:
+        """Picklable description of the block"""
+        return {
+            'name': self.shm.name,
+            'shape': list(self.shape),
+            'dtype': self.dtype.str,
+        }
+
+    def disown(self):
+        """
+        Hand ownership to another process
+
+        Stops this process's resource tracker from unlinking the block when
+        the process exits; the attaching process becomes responsible for it.
+        """
+        resource_tracker.unregister(self.shm._name, 'shared_memory')
+
+    def close(self):
+        """
+        Drop this handle's mapping (the block itself stays alive)
+
+        Arrays viewing the block keep its memoryview, and through it the
+        mmap, alive; the memory is unmapped when the last of them is
+        collected rather than here, where it would crash their readers.
+        """
+        self.array = None
+        self.shm._buf = None
+        self.shm._mmap = None
+        self.shm.close()
+
+    def unlink(self):
+        """Free the block's name and close; outstanding views stay readable"""
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+        self.close()
+
+
+def discard_shared(handle: Dict):
+    """Free a published block that no process will attach to"""
+    try:
+        SharedArray.attach(handle).unlink()
+    except FileNotFoundError:
+        pass
+
+
+class WorkerJobs:
+    """
+    Result blocks published by worker jobs that nobody has attached to yet
+
+    run_simulation_job disowns its block before returning, so a block whose
+    payload is never collected (the caller was cancelled or failed, or the
+    server shut down) would stay in /dev/shm. Tracked jobs record their
+    block on completion; claim() takes it over, abandon() frees it (now, or
+    as soon as a still-running job finishes) and close() frees them all.
+    Future.result() returns before done-callbacks run, so a block may be
+    claimed before its job is recorded; such names are remembered and
+    skipped on completion.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._abandoned = set()
+        self._unclaimed: Dict[str, Dict] = {}
+        self._claimed = set()  # Claimed before the completion callback ran
+
+    def __len__(self) -> int:
+        return len(self._unclaimed)
+
+    def track(self, future):
+        """Watch a future returned by submitting run_simulation_job"""
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._finished)
+
+    def _finished(self, future):
+        handle = None
+        if not future.cancelled() and future.exception() is None:
+            handle = future.result()['pmat']
+        with self._lock:
+            self._pending.discard(future)
+            abandoned = future in self._abandoned
+            self._abandoned.discard(future)
+            if handle is not None and handle['name'] in self._claimed:
+                self._claimed.discard(handle['name'])
+                return
+            if handle is not None and not abandoned:
+                self._unclaimed[handle['name']] = handle
+        if handle is not None and abandoned:
+            discard_shared(handle)
+
+    def claim(self, handle: Dict):
+        """The caller attaches to this block and becomes responsible for it"""
+        with self._lock:
+            if self._unclaimed.pop(handle['name'], None) is None:
+                self._claimed.add(handle['name'])
+
+    def abandon(self, future):
+        """Nobody will collect this job: cancel it, or free its block"""
+        with self._lock:
+            running = future in self._pending
+            if running:
+                self._abandoned.add(future)
+            elif not future.cancelled() and future.exception() is None:
+                handle = self._unclaimed.pop(future.result()['pmat']['name'], None)
+                if handle is not None:
+                    discard_shared(handle)
+        if running:
+            future.cancel()
+
+    def close(self):
+        """Abandon every outstanding job and free all unclaimed blocks"""
+        with self._lock:
+            pending = list(self._pending)
+            self._abandoned.update(pending)
+            handles = list(self._unclaimed.values())
+            self._unclaimed.clear()
+        for future in pending:
+            future.cancel()
+        for handle in handles:
+            discard_shared(handle)
+
+
+def build_simulation(integrator: str, sim_kwargs: Dict):
+    """Construct a FerroSim (fixed-step) or adaptive simulation from constructor kwargs"""
+    if integrator == 'adaptive':
+        from lattice_integrator import AdaptiveFerroSim
+        return AdaptiveFerroSim(**sim_kwargs)
+
+    from ferrosim import Ferro2DSim
+    return Ferro2DSim(**sim_kwargs)
+
+
+def run_simulation_job(integrator: str, sim_kwargs: Dict, observables: Optional[List[str]] = None,
+                       progress_queue=None) -> Dict:
+    """
+    Worker entry point: build, run and publish a simulation
+
+    The (2, timesteps, n, n) history is written once into a shared block;
+    only its handle and the small summary arrays are pickled back. The
+    block outlives the worker, so track the future with WorkerJobs.
+
+    Args:
+        progress_queue: Optional multiprocessing queue receiving throttled
+                        progress events (see progress.ProgressReporter)
+    """
+    sim = build_simulation(integrator, sim_kwargs)
+    reporter = ProgressReporter(progress_queue.put) if progress_queue is not None else None
+    start = time.perf_counter()
+    results = run_sim_with_progress(sim, reporter)
+    elapsed = time.perf_counter() - start
+    pmat = np.ascontiguousarray(sim.getPmat())
+
+    if observables and 'observables' not in results:
+        from observables import observe_history
+        results['observables'] = observe_history(observables, sim_kwargs, pmat)
+
+    block = SharedArray.from_array(pmat)
+    block.disown()
+    handle = block.handle
+    block.close()
+
+    summary = {
+        key: value for key, value in results.items()
+        if key != 'Polarization' and np.isscalar(value)
+    }
+    return {
+        'pmat': handle,
+        'polarization': np.asarray(results['Polarization']),
+        'observables': results.get('observables'),
+        'stats': summary,
+        'elapsed': elapsed,
+    }
+
+
+def create_progress_manager():
+    """Manager process serving progress queues that worker jobs can pickle"""
+    return multiprocessing.get_context('spawn').Manager()
+
+
+def worker_count(max_workers: Optional[int] = None) -> int:
+    """Size of the process pool: max_workers, or one less than the CPU count"""
+    if max_workers is None:
+        max_workers = max(1, (os.cpu_count() or 2) - 1)
+    return max_workers
+
+
+def create_executor(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Process pool for simulation jobs
+
+    Uses the 'spawn' start method: the server runs an asyncio loop and
+    numba threads, which are not safe to fork.
+    """
+    return ProcessPoolExecutor(
+        max_workers=worker_count(max_workers),
+        mp_context=multiprocessing.get_context('spawn')
+    )